@@ -0,0 +1,231 @@
+import os
+import math
+import ipaddress
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any
+
+from flask import request, jsonify
+
+# name: (max concurrent, max queued, queue deadline seconds, per-client limit; 0 = unlimited)
+DEFAULT_LIMITS = {
+    "ask": (2, 16, 60, 0),
+    # The commit lookup and question embedding in front of the answer cache
+    "ask_lookup": (8, 32, 10, 0),
+    "summary": (2, 8, 30, 0),
+    "readme": (4, 16, 60, 0),
+}
+
+# Comma-separated addresses / CIDR ranges of reverse proxies whose client headers are believed
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Concurrency limit with a bounded, deadline-bound wait queue.
+
+    A freed slot goes to the waiting client with the fewest requests already
+    running (FIFO among equals), so one client flooding the queue cannot
+    starve the others. With `per_client_limit`, a client holding that many
+    running or queued requests is rejected with 429 straight away.
+    """
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, per_client_limit=0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.per_client_limit = per_client_limit
+        self.active = 0
+        self.active_by_client: Dict[str, int] = {}
+        self.queued_by_client: Dict[str, int] = {}
+        self.waiters = []
+        self.cond = threading.Condition()
+        self.admitted = 0
+        self.rejected_429 = 0
+        self.rejected_503 = 0
+        self.timeouts = 0
+        self.max_queue_depth = 0
+        self.avg_service_s = 10.0
+        self.avg_wait_ms = 0.0
+
+    @classmethod
+    def from_env(cls, name):
+        concurrent, queue, timeout, per_client = DEFAULT_LIMITS.get(name, (4, 16, 60, 0))
+        prefix = f"ADMISSION_{name.upper()}_"
+        return cls(
+            name,
+            max_concurrent=int(os.getenv(prefix + "CONCURRENCY", concurrent)),
+            max_queue=int(os.getenv(prefix + "QUEUE", queue)),
+            queue_timeout=float(os.getenv(prefix + "TIMEOUT", timeout)),
+            per_client_limit=int(os.getenv(prefix + "PER_CLIENT", per_client)),
+        )
+
+    def _retry_after(self, ahead):
+        return max(1, math.ceil(self.avg_service_s * (ahead + 1) / self.max_concurrent))
+
+    def acquire(self, client_id):
+        start = time.monotonic()
+        with self.cond:
+            held = self.active_by_client.get(client_id, 0) + self.queued_by_client.get(client_id, 0)
+            if self.per_client_limit and held >= self.per_client_limit:
+                self.rejected_429 += 1
+                raise AdmissionRejected(429, f"Too many concurrent {self.name} requests from this client",
+                                        self._retry_after(len(self.waiters)))
+            if self.active < self.max_concurrent and not self.waiters:
+                self._admit(client_id, start)
+                return
+            if len(self.waiters) >= self.max_queue:
+                self.rejected_503 += 1
+                raise AdmissionRejected(503, f"{self.name} queue is full", self._retry_after(len(self.waiters)))
+
+            waiter = [client_id, False]
+            self.waiters.append(waiter)
+            self.queued_by_client[client_id] = self.queued_by_client.get(client_id, 0) + 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self.waiters))
+            deadline = start + self.queue_timeout
+            try:
+                while not waiter[1]:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self.rejected_503 += 1
+                        raise AdmissionRejected(503, f"Timed out waiting for a {self.name} slot",
+                                                self._retry_after(len(self.waiters)))
+                    self.cond.wait(remaining)
+            finally:
+                self.queued_by_client[client_id] -= 1
+                if not self.queued_by_client[client_id]:
+                    del self.queued_by_client[client_id]
+                if not waiter[1]:
+                    self.waiters.remove(waiter)
+            # The slot was already counted as taken by _hand_off
+            self._record_wait(start)
+
+    def _admit(self, client_id, start=None):
+        self.active += 1
+        self.active_by_client[client_id] = self.active_by_client.get(client_id, 0) + 1
+        self.admitted += 1
+        if start is not None:
+            self._record_wait(start)
+
+    def _record_wait(self, start):
+        self.avg_wait_ms = 0.9 * self.avg_wait_ms + 0.1 * (time.monotonic() - start) * 1000
+
+    def release(self, client_id, service_s):
+        with self.cond:
+            self.active -= 1
+            self.active_by_client[client_id] -= 1
+            if not self.active_by_client[client_id]:
+                del self.active_by_client[client_id]
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+            self._hand_off()
+
+    def _hand_off(self):
+        # Slots are taken on the waiter's behalf here so a newcomer cannot jump the queue
+        while self.waiters and self.active < self.max_concurrent:
+            chosen = min(self.waiters, key=lambda w: self.active_by_client.get(w[0], 0))
+            chosen[1] = True
+            self.waiters.remove(chosen)
+            self._admit(chosen[0])
+            self.cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            return {
+                "active": self.active,
+                "max_concurrent": self.max_concurrent,
+                "queued": len(self.waiters),
+                "max_queue": self.max_queue,
+                "max_queue_depth_seen": self.max_queue_depth,
+                "admitted": self.admitted,
+                "rejected_429": self.rejected_429,
+                "rejected_503": self.rejected_503,
+                "queue_timeouts": self.timeouts,
+                "avg_wait_ms": round(self.avg_wait_ms, 1),
+                "avg_service_s": round(self.avg_service_s, 2),
+            }
+
+
+_limiters: Dict[str, AdmissionLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name) -> AdmissionLimiter:
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = AdmissionLimiter.from_env(name)
+        return _limiters[name]
+
+
+def _trusted_proxy(addr):
+    try:
+        return any(ipaddress.ip_address(addr) in network for network in TRUSTED_PROXIES)
+    except ValueError:
+        return False
+
+
+def client_id():
+    """
+    The client per-client limits are counted against: the peer address,
+    unless the peer is a trusted proxy, in which case its X-Client-Id or the
+    address it appended to X-Forwarded-For. Anyone else could pick a new
+    X-Client-Id per request to dodge the limit.
+    """
+    addr = request.remote_addr or "anonymous"
+    if not TRUSTED_PROXIES or not _trusted_proxy(addr):
+        return addr
+    forwarded = request.headers.get("X-Forwarded-For", "").split(",")[-1].strip()
+    return request.headers.get("X-Client-Id") or forwarded or addr
+
+
+@contextmanager
+def admission_slot(name):
+    """Hold one slot of the named limiter; raises AdmissionRejected when none is available in time."""
+    limiter = get_limiter(name)
+    client = client_id()
+    limiter.acquire(client)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        limiter.release(client, time.monotonic() - start)
+
+
+def rejection_response(e: AdmissionRejected):
+    response = jsonify({"success": False, "error": e.reason})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def admission_controlled(name):
+    """Decorator form of admission_slot for whole views."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with admission_slot(name):
+                    return view(*args, **kwargs)
+            except AdmissionRejected as e:
+                return rejection_response(e)
+        return wrapper
+    return decorator
+
+
+def admission_stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
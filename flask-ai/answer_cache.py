@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache of /ask answers keyed by (repo, commit SHA).
+
+    A question hits when its embedding's cosine similarity to a cached
+    question on the same commit is at least `threshold`. Entries expire after
+    `ttl` seconds, the least recently used are evicted beyond `max_entries`,
+    and moving a branch to a new commit drops the answers for the old one.
+    """
+    def __init__(self, threshold=None, ttl=None, max_entries=None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+        # (repo, commit_sha) -> {entry id: entry}; self.lru orders all entry ids by recency
+        self.groups: Dict[tuple, Dict[int, Dict[str, Any]]] = {}
+        self.lru: "OrderedDict[int, tuple]" = OrderedDict()
+        self.branch_heads: Dict[tuple, str] = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, repo: str, branch: str, commit_sha: str, question_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        query = _normalize(question_embedding)
+        now = time.time()
+        with self.lock:
+            self._track_branch(repo, branch, commit_sha)
+            group = self.groups.get((repo, commit_sha), {})
+            best, best_score = None, -1.0
+            for entry_id, entry in list(group.items()):
+                if now - entry["created_at"] > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(query, entry["embedding"]))
+                if score > best_score:
+                    best, best_score = entry_id, score
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.lru.move_to_end(best)
+            entry = group[best]
+            return {"answer": entry["answer"], "question": entry["question"], "similarity": best_score}
+
+    def store(self, repo: str, branch: str, commit_sha: str, question: str,
+              question_embedding: List[float], answer: str):
+        with self.lock:
+            self._track_branch(repo, branch, commit_sha)
+            entry_id = self.next_id
+            self.next_id += 1
+            self.groups.setdefault((repo, commit_sha), {})[entry_id] = {
+                "question": question,
+                "embedding": _normalize(question_embedding),
+                "answer": answer,
+                "created_at": time.time(),
+            }
+            self.lru[entry_id] = (repo, commit_sha)
+            while len(self.lru) > self.max_entries:
+                self._remove(next(iter(self.lru)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.lru),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _track_branch(self, repo, branch, commit_sha):
+        previous = self.branch_heads.get((repo, branch))
+        self.branch_heads[(repo, branch)] = commit_sha
+        if previous and previous != commit_sha:
+            # Keep the old commit's answers only if another branch still points at it
+            if previous not in {sha for (r, _), sha in self.branch_heads.items() if r == repo}:
+                for entry_id in list(self.groups.get((repo, previous), {})):
+                    self._remove(entry_id)
+
+    def _remove(self, entry_id):
+        key = self.lru.pop(entry_id, None)
+        if key is None:
+            return
+        group = self.groups.get(key)
+        if group is not None:
+            group.pop(entry_id, None)
+            if not group:
+                del self.groups[key]
+
+
+def _normalize(vector):
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
@@ -1,12 +1,24 @@
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-from github_parser import parse_github_repo, get_github_branches
-from embedding_store import embed_and_search
+from repo_snapshot import get_snapshot, resolve_commit, list_branches, snapshot_cache
+from embedding_store import embed_and_search, get_embed_model, peek_index, index_cache_stats
+from prefetch import get_prefetcher
+from path_filter import PathFilter
+from profiling import init_profiling
+from llm_usage import init_usage_tracking, usage_stats, current_usage
+from answer_cache import SemanticAnswerCache
 from readme_generator import ReadmeGenerator
-from file_summarizer import summarize_repo_as_string, create_pdf_from_summary
+from file_summarizer import summarize_repo_as_string, create_pdf_from_summary, forecast_summary
+from hierarchical_summary import summarize_repo_hierarchical, format_hierarchical_summary, forecast_hierarchical
+from batch_jobs import get_batch_runner
+from llm_pool import pool_stats
+from memstats import process_stats
+from admission import AdmissionRejected, admission_slot, admission_controlled, rejection_response, admission_stats
 import os
+import hmac
 import logging
 import tempfile
+import time
 from urllib.parse import urlparse
 
 try:
@@ -21,10 +33,13 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+init_profiling(app)
+init_usage_tracking(app)
 readme_gen = ReadmeGenerator()
 
 # In-memory cache for summaries
 summary_cache = {}
+answer_cache = SemanticAnswerCache()
 
 @app.before_request
 def log_request_info():
@@ -44,11 +59,18 @@ def get_branches():
         if not all([parsed_url.scheme, parsed_url.netloc]) or 'github.com' not in parsed_url.netloc:
             return jsonify({"error": "Invalid or unsupported repository URL"}), 400
 
-        branches = get_github_branches(repo_url)
+        branches = list_branches(repo_url)
         if not branches:
             return jsonify({"error": "No branches found or error fetching branches"}), 404
 
-        return jsonify({"branches": branches})
+        response = {"branches": branches}
+        # Warm the snapshot and index of the branch the user will most likely ask about
+        if data.get('prefetch', os.getenv('PREFETCH_ON_BRANCHES') == '1'):
+            prefetcher = get_prefetcher()
+            branch = prefetcher.choose_branch(repo_url, branches)
+            response["prefetch"] = {"branch": branch, "status": prefetcher.schedule(repo_url, branch)}
+
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Error fetching branches: {str(e)}")
@@ -64,16 +86,52 @@ def ask():
         repo_url = data['repoUrl']
         question = data['question']
         branch = data.get('branch', 'main')
+        try:
+            path_filter = PathFilter.from_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Answers depend on which files were indexed, so custom filters get their own cache space
+        cache_repo = repo_url if path_filter.key is None else f"{repo_url}#{path_filter.key}"
 
         logger.info(f"Processing: {repo_url}, branch: {branch}, question: {question}")
-        chunks = parse_github_repo(repo_url, branch)
-
-        if not chunks:
-            return jsonify({"error": "No code chunks found in the repository"}), 404
-
-        answer = embed_and_search(chunks, question)
-        return jsonify({"answer": answer})
 
+        # The cache lookup costs a GitHub call and an embedding, so it has its own wider limit;
+        # only a miss goes on to queue for the index build and LLM call
+        question_embedding = None
+        with admission_slot('ask_lookup'):
+            try:
+                commit_sha = resolve_commit(repo_url, branch)
+            except Exception as e:
+                logger.warning(f"Could not resolve commit for answer cache: {str(e)}")
+                commit_sha = None
+
+            if commit_sha:
+                question_embedding = get_embed_model().get_query_embedding(question)
+                cached = answer_cache.lookup(cache_repo, branch, commit_sha, question_embedding)
+                if cached:
+                    logger.info(f"Answer cache hit (similarity {cached['similarity']:.3f}) for: {cached['question']}")
+                    return jsonify({"answer": cached["answer"], "cached": True})
+
+        with admission_slot('ask'):
+            get_prefetcher().cancel_other_branches(repo_url, branch)
+            snapshot = get_snapshot(repo_url, branch)
+            chunks = snapshot.documents(path_filter)
+
+            if not chunks:
+                return jsonify({"error": "No code chunks found in the repository"}), 404
+
+            index_key = (snapshot.owner, snapshot.repo, snapshot.commit_sha)
+            if path_filter.key is not None:
+                index_key += (path_filter.key,)
+            get_prefetcher().record_ask(repo_url, branch, index_key, warm=peek_index(index_key) is not None)
+            answer = embed_and_search(chunks, question, index_key=index_key)
+        if commit_sha:
+            answer_cache.store(cache_repo, branch, commit_sha, question, question_embedding, answer)
+        return jsonify({"answer": answer, "cached": False})
+
+    except AdmissionRejected as e:
+        logger.warning(f"/ask rejected ({e.status}): {e.reason}")
+        return rejection_response(e)
     except Exception as e:
         logger.error(f"Error in /ask endpoint: {str(e)}", exc_info=True)
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -82,7 +140,22 @@ def ask():
 def health_check():
     return jsonify({"status": "ok", "message": "Service is running"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        "admission": admission_stats(),
+        "llm_backends": pool_stats(),
+        "llm_usage": usage_stats(),
+        "answer_cache": answer_cache.stats(),
+        "snapshots": snapshot_cache.stats(),
+        "indexes": index_cache_stats(),
+        "prefetch": get_prefetcher().stats(),
+        "readmes": readme_gen.readme_cache.stats(),
+        "process": process_stats(),
+    })
+
 @app.route('/api/readme-gen/generate', methods=['POST'])
+@admission_controlled('readme')
 def generate_readme():
     try:
         data = request.json
@@ -91,7 +164,20 @@ def generate_readme():
         if not github_url:
             return jsonify({"success": False, "error": "GitHub URL is required"}), 400
 
-        readme_content = readme_gen.generate_readme(github_url)
+        try:
+            path_filter = PathFilter.from_request(data)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        hierarchical = data.get('mode') == 'hierarchical'
+        if data.get('instant'):
+            # Template or stored README now; the LLM version is (re)generated in the background
+            result = readme_gen.generate_readme_instant(github_url, hierarchical=hierarchical,
+                                                        path_filter=path_filter)
+            return jsonify({"success": True, "data": result})
+
+        readme_content = readme_gen.generate_readme(github_url, hierarchical=hierarchical,
+                                                    path_filter=path_filter)
 
         if readme_content.startswith("Error generating README:"):
             return jsonify({"success": False, "error": readme_content}), 500
@@ -107,6 +193,7 @@ def generate_readme():
         return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
 
 @app.route('/api/file-summary/generate-preview', methods=['POST'])
+@admission_controlled('summary')
 def generate_file_summary_preview():
     try:
         data = request.json
@@ -115,7 +202,20 @@ def generate_file_summary_preview():
         if not github_url:
             return jsonify({"success": False, "error": "GitHub URL is required"}), 400
 
-        summary_content = summarize_repo_as_string(github_url)
+        try:
+            path_filter = PathFilter.from_request(data)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        hierarchical = data.get('mode') == 'hierarchical'
+        repo_data = get_snapshot(github_url).repo_data(path_filter)
+        forecast = forecast_hierarchical(repo_data) if hierarchical else forecast_summary(repo_data['files'])
+        if data.get('forecastOnly'):
+            return jsonify({"success": True, "data": {"forecast": forecast}})
+
+        if hierarchical:
+            summary_content = format_hierarchical_summary(summarize_repo_hierarchical(repo_data))
+        else:
+            summary_content = summarize_repo_as_string(github_url, path_filter)
 
         if not summary_content:
             return jsonify({"success": False, "error": "No summary was generated."}), 500
@@ -125,7 +225,9 @@ def generate_file_summary_preview():
         return jsonify({
             "success": True,
             "data": {
-                "summary_content": summary_content
+                "summary_content": summary_content,
+                "forecast": forecast,
+                "usage": current_usage().to_dict()
             }
         })
 
@@ -168,21 +270,82 @@ def generate_file_summary():
             "error": f"Server error: {str(e)}"
         }), 500
 
-if __name__ == '__main__':
-    required_vars = ['GITHUB_TOKEN']
-    missing_vars = [var for var in required_vars if not os.getenv(var)]
+def batch_jobs_enabled():
+    # Off under serve.py with WORKERS > 1, where jobs would be pinned to one worker
+    return os.getenv('BATCH_JOBS', '1') != '0'
 
+@app.route('/api/batch/jobs', methods=['POST'])
+def create_batch_job():
+    if not batch_jobs_enabled():
+        return jsonify({"success": False, "error": "Batch jobs are disabled on this server"}), 503
     try:
-        from github import Github as PyGithub
-    except ImportError:
-        print("Installing PyGithub...")
-        import subprocess
-        subprocess.check_call(["pip", "install", "PyGithub"])
-        print("PyGithub installed successfully")
+        data = request.get_json(silent=True) or {}
+        repos = data.get('repos')
+        if not repos or not isinstance(repos, list):
+            return jsonify({"success": False, "error": "A non-empty list of repos is required"}), 400
+
+        for repo_url in repos:
+            if not isinstance(repo_url, str):
+                return jsonify({"success": False, "error": f"Repository URLs must be strings, got: {repo_url!r}"}), 400
+            parsed_url = urlparse(repo_url)
+            if not all([parsed_url.scheme, parsed_url.netloc]) or 'github.com' not in parsed_url.netloc:
+                return jsonify({"success": False, "error": f"Invalid or unsupported repository URL: {repo_url}"}), 400
+
+        runner = get_batch_runner()
+        job = runner.submit(
+            repos,
+            summaries=data.get('summaries', True),
+            readme=data.get('readme', True),
+            hierarchical=data.get('mode') == 'hierarchical'
+        )
+        return jsonify({"success": True, "data": {**job.to_dict(include_results=False),
+                                                  "forecast": runner.forecast(job)}}), 202
 
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
+
+@app.route('/api/batch/jobs/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    if not batch_jobs_enabled():
+        return jsonify({"success": False, "error": "Batch jobs are disabled on this server"}), 503
+    runner = get_batch_runner()
+    job = runner.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Batch job not found"}), 404
+
+    include_results = request.args.get('results', 'true').lower() != 'false'
+    data = job.to_dict(include_results=include_results)
+    if not data["done"]:
+        data["forecast"] = runner.forecast(job)
+    return jsonify({"success": True, "data": data})
+
+@app.route('/debug/sleep', methods=['GET'])
+def debug_sleep():
+    # Stand-in for a long network wait, used by loadtest.py; off unless explicitly enabled,
+    # and with DEBUG_TOKEN set only for callers sending it as X-Debug-Token
+    if os.getenv('ENABLE_DEBUG_ENDPOINTS') != '1':
+        return jsonify({"error": "Not found"}), 404
+    token = os.getenv('DEBUG_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('X-Debug-Token', ''), token):
+        return jsonify({"error": "Not found"}), 404
+    try:
+        seconds = float(request.args.get('seconds', 5))
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    if not 0 <= seconds <= 120:
+        return jsonify({"error": "seconds must be between 0 and 120"}), 400
+    time.sleep(seconds)
+    return jsonify({"slept": seconds})
+
+def check_environment():
+    required_vars = ['GITHUB_TOKEN']
+    missing_vars = [var for var in required_vars if not os.getenv(var)]
     if missing_vars:
         logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
         exit(1)
 
+if __name__ == '__main__':
+    check_environment()
+
     logger.info("Starting Flask server on port 5001...")
     app.run(host='0.0.0.0', port=5001, debug=True)
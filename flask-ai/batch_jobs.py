@@ -0,0 +1,403 @@
+import os
+import sys
+import time
+import uuid
+import threading
+from collections import deque
+from typing import Dict, List, Any
+
+from repo_snapshot import get_snapshot
+import llm_usage
+
+# Forecast inputs until this process has ingested a repo to average over
+FORECAST_FILES_PER_REPO = int(os.getenv("FORECAST_FILES_PER_REPO", "40"))
+FORECAST_TOKENS_PER_FILE = int(os.getenv("FORECAST_TOKENS_PER_FILE", "1500"))
+# Recently ingested repos the forecast averages over
+FORECAST_WINDOW = int(os.getenv("FORECAST_WINDOW", "100"))
+# Finished jobs are dropped this long after they finish, oldest first beyond BATCH_MAX_JOBS
+BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", "3600"))
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "200"))
+# Attempts of a README call that keeps hitting the LLM quota, and the pause between them
+README_RETRIES = 2
+QUOTA_PAUSE = 60
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every caller of one quota (GitHub API, LLM API).
+
+    `pause()` stops all callers until the given time has passed, which is how
+    a single 429 backs off the whole batch instead of one request at a time.
+    """
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, int(per_minute // 6))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+        time.sleep(seconds)
+
+
+class QuotaScheduler:
+    """GitHub and LLM quotas shared across all repos of all batch jobs."""
+    def __init__(self, github_per_minute=None, llm_per_minute=None):
+        self.github = RateLimiter(github_per_minute or float(os.getenv("GITHUB_REQUESTS_PER_MINUTE", "80")))
+        self.llm = RateLimiter(llm_per_minute or float(os.getenv("LLM_REQUESTS_PER_MINUTE", "15")))
+
+
+class BatchJob:
+    def __init__(self, repos: List[str], summaries=True, readme=True, hierarchical=False):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.created_at = time.time()
+        self.summaries = summaries
+        self.readme = readme
+        # READMEs built on a hierarchical summary, like /api/readme-gen/generate with mode=hierarchical
+        self.hierarchical = hierarchical
+        self.repos = {
+            url: {
+                "status": "queued",
+                "files_total": 0,
+                "files_done": 0,
+                "error": None,
+                "summary_content": None,
+                "readme_content": None,
+                "readme_version": None,
+                "_summaries": {},
+                "_pending": 0,
+                # LLM calls / prompt tokens still to go; None until ingested
+                "_llm_calls": None,
+                "_llm_tokens": 0,
+            }
+            for url in dict.fromkeys(repos)
+        }
+        self.usage = llm_usage.Usage()
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def is_done(self):
+        return all(r["status"] in ("done", "failed") for r in self.repos.values())
+
+    def check_finished(self, now):
+        """Time the job finished, stamped the first time it is seen done; None while running."""
+        with self.lock:
+            if self.finished_at is None and self.is_done():
+                self.finished_at = now
+            return self.finished_at
+
+    def to_dict(self, include_results=True):
+        repos = {}
+        for url, state in self.repos.items():
+            repos[url] = {k: v for k, v in state.items() if not k.startswith('_')}
+            if not include_results:
+                repos[url].pop("summary_content")
+                repos[url].pop("readme_content")
+        return {
+            "job_id": self.job_id,
+            "created_at": self.created_at,
+            "done": self.is_done(),
+            "usage": self.usage.to_dict(),
+            "repos": repos,
+        }
+
+
+class BatchRunner:
+    """
+    Runs batch jobs on a fixed pool of worker threads.
+
+    Work is queued per repo and workers take tasks round-robin across repos,
+    so one repo waiting on quota never leaves the others idle. Finished jobs
+    are kept for `job_ttl` seconds, and at most `max_jobs` of them.
+    """
+    def __init__(self, workers=None, scheduler=None, job_ttl=None, max_jobs=None):
+        self.scheduler = scheduler or get_quota_scheduler()
+        self.jobs: Dict[str, BatchJob] = {}
+        self.job_ttl = BATCH_JOB_TTL if job_ttl is None else job_ttl
+        self.max_jobs = max_jobs or BATCH_MAX_JOBS
+        self.queues: Dict[tuple, deque] = {}
+        self.order = deque()
+        self.cond = threading.Condition()
+        self._readme_gen = None
+        # (summary files, their prompt tokens) of the last FORECAST_WINDOW repos ingested
+        self.ingested: deque = deque(maxlen=FORECAST_WINDOW)
+        self.workers = workers or int(os.getenv("BATCH_WORKERS", "8"))
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"batch-worker-{i}", daemon=True).start()
+
+    def submit(self, repos: List[str], summaries=True, readme=True, hierarchical=False) -> BatchJob:
+        job = BatchJob(repos, summaries=summaries, readme=readme, hierarchical=hierarchical)
+        with self.cond:
+            self._evict_finished()
+            self.jobs[job.job_id] = job
+        for url in job.repos:
+            self._enqueue(job, url, ("ingest", None))
+        return job
+
+    def get(self, job_id):
+        with self.cond:
+            self._evict_finished()
+            return self.jobs.get(job_id)
+
+    def _evict_finished(self):
+        now = time.time()
+        finished = sorted((job.check_finished(now), job_id) for job_id, job in self.jobs.items()
+                          if job.check_finished(now) is not None)
+        excess = len(finished) - self.max_jobs
+        for i, (finished_at, job_id) in enumerate(finished):
+            if i < excess or now - finished_at >= self.job_ttl:
+                del self.jobs[job_id]
+
+    def _enqueue(self, job, url, task):
+        key = (job.job_id, url)
+        with self.cond:
+            if key not in self.queues:
+                self.queues[key] = deque()
+                self.order.append(key)
+            self.queues[key].append(task)
+            self.cond.notify()
+
+    def _next_task(self):
+        with self.cond:
+            while not self.order:
+                self.cond.wait()
+            key = self.order.popleft()
+            task = self.queues[key].popleft()
+            if self.queues[key]:
+                self.order.append(key)
+            else:
+                del self.queues[key]
+            return key, task
+
+    def _worker(self):
+        while True:
+            (job_id, url), (kind, arg) = self._next_task()
+            with self.cond:
+                job = self.jobs.get(job_id)
+            if job is None:
+                # Tasks left behind by a failed repo of a job that has since been evicted
+                continue
+            try:
+                with llm_usage.usage_scope(job.usage):
+                    if kind == "ingest":
+                        self._ingest(job, url)
+                    elif kind == "summarize":
+                        self._summarize(job, url, *arg)
+                    elif kind == "readme":
+                        self._generate_readme(job, url, arg)
+            except Exception as e:
+                print(f"[batch {job_id}] {kind} failed for {url}: {e}")
+                with job.lock:
+                    state = job.repos[url]
+                    state["status"] = "failed"
+                    state["error"] = str(e)
+
+    def _ingest(self, job, url):
+        with job.lock:
+            state = job.repos[url]
+            state["status"] = "ingesting"
+        repo_data = get_snapshot(url, rate_limiter=self.scheduler.github).repo_data()
+
+        from file_summarizer import select_summary_files
+        summarize_tasks = [
+            ("summarize", (file_path, info.get('content', '')))
+            for file_path, info in select_summary_files(repo_data['files']).items()
+            if info.get('content', '').strip()
+        ]
+        summary_tokens = sum(_task_tokens("summarize", arg) for _, arg in summarize_tasks)
+        self.ingested.append((len(summarize_tasks), summary_tokens))
+
+        tasks = summarize_tasks if job.summaries else []
+        if job.readme:
+            tasks.append(("readme", repo_data))
+
+        with job.lock:
+            state["files_total"] = sum(1 for kind, _ in tasks if kind == "summarize")
+            state["_pending"] = len(tasks)
+            state["_llm_calls"] = len(tasks)
+            state["_llm_tokens"] = (summary_tokens if job.summaries else 0) + (_task_tokens("readme") if job.readme else 0)
+            state["status"] = "processing" if tasks else "done"
+        for task in tasks:
+            self._enqueue(job, url, task)
+
+    def _summarize(self, job, url, file_path, content):
+        from file_summarizer import gemini_flash_summarize
+        summary = gemini_flash_summarize(content, file_path, rate_limiter=self.scheduler.llm)
+        with job.lock:
+            state = job.repos[url]
+            state["_summaries"][file_path] = summary
+            state["files_done"] += 1
+            state["_llm_calls"] -= 1
+            state["_llm_tokens"] -= _task_tokens("summarize", (file_path, content))
+        self._task_done(job, url)
+
+    def _generate_readme(self, job, url, repo_data):
+        if self._readme_gen is None:
+            from readme_generator import ReadmeGenerator
+            self._readme_gen = ReadmeGenerator()
+        # A quota error pauses the shared LLM limiter, so every batch worker waits, not just this one
+        readme_content, version = self._readme_gen.generate_readme_for_data(
+            repo_data, hierarchical=job.hierarchical, rate_limiter=self.scheduler.llm,
+            retries=README_RETRIES, quota_pause=QUOTA_PAUSE)
+        with job.lock:
+            state = job.repos[url]
+            state["readme_content"] = readme_content
+            state["readme_version"] = version
+            state["_llm_calls"] -= 1
+            state["_llm_tokens"] -= _task_tokens("readme")
+        self._task_done(job, url)
+
+    def forecast(self, job: BatchJob) -> Dict[str, Any]:
+        """Estimated time left for a job's LLM calls under the current quota and worker count."""
+        from file_summarizer import GEMINI_MODEL
+        from llm_pool import get_gemini_pool
+
+        # Copied first: workers append while this runs
+        ingested = list(self.ingested)
+        if ingested:
+            files_per_repo = sum(files for files, _ in ingested) / len(ingested)
+            tokens_per_repo = sum(tokens for _, tokens in ingested) / len(ingested)
+        else:
+            files_per_repo = FORECAST_FILES_PER_REPO
+            tokens_per_repo = FORECAST_FILES_PER_REPO * FORECAST_TOKENS_PER_FILE
+        calls = tokens = 0
+        with job.lock:
+            for state in job.repos.values():
+                if state["status"] in ("done", "failed"):
+                    continue
+                if state["_llm_calls"] is not None:
+                    calls += state["_llm_calls"]
+                    tokens += state["_llm_tokens"]
+                    continue
+                if job.summaries:
+                    calls += files_per_repo
+                    tokens += tokens_per_repo
+                if job.readme:
+                    calls += 1
+                    tokens += _task_tokens("readme")
+        backends = get_gemini_pool(GEMINI_MODEL).names()
+        return llm_usage.forecast(round(calls), int(tokens), backends,
+                                  concurrency=self.workers, rate_cap=self.scheduler.llm.rate * 60)
+
+    def _task_done(self, job, url):
+        from file_summarizer import format_summary_document
+        with job.lock:
+            state = job.repos[url]
+            state["_pending"] -= 1
+            if state["_pending"] > 0 or state["status"] == "failed":
+                return
+            if job.summaries:
+                # Sorted by path rather than left in completion order
+                summaries = [
+                    f"## {fp}\n\n{summary}\n\n---\n"
+                    for fp, summary in sorted(state["_summaries"].items()) if summary
+                ]
+                state["summary_content"] = format_summary_document(summaries)
+            state["status"] = "done"
+        print(f"[batch {job.job_id}] Finished {url}")
+
+
+def _task_tokens(kind, arg=None):
+    """Estimated prompt tokens of one LLM task."""
+    if kind == "summarize":
+        from context_builder import estimate_tokens
+        from file_summarizer import SUMMARY_PROMPT_TOKENS
+        return estimate_tokens(arg[1][:12000]) + SUMMARY_PROMPT_TOKENS
+    from context_builder import ContextBuilder
+    # Excerpts fill up to the context budget, plus the README instructions
+    return ContextBuilder().token_budget + 500
+
+
+_runner = None
+_runner_lock = threading.Lock()
+_scheduler = None
+
+
+def get_quota_scheduler() -> QuotaScheduler:
+    """Process-wide quotas, shared by batch jobs and interactive endpoints."""
+    global _scheduler
+    with _runner_lock:
+        if _scheduler is None:
+            _scheduler = QuotaScheduler()
+        return _scheduler
+
+
+def get_batch_runner() -> BatchRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = BatchRunner()
+        return _runner
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    arg_parser = argparse.ArgumentParser(description="Generate READMEs and file summaries for many repositories.")
+    arg_parser.add_argument("repos", nargs="*", help="GitHub repository URLs")
+    arg_parser.add_argument("--file", help="Text file with one repository URL per line")
+    arg_parser.add_argument("--out", default="batch_output", help="Directory for generated files")
+    arg_parser.add_argument("--no-summaries", action="store_true")
+    arg_parser.add_argument("--no-readme", action="store_true")
+    arg_parser.add_argument("--hierarchical", action="store_true",
+                            help="Build READMEs on a hierarchical summary of the repo")
+    args = arg_parser.parse_args(argv)
+
+    repos = list(args.repos)
+    if args.file:
+        with open(args.file) as f:
+            repos.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if not repos:
+        arg_parser.error("no repositories given")
+
+    runner = get_batch_runner()
+    job = runner.submit(repos, summaries=not args.no_summaries, readme=not args.no_readme,
+                        hierarchical=args.hierarchical)
+    estimate = runner.forecast(job)
+    print(f"Submitted batch {job.job_id}: about {estimate['llm_calls']} LLM calls, "
+          f"estimated {estimate['estimated_seconds']:.0f}s (limited by {estimate['bottleneck']})")
+    while True:
+        status = job.to_dict(include_results=False)
+        for url, state in status["repos"].items():
+            print(f"  {url}: {state['status']} ({state['files_done']}/{state['files_total']} files)"
+                  + (f" - {state['error']}" if state['error'] else ""))
+        if status["done"]:
+            break
+        print()
+        time.sleep(10)
+
+    os.makedirs(args.out, exist_ok=True)
+    for url, state in job.repos.items():
+        name = "__".join(url.rstrip('/').split('/')[-2:])
+        if state["readme_content"]:
+            with open(os.path.join(args.out, f"{name}.README.md"), "w") as f:
+                f.write(state["readme_content"])
+        if state["summary_content"]:
+            with open(os.path.join(args.out, f"{name}.summaries.md"), "w") as f:
+                f.write(state["summary_content"])
+    with open(os.path.join(args.out, "results.json"), "w") as f:
+        json.dump(job.to_dict(include_results=False), f, indent=2)
+    failed = [url for url, state in job.repos.items() if state["status"] == "failed"]
+    print(f"Done: {len(job.repos) - len(failed)} succeeded, {len(failed)} failed. Output in {args.out}/")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
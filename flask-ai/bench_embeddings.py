@@ -0,0 +1,98 @@
+"""
+Benchmark CPU embedding backends against the current HuggingFaceEmbedding setup.
+
+Reports chunks/second for each configuration and the accuracy drift of its
+vectors against the reference backend (cosine similarity per chunk and
+top-k retrieval overlap for a few sample questions).
+
+    python bench_embeddings.py [source_dir] [--max-chunks 2000] [--processes 4]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.text_splitter import SentenceSplitter
+
+QUESTIONS = [
+    "How do I run this project?",
+    "Explain the workflow of the application.",
+    "Where is authentication handled?",
+    "How are API requests routed?",
+]
+
+
+def load_chunks(source_dir, max_chunks):
+    docs = SimpleDirectoryReader(
+        source_dir, recursive=True, required_exts=[".py", ".js", ".jsx", ".ts", ".tsx"],
+        exclude=["**/node_modules/**", "**/.git/**", "**/dist/**", "**/build/**"],
+    ).load_data()
+    nodes = SentenceSplitter(chunk_size=512, chunk_overlap=50).get_nodes_from_documents(docs)
+    return [n.get_content() for n in nodes][:max_chunks]
+
+
+def run(name, model, chunks):
+    model.get_text_embedding_batch(chunks[:8])  # warm-up
+    start = time.perf_counter()
+    vectors = np.array(model.get_text_embedding_batch(chunks), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+    queries = np.array([model.get_query_embedding(q) for q in QUESTIONS], dtype=np.float32)
+    print(f"{name:<28} {len(chunks) / elapsed:8.1f} chunks/s  ({elapsed:.2f}s)")
+    return vectors, queries
+
+
+def drift(ref, candidate, k=4):
+    ref_vectors, ref_queries = ref
+    vectors, queries = candidate
+    cos = np.sum(ref_vectors * vectors, axis=1) / (
+        np.linalg.norm(ref_vectors, axis=1) * np.linalg.norm(vectors, axis=1))
+    overlaps = []
+    for rq, q in zip(ref_queries, queries):
+        ref_top = set(np.argsort(-ref_vectors @ rq)[:k])
+        top = set(np.argsort(-vectors @ q)[:k])
+        overlaps.append(len(ref_top & top) / k)
+    return f"cosine mean {cos.mean():.5f} min {cos.min():.5f}, top-{k} overlap {np.mean(overlaps):.0%}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source_dir", nargs="?", default=os.path.dirname(os.path.abspath(__file__)) + "/..")
+    parser.add_argument("--max-chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--skip-onnx", action="store_true")
+    args = parser.parse_args(argv)
+
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    from embedding_engine import CpuEmbeddingEngine
+
+    chunks = load_chunks(args.source_dir, args.max_chunks)
+    print(f"{len(chunks)} chunks from {os.path.abspath(args.source_dir)}\n")
+
+    ref = run("huggingface (current)", HuggingFaceEmbedding(model_name="all-MiniLM-L6-v2"), chunks)
+    configs = [
+        ("cpu, 1 process", dict(processes=1)),
+        (f"cpu, {args.processes} processes", dict(processes=args.processes)),
+    ]
+    if not args.skip_onnx:
+        configs += [
+            ("onnx int8, 1 process", dict(backend="onnx", processes=1)),
+            (f"onnx int8, {args.processes} processes", dict(backend="onnx", processes=args.processes)),
+        ]
+
+    results = []
+    for name, kwargs in configs:
+        engine = CpuEmbeddingEngine(encode_batch_size=args.batch_size, **kwargs)
+        results.append((name, run(name, engine, chunks)))
+        engine.close()
+
+    print("\nDrift against huggingface (current):")
+    for name, result in results:
+        print(f"  {name:<26} {drift(ref, result)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Benchmark the compiled PathFilter against the original per-path list scans.
+
+Generates a synthetic monorepo tree, runs both implementations of the skip,
+document, content and README classification rules over every path, checks
+that they agree on every path, and reports paths/second for each.
+
+    python bench_path_filter.py [--paths 500000] [--seed 0]
+"""
+import os
+import time
+import random
+import argparse
+
+from path_filter import (
+    PathFilter, DEFAULT_PATH_FILTER,
+    DOC_EXCLUDE_DIRECTORIES, DOC_EXCLUDE_EXTENSIONS,
+    SKIP_EXTENSIONS, SKIP_FILENAMES, CONTENT_EXTENSIONS,
+)
+
+DIRS = ["src", "lib", "packages", "services", "apps", "components", "utils", "api", "docs",
+        "node_modules", "dist", "build", "coverage", "__pycache__", ".github", ".vscode",
+        "tests", "config", "assets", "internal", "vendor", "Build", "distribution"]
+NAMES = ["index", "main", "app", "utils", "helpers", "server", "client", "README", "LICENSE",
+         "config", "settings", "CHANGELOG", "package", "model", "view", "test_api", "setup"]
+EXTS = [".py", ".js", ".ts", ".tsx", ".jsx", ".json", ".md", ".css", ".scss", ".html", ".yml",
+        ".png", ".svg", ".lock", ".txt", ".go", ".rs", ".java", ".gz", ".PY", "", ".env", ".test.js"]
+EXTRA_FILES = ["package-lock.json", ".gitignore", ".env", "Makefile", "Dockerfile"]
+
+
+def synthetic_tree(n, seed):
+    """About 15 files per directory, directories nested up to 7 deep like a real monorepo."""
+    rng = random.Random(seed)
+    directories = [""]
+    for _ in range(max(1, n // 15)):
+        parent = rng.choice(directories)
+        if parent.count("/") >= 6:
+            parent = ""
+        name = rng.choice(DIRS) + (str(rng.randint(0, 40)) if rng.random() < 0.5 else "")
+        directories.append(f"{parent}/{name}" if parent else name)
+    paths = []
+    for _ in range(n):
+        directory = rng.choice(directories)
+        if rng.random() < 0.03:
+            name = rng.choice(EXTRA_FILES)
+        else:
+            name = rng.choice(NAMES) + rng.choice(EXTS)
+        paths.append(f"{directory}/{name}" if directory else name)
+    return paths
+
+
+# The rules as they were before path_filter, kept here as the reference
+def legacy_should_skip(file_path):
+    norm_path = file_path.replace("\\", "/").lower()
+    fname = os.path.basename(norm_path)
+    ext = os.path.splitext(fname)[1].lower()
+    if (
+        norm_path.startswith("node_modules/") or "/node_modules/" in norm_path
+        or norm_path.startswith(".git/") or "/.git/" in norm_path
+        or norm_path.startswith("dist/") or "/dist/" in norm_path
+        or norm_path.startswith("build/") or "/build/" in norm_path
+        or norm_path.startswith("coverage/") or "/coverage/" in norm_path
+        or norm_path.startswith("__pycache__/") or "/__pycache__/" in norm_path
+    ):
+        return True
+    if ext in SKIP_EXTENSIONS:
+        return True
+    if fname in SKIP_FILENAMES:
+        return True
+    if fname.lower().startswith("readme"):
+        return True
+    return False
+
+
+def legacy_is_document(file_path):
+    if any(file_path.startswith(directory) for directory in DOC_EXCLUDE_DIRECTORIES):
+        return False
+    return f".{os.path.splitext(file_path)[1][1:].lower()}" not in DOC_EXCLUDE_EXTENSIONS
+
+
+def legacy_wants_content(file_path):
+    return any(file_path.endswith(ext) for ext in CONTENT_EXTENSIONS)
+
+
+def legacy_classify(file_path):
+    ext = os.path.splitext(file_path)[-1].lower()
+    if ext in ['.json', '.yml', '.yaml', '.env', '.lock', '.conf', '.ini'] or 'config' in file_path.lower():
+        return 'config_files'
+    elif ext in ['.js', '.jsx', '.ts', '.tsx']:
+        return 'main_files'
+    elif ext in ['.css', '.scss', '.sass', '.less', '.html', '.htm']:
+        return 'frontend_files'
+    elif ext in ['.py', '.java', '.php', '.rb', '.go', '.rs']:
+        return 'backend_files'
+    elif ext in ['.md'] or any(name in file_path.lower() for name in ['readme', 'changelog', 'contributing', 'license']):
+        return 'documentation'
+    elif ext in ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.pdf', '.doc', '.docx']:
+        return 'assets'
+    elif ext in ['.test.js', '.test.ts', '.spec.js', '.spec.ts']:
+        return 'test_files'
+    return None
+
+
+def timed(name, fn, paths, baseline=None):
+    start = time.perf_counter()
+    results = [fn(p) for p in paths]
+    elapsed = time.perf_counter() - start
+    speedup = f"  {baseline / elapsed:5.1f}x" if baseline else ""
+    print(f"  {name:<22} {len(paths) / elapsed / 1e6:6.2f} M paths/s  ({elapsed:.3f}s){speedup}")
+    return results, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", type=int, default=500000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    paths = synthetic_tree(args.paths, args.seed)
+    print(f"{len(paths)} synthetic paths, {len({p.rpartition('/')[0] for p in paths})} directories\n")
+
+    # Fresh instance so the directory memo starts cold
+    compiled = PathFilter()
+    rules = [
+        ("should_skip", legacy_should_skip, compiled.should_skip),
+        ("is_document", legacy_is_document, compiled.is_document),
+        ("wants_content", legacy_wants_content, compiled.wants_content),
+        ("classify", legacy_classify, compiled.classify),
+    ]
+    total_legacy = total_compiled = 0.0
+    for name, legacy, new in rules:
+        print(name)
+        expected, legacy_time = timed("legacy list scans", legacy, paths)
+        actual, compiled_time = timed("PathFilter", new, paths, baseline=legacy_time)
+        mismatches = [p for p, a, b in zip(paths, expected, actual) if a != b]
+        if mismatches:
+            raise SystemExit(f"{name}: {len(mismatches)} mismatches, e.g. {mismatches[:5]}")
+        total_legacy += legacy_time
+        total_compiled += compiled_time
+
+    print(f"\nall rules agree on every path; total {total_legacy:.2f}s -> {total_compiled:.2f}s "
+          f"({total_legacy / total_compiled:.1f}x)")
+
+    custom = PathFilter(include=["src/**", "*.py"], exclude=["**/tests/", "*.min.js"], exclude_dirs=["src/vendor"])
+    print("\nper-request filter (include/exclude globs + excluded directory)")
+    timed("should_skip", custom.should_skip, paths)
+    timed("is_document", custom.is_document, paths)
+    assert DEFAULT_PATH_FILTER.key is None and custom.key is not None
+
+
+if __name__ == "__main__":
+    main()
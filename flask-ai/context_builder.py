@@ -0,0 +1,225 @@
+import os
+import re
+import json
+from typing import Dict, Any
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Count tokens with tiktoken when available, otherwise ~4 chars per token."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+# Files that describe how the project is built or run
+MANIFEST_FILES = {
+    "package.json": 9.0,
+    "requirements.txt": 8.0,
+    "pyproject.toml": 8.0,
+    "setup.py": 7.0,
+    "setup.cfg": 5.0,
+    "pipfile": 6.0,
+    "dockerfile": 6.0,
+    "docker-compose.yml": 5.0,
+    "docker-compose.yaml": 5.0,
+    "cargo.toml": 8.0,
+    "go.mod": 8.0,
+    "pom.xml": 7.0,
+    "build.gradle": 7.0,
+    "makefile": 4.0,
+}
+
+# Conventional entrypoint names when no manifest says otherwise
+ENTRYPOINT_NAMES = {
+    "app.py", "main.py", "manage.py", "wsgi.py", "server.py", "__main__.py",
+    "index.js", "server.js", "app.js", "main.js",
+    "index.ts", "server.ts", "main.ts", "app.ts",
+    "main.jsx", "main.tsx", "app.jsx", "app.tsx", "main.go", "main.rs",
+}
+
+SOURCE_EXTENSIONS = {'.js', '.jsx', '.ts', '.tsx', '.py', '.go', '.rs', '.java', '.rb', '.php'}
+JS_EXTENSIONS = ('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs')
+
+PY_IMPORT_RE = re.compile(r'^\s*(?:from\s+(\.*[\w.]*)\s+import|import\s+([\w.]+))', re.MULTILINE)
+JS_IMPORT_RE = re.compile(r'''(?:import\s[^'"]*?from\s*|import\s*\(?\s*|require\s*\(\s*)['"]([^'"]+)['"]''')
+PY_MAIN_RE = re.compile(r'''if\s+__name__\s*==\s*['"]__main__['"]''')
+
+
+class ContextBuilder:
+    """
+    Picks file excerpts for an LLM prompt under a fixed token budget.
+
+    Files are ranked by cheap signals (manifests, entrypoints, import-graph
+    in-degree, documentation) and excerpts are only built for files that
+    actually make it into the budget.
+    """
+    def __init__(self, token_budget=None, max_file_tokens=1500, min_excerpt_tokens=120):
+        self.token_budget = token_budget or int(os.getenv("README_CONTEXT_TOKENS", "8000"))
+        self.max_file_tokens = max_file_tokens
+        self.min_excerpt_tokens = min_excerpt_tokens
+
+    def build(self, files: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        candidates = {
+            fp: finfo.get('content', '') for fp, finfo in files.items()
+            if finfo.get('content') and "node_modules/" not in fp.replace("\\", "/")
+        }
+        scores = self.score_files(candidates)
+        ranked = sorted(scores, key=lambda fp: (-scores[fp], fp.count('/'), fp))
+
+        excerpts = {}
+        used = 0
+        for fp in ranked:
+            remaining = self.token_budget - used
+            if remaining < self.min_excerpt_tokens:
+                break
+            excerpt, tokens = self._make_excerpt(candidates[fp], min(self.max_file_tokens, remaining))
+            if not excerpt:
+                continue
+            excerpts[fp] = excerpt
+            used += tokens
+
+        fill_ratio = used / self.token_budget if self.token_budget else 0.0
+        print(f"README context: {used}/{self.token_budget} tokens ({fill_ratio:.0%} full), "
+              f"{len(excerpts)} of {len(candidates)} files")
+        return {
+            "excerpts": excerpts,
+            "token_count": used,
+            "token_budget": self.token_budget,
+            "fill_ratio": fill_ratio,
+        }
+
+    def score_files(self, contents: Dict[str, str]) -> Dict[str, float]:
+        entrypoints = self._manifest_entrypoints(contents)
+        in_degree = self._import_in_degree(contents)
+        max_in = max(in_degree.values(), default=0) or 1
+
+        scores = {}
+        for fp, content in contents.items():
+            norm = fp.replace("\\", "/")
+            fname = os.path.basename(norm).lower()
+            ext = os.path.splitext(fname)[1]
+            depth = norm.count('/')
+
+            score = 0.0
+            if fname in MANIFEST_FILES:
+                score += MANIFEST_FILES[fname]
+            if norm in entrypoints:
+                score += 8.0
+            elif fname in ENTRYPOINT_NAMES:
+                score += 4.0
+            if ext == '.py' and PY_MAIN_RE.search(content):
+                score += 3.0
+            if fname.startswith('readme'):
+                score += 6.0 if depth == 0 else 2.0
+            if ext in SOURCE_EXTENSIONS:
+                score += 1.0
+            score += 6.0 * in_degree.get(norm, 0) / max_in
+            if 'test' in fname or '/tests/' in f"/{norm}" or '/__tests__/' in f"/{norm}":
+                score -= 3.0
+            score -= 0.5 * depth
+            if ext not in SOURCE_EXTENSIONS and fname not in MANIFEST_FILES and not fname.startswith('readme'):
+                score -= 2.0
+            scores[fp] = score
+        return scores
+
+    def _make_excerpt(self, content: str, max_tokens: int):
+        """Take the head of a file, cut on a line boundary, within max_tokens."""
+        if max_tokens <= 0:
+            return "", 0
+        # Rough upper bound on characters first so huge files are never tokenized whole
+        head = content[:max_tokens * 6]
+        tokens = estimate_tokens(head)
+        truncated = len(head) < len(content)
+        while tokens > max_tokens and head:
+            head = head[:int(len(head) * max_tokens / tokens * 0.95)]
+            head = head[:head.rfind('\n')] if '\n' in head else head
+            tokens = estimate_tokens(head)
+            truncated = True
+        if not head.strip():
+            return "", 0
+        if truncated:
+            head += "\n... (truncated)"
+            tokens += 4
+        return head, tokens
+
+    def _manifest_entrypoints(self, contents: Dict[str, str]) -> set:
+        entrypoints = set()
+        for fp, content in contents.items():
+            norm = fp.replace("\\", "/")
+            if os.path.basename(norm) != 'package.json':
+                continue
+            base = os.path.dirname(norm)
+            try:
+                package_data = json.loads(content)
+            except Exception:
+                continue
+            refs = []
+            if isinstance(package_data.get('main'), str):
+                refs.append(package_data['main'])
+            bin_field = package_data.get('bin')
+            if isinstance(bin_field, str):
+                refs.append(bin_field)
+            elif isinstance(bin_field, dict):
+                refs.extend(v for v in bin_field.values() if isinstance(v, str))
+            for script in (package_data.get('scripts') or {}).values():
+                if isinstance(script, str):
+                    refs.extend(w for w in script.split() if w.endswith(JS_EXTENSIONS + ('.py',)))
+            for ref in refs:
+                path = os.path.normpath(os.path.join(base, ref)).replace("\\", "/")
+                entrypoints.add(path)
+        return entrypoints
+
+    def _import_in_degree(self, contents: Dict[str, str]) -> Dict[str, int]:
+        paths = {fp.replace("\\", "/") for fp in contents}
+        py_modules = {}
+        for path in paths:
+            if path.endswith('.py'):
+                module = path[:-3].replace('/', '.')
+                if module.endswith('.__init__'):
+                    module = module[:-9]
+                py_modules[module] = path
+                # Allow "import foo" to resolve to foo.py inside a subfolder app root
+                py_modules.setdefault(module.rsplit('.', 1)[-1], path)
+
+        in_degree = {}
+        for fp, content in contents.items():
+            src = fp.replace("\\", "/")
+            targets = set()
+            if src.endswith('.py'):
+                for rel, absolute in PY_IMPORT_RE.findall(content):
+                    name = (rel or absolute).lstrip('.')
+                    while name:
+                        if name in py_modules:
+                            targets.add(py_modules[name])
+                            break
+                        name = name.rpartition('.')[0]
+            elif src.endswith(JS_EXTENSIONS):
+                for ref in JS_IMPORT_RE.findall(content):
+                    if not ref.startswith('.'):
+                        continue
+                    target = self._resolve_js(os.path.dirname(src), ref, paths)
+                    if target:
+                        targets.add(target)
+            targets.discard(src)
+            for target in targets:
+                in_degree[target] = in_degree.get(target, 0) + 1
+        return in_degree
+
+    def _resolve_js(self, base: str, ref: str, paths: set):
+        path = os.path.normpath(os.path.join(base, ref)).replace("\\", "/")
+        if path in paths:
+            return path
+        for ext in JS_EXTENSIONS:
+            if path + ext in paths:
+                return path + ext
+            if f"{path}/index{ext}" in paths:
+                return f"{path}/index{ext}"
+        return None
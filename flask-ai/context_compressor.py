@@ -0,0 +1,157 @@
+import os
+import re
+import time
+from typing import List, Optional
+
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from context_builder import estimate_tokens
+
+IMPORT_RE = re.compile(
+    r'^\s*(?:'
+    r'import\s+[\w., ]+(?:\s+as\s+\w+)?\s*$'                      # python: import x, y
+    r'|from\s+[\w.]+\s+import\s+[^(]*$'                            # python: from x import y
+    r'|import\s.*\sfrom\s+[\'"][^\'"]+[\'"];?\s*$'                 # js: import x from 'y'
+    r'|import\s+[\'"][^\'"]+[\'"];?\s*$'                           # js: import 'y'
+    r'|(?:const|let|var)\s+[\w{}\s,]+=\s*require\([\'"][^\'"]+[\'"]\);?\s*$'  # js: require
+    r'|[\'"]use strict[\'"];?\s*$'
+    r')'
+)
+COMMENT_LINE_RE = re.compile(r'^\s*(?:#|//|/\*|\*|\*/)')
+LICENSE_RE = re.compile(r'licen[cs]e|copyright|spdx', re.IGNORECASE)
+# The splitter drops whitespace between chunks, so "adjacent" allows a small gap
+ADJACENT_GAP_CHARS = 16
+
+
+class ContextCompressor(BaseNodePostprocessor):
+    """
+    Shrinks retrieved chunks before they reach the LLM.
+
+    Overlapping or adjacent chunks of the same file are merged, duplicates
+    dropped, import lines and license headers trimmed, and the result is cut
+    to `max_tokens`, keeping the highest-scoring context first.
+    """
+    max_tokens: int = Field(default=1500, description="Token cap for all retrieved context.")
+    strip_imports: bool = Field(default=True)
+    last_stats: dict = Field(default_factory=dict, exclude=True)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextCompressor"
+
+    @classmethod
+    def from_env(cls):
+        return cls(max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "1500")))
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        tokens_before = sum(estimate_tokens(n.node.get_content()) for n in nodes)
+
+        merged = self._merge_same_file(nodes)
+        compressed = []
+        seen = set()
+        used = 0
+        for nws in sorted(merged, key=lambda n: -(n.score or 0.0)):
+            text = self._trim(nws.node.get_content())
+            fingerprint = " ".join(text.split())
+            if not fingerprint or fingerprint in seen or any(fingerprint in s for s in seen):
+                continue
+            seen.add(fingerprint)
+
+            tokens = estimate_tokens(text)
+            remaining = self.max_tokens - used
+            if remaining <= 50:
+                break
+            if tokens > remaining:
+                # Cut on a line boundary; estimate_tokens is ~linear in length
+                text = text[:int(len(text) * remaining / tokens)]
+                text = text[:text.rfind("\n")] if "\n" in text else text
+                tokens = estimate_tokens(text)
+            used += tokens
+            compressed.append(NodeWithScore(
+                node=TextNode(text=text, metadata=nws.node.metadata,
+                              excluded_llm_metadata_keys=nws.node.excluded_llm_metadata_keys,
+                              excluded_embed_metadata_keys=nws.node.excluded_embed_metadata_keys),
+                score=nws.score,
+            ))
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.last_stats = {
+            "chunks_before": len(nodes),
+            "chunks_after": len(compressed),
+            "tokens_before": tokens_before,
+            "tokens_after": used,
+            "compress_ms": elapsed_ms,
+        }
+        print(f"Context compression: {len(nodes)} -> {len(compressed)} chunks, "
+              f"{tokens_before} -> {used} tokens in {elapsed_ms:.1f} ms")
+        return compressed
+
+    def _merge_same_file(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        by_file = {}
+        for nws in nodes:
+            key = nws.node.ref_doc_id or nws.node.metadata.get("file_path") or nws.node.node_id
+            by_file.setdefault(key, []).append(nws)
+
+        merged = []
+        for group in by_file.values():
+            group.sort(key=lambda n: (n.node.start_char_idx is None, n.node.start_char_idx or 0))
+            current = group[0]
+            current_text = current.node.get_content()
+            for nws in group[1:]:
+                text = nws.node.get_content()
+                joined = self._join(current, current_text, nws, text)
+                if joined is None:
+                    merged.append(self._with_text(current, current_text))
+                    current, current_text = nws, text
+                else:
+                    current_text = joined
+                    current = NodeWithScore(node=current.node, score=max(current.score or 0.0, nws.score or 0.0))
+                    current.node = current.node.model_copy(update={"end_char_idx": nws.node.end_char_idx})
+            merged.append(self._with_text(current, current_text))
+        return merged
+
+    def _join(self, first, first_text, second, second_text):
+        """Join two chunks of one file if they overlap or touch, else None.
+
+        Overlapping chunks are only joined once the shared text is found;
+        otherwise they stay apart rather than repeat it.
+        """
+        a_end, b_start = first.node.end_char_idx, second.node.start_char_idx
+        if a_end is None or b_start is None or b_start > a_end + ADJACENT_GAP_CHARS:
+            return None
+        overlap = a_end - b_start
+        if overlap > 0:
+            # Offsets can drift from the chunk text after whitespace normalization; verify and search nearby
+            for k in range(min(overlap + 20, len(second_text), len(first_text)), max(overlap // 2, 1) - 1, -1):
+                if first_text.endswith(second_text[:k]):
+                    return first_text + second_text[k:]
+            return None
+        return first_text + "\n" + second_text
+
+    def _with_text(self, nws, text):
+        if text == nws.node.get_content():
+            return nws
+        return NodeWithScore(node=nws.node.model_copy(update={"text": text}), score=nws.score)
+
+    def _trim(self, text: str) -> str:
+        lines = text.split("\n")
+        # Leading comment block that mentions a license or copyright
+        header_end = 0
+        while header_end < len(lines) and (COMMENT_LINE_RE.match(lines[header_end]) or not lines[header_end].strip()):
+            header_end += 1
+        if header_end and LICENSE_RE.search("\n".join(lines[:header_end])):
+            lines = lines[header_end:]
+
+        if self.strip_imports:
+            lines = [line for line in lines if not IMPORT_RE.match(line)]
+
+        # Collapse runs of blank lines
+        out = []
+        for line in lines:
+            if line.strip() or (out and out[-1].strip()):
+                out.append(line.rstrip())
+        return "\n".join(out).strip()
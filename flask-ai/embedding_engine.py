@@ -0,0 +1,161 @@
+import os
+import atexit
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Dynamic int8 quantized export shipped in the model repo; AVX2 runs on any modern x86 CPU
+DEFAULT_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+# Model loaded inside each pool worker process
+_worker_model = None
+# Live engines, so a forked child can drop process pools that belong to its parent
+_engines: List[weakref.ref] = []
+
+
+def load_sentence_model(model_name, backend="torch", onnx_file=None):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        return SentenceTransformer(
+            model_name,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": onnx_file or DEFAULT_ONNX_FILE},
+        )
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def _init_worker(model_name, backend, onnx_file, threads):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = load_sentence_model(model_name, backend, onnx_file)
+
+
+def _encode_in_worker(texts, batch_size):
+    return _worker_model.encode(
+        texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True
+    ).tolist()
+
+
+class CpuEmbeddingEngine(BaseEmbedding):
+    """
+    CPU embedding model tuned for throughput.
+
+    Inputs are sorted by length before batching so each batch pads to similar
+    lengths, and large inputs are spread over a pool of worker processes, each
+    with its own copy of the model. `backend="onnx"` runs the int8-quantized
+    ONNX export through onnxruntime instead of torch.
+    """
+    backend: str = Field(default="torch", description="'torch' or 'onnx'.")
+    onnx_file: Optional[str] = Field(default=None, description="ONNX file inside the model repo.")
+    encode_batch_size: int = Field(default=32, gt=0, description="Batch size of each forward pass.")
+    processes: int = Field(default=1, ge=1, description="Worker processes; 1 encodes in-process.")
+
+    _model: Any = PrivateAttr(default=None)
+    _pool: Any = PrivateAttr(default=None)
+
+    def __init__(self, model_name=DEFAULT_MODEL, backend="torch", onnx_file=None,
+                 encode_batch_size=32, processes=1, **kwargs):
+        # Hand whole index batches to _get_text_embeddings so sorting sees all of them
+        kwargs.setdefault("embed_batch_size", 2048)
+        super().__init__(
+            model_name=model_name,
+            backend=backend,
+            onnx_file=onnx_file,
+            encode_batch_size=encode_batch_size,
+            processes=processes,
+            **kwargs,
+        )
+        self._model = load_sentence_model(model_name, backend, onnx_file)
+        _engines.append(weakref.ref(self))
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CpuEmbeddingEngine"
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            model_name=os.getenv("EMBED_MODEL", DEFAULT_MODEL),
+            backend="onnx" if os.getenv("EMBED_BACKEND") == "onnx" else "torch",
+            onnx_file=os.getenv("EMBED_ONNX_FILE") or None,
+            encode_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")),
+            processes=int(os.getenv("EMBED_PROCESSES", str(os.cpu_count() or 1))),
+        )
+
+    def _get_pool(self):
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.processes)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, self.onnx_file, threads),
+            )
+            atexit.register(self.close)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        sorted_texts = [texts[i] for i in order]
+
+        # Small inputs are not worth the IPC round trip
+        if self.processes > 1 and len(texts) >= 2 * self.encode_batch_size:
+            # Several slices per worker keeps the pool balanced as lengths grow
+            slice_size = max(self.encode_batch_size,
+                             -(-len(sorted_texts) // (self.processes * 4)))
+            slices = [sorted_texts[i:i + slice_size] for i in range(0, len(sorted_texts), slice_size)]
+            pool = self._get_pool()
+            sorted_vectors = []
+            for vectors in pool.map(_encode_in_worker, slices, [self.encode_batch_size] * len(slices)):
+                sorted_vectors.extend(vectors)
+        else:
+            sorted_vectors = self._model.encode(
+                sorted_texts, batch_size=self.encode_batch_size,
+                normalize_embeddings=True, convert_to_numpy=True
+            ).tolist()
+
+        vectors = [None] * len(texts)
+        for position, index in enumerate(order):
+            vectors[index] = sorted_vectors[position]
+        return vectors
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._encode([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+
+def _forget_pools_after_fork():
+    # The parent's executor threads and pipes are not usable here; a new pool starts on demand
+    for ref in _engines:
+        engine = ref()
+        if engine is not None:
+            engine._pool = None
+
+
+os.register_at_fork(after_in_child=_forget_pools_after_fork)
@@ -7,7 +7,12 @@ from llama_index.llms.ollama import Ollama
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 # from llama_index.llms import Ollama
 from llama_index.core.text_splitter import SentenceSplitter
-from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.response_synthesizers import get_response_synthesizer
+from llama_index.core.schema import QueryBundle
+from context_compressor import ContextCompressor
+from context_builder import estimate_tokens
+from llm_pool import get_ollama_pool
+import index_store
 from dotenv import load_dotenv
 import os
 
@@ -15,6 +20,102 @@ import os
 # api_key = os.getenv("OPENAI_API_KEY")
 
 import re
+import time
+import threading
+from collections import OrderedDict
+
+_embed_model = None
+_embed_model_lock = threading.Lock()
+
+# Built indexes keyed by (owner, repo, commit SHA); see get_or_build_index
+INDEX_CACHE_SIZE = int(os.getenv("INDEX_CACHE_SIZE", "4"))
+_indexes = OrderedDict()
+_index_inflight = {}
+_index_lock = threading.Lock()
+_index_stats = {"hits": 0, "misses": 0}
+
+def get_embed_model():
+    """
+    Process-wide embedding model, chosen by EMBED_BACKEND:
+    "huggingface" (default), "cpu" (batched/multi-process) or "onnx" (int8 quantized).
+    """
+    global _embed_model
+    with _embed_model_lock:
+        if _embed_model is None:
+            backend = os.getenv("EMBED_BACKEND", "huggingface")
+            if backend in ("cpu", "onnx"):
+                from embedding_engine import CpuEmbeddingEngine
+                _embed_model = CpuEmbeddingEngine.from_env()
+            else:
+                _embed_model = HuggingFaceEmbedding(model_name="all-MiniLM-L6-v2")
+        return _embed_model
+
+def build_index(docs):
+    Settings.embed_model = get_embed_model()
+    Settings.text_splitter = SentenceSplitter(chunk_size=512, chunk_overlap=50)
+    return VectorStoreIndex.from_documents(docs)
+
+def _load_or_update_index(docs, key):
+    """Persisted index for this commit, else the repo's last index patched forward, else a full build."""
+    embed_model = get_embed_model()
+    Settings.embed_model = embed_model
+    Settings.text_splitter = SentenceSplitter(chunk_size=512, chunk_overlap=50)
+    index = index_store.load_persisted(embed_model, key)
+    if index is not None:
+        print(f"Loaded persisted index for {key[0]}/{key[1]}@{key[2][:7]}")
+        return index
+    index = index_store.update_from_latest(docs, embed_model, key, [Settings.text_splitter])
+    if index is None:
+        index = build_index(docs)
+    index_store.persist(index, embed_model, key)
+    return index
+
+def get_or_build_index(docs, key=None):
+    """
+    Index for `docs`, reused across calls with the same key.
+
+    Concurrent calls for one key share a single build, so an /ask that lands
+    while a prefetch is still embedding waits for it instead of starting over.
+    Keyed indexes are persisted per commit (index_store), and a new commit
+    patches the repo's previous index instead of re-embedding everything.
+    """
+    if key is None:
+        return build_index(docs)
+    while True:
+        with _index_lock:
+            index = _indexes.get(key)
+            if index is not None:
+                _indexes.move_to_end(key)
+                _index_stats["hits"] += 1
+                return index
+            event = _index_inflight.get(key)
+            if event is None:
+                event = _index_inflight[key] = threading.Event()
+                _index_stats["misses"] += 1
+                break
+        event.wait()
+
+    try:
+        start = time.perf_counter()
+        index = _load_or_update_index(docs, key)
+        print(f"Index for {key[0]}/{key[1]}@{key[2][:7]} ready in {time.perf_counter() - start:.2f}s")
+        with _index_lock:
+            _indexes[key] = index
+            while len(_indexes) > INDEX_CACHE_SIZE:
+                _indexes.popitem(last=False)
+        return index
+    finally:
+        with _index_lock:
+            _index_inflight.pop(key, None)
+        event.set()
+
+def peek_index(key):
+    with _index_lock:
+        return _indexes.get(key)
+
+def index_cache_stats():
+    with _index_lock:
+        return dict(_index_stats, entries=len(_indexes), building=len(_index_inflight))
 
 def format_response_for_browser(response_text):
     lines = response_text.strip().split('\n')
@@ -54,15 +155,10 @@ def format_response_for_browser(response_text):
     return "\n".join(html_output)
 
 
-def embed_and_search(docs, question):
-    # 1. Set up the embedding model
-    embed_model = HuggingFaceEmbedding(model_name="all-MiniLM-L6-v2")
+def embed_and_search(docs, question, index_key=None):
+    # 1. Set up the embedding model (inside build_index)
     # Settings.llm = Ollama(model="llama3")
-    Settings.embed_model = embed_model
-    llm = llm = Ollama(model="gemma:2b", request_timeout=300, temperature=0.3, streaming=False)
-
-    Settings.llm = llm
-    Settings.text_splitter = SentenceSplitter(chunk_size=512, chunk_overlap=50)
+    # The LLM comes from the Ollama backend pool per query (see step 5), not from global Settings
 
     # 2. Service context
     # service_context = ServiceContext.from_defaults(
@@ -70,19 +166,48 @@ def embed_and_search(docs, question):
     #     text_splitter=SentenceSplitter(chunk_size=512, chunk_overlap=50),
     # )
 
-    # 3. Create the index
-    index = VectorStoreIndex.from_documents(docs)
+    # 3. Create the index, or reuse the one already built for this commit
+    index = get_or_build_index(docs, index_key)
     
 
     # 4. Create a retriever-based query engine
     retriever = index.as_retriever(similarity_top_k=4)
     concise_question = f"{question.strip()} Explain neatly in a length that is suitable for the question, so that a beginner can understand. The main goal is making a user ready to work with this repo. Use the necessary files to answer this. If it is about the entire repository, refer all the files in the repository and answer. If asked for workflow or any similar question explain with the help of all files, including all the functionalities and features and how they work together."
 
-    query_engine = RetrieverQueryEngine.from_args(retriever)
+    # Compress retrieved chunks before generation; CONTEXT_COMPRESSION=0 disables it for comparison
+    node_postprocessors = []
+    compressor = None
+    if os.getenv("CONTEXT_COMPRESSION", "1") != "0":
+        compressor = ContextCompressor.from_env()
+        node_postprocessors.append(compressor)
     print(f"Concise question: {concise_question}")
 
-    # 5. Query the index
-    response = query_engine.query(concise_question)
+    # 5. Retrieve once, so a failover below does not search the index again and generation is timed alone
+    start = time.perf_counter()
+    query_bundle = QueryBundle(concise_question)
+    nodes = retriever.retrieve(query_bundle)
+    for postprocessor in node_postprocessors:
+        nodes = postprocessor.postprocess_nodes(nodes, query_bundle=query_bundle)
+    retrieval_elapsed = time.perf_counter() - start
+
+    # 6. Generate on the least-loaded Ollama host, failing over to the others
+    def run_query(backend):
+        return get_response_synthesizer(llm=backend.client).synthesize(query_bundle, nodes)
+
+    start = time.perf_counter()
+    response = get_ollama_pool().call(run_query)
+    generation_elapsed = time.perf_counter() - start
+    question_tokens = estimate_tokens(concise_question)
+    if compressor is not None and compressor.last_stats:
+        stats = compressor.last_stats
+        print(f"Prompt tokens: {question_tokens + stats['tokens_before']} before compression, "
+              f"{question_tokens + stats['tokens_after']} after "
+              f"(retrieval {retrieval_elapsed:.2f}s incl. compression {stats['compress_ms']:.1f} ms, "
+              f"generation {generation_elapsed:.2f}s)")
+    else:
+        context_tokens = sum(estimate_tokens(n.node.get_content()) for n in nodes)
+        print(f"Prompt tokens: {question_tokens + context_tokens} "
+              f"(uncompressed, retrieval {retrieval_elapsed:.2f}s, generation {generation_elapsed:.2f}s)")
     formatted_response = format_response_for_browser(str(response))
 
     return str(response)
@@ -2,20 +2,30 @@ import os
 import time
 from fpdf import FPDF
 from dotenv import load_dotenv
-from github_parser import GitHubParser
-import google.generativeai as genai
+from repo_snapshot import get_snapshot
+from llm_pool import get_gemini_pool
+from path_filter import DEFAULT_PATH_FILTER
+from context_builder import estimate_tokens
+import llm_usage
 
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEYS")
 if not GEMINI_API_KEY:
     raise RuntimeError("GEMINI_API_KEY not found in environment or .env file.")
 
-# Configure Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash-latest')
+# Gemini keys/models are pooled (GEMINI_API_KEYS, GEMINI_MODELS); this is the default model
+GEMINI_MODEL = 'gemini-1.5-flash-latest'
+# Instructions around the file content in a summary prompt, for forecasting
+SUMMARY_PROMPT_TOKENS = 60
+# Pause between files in summarize_repo_as_string
+SUMMARY_PAUSE = 5
 
-def gemini_flash_summarize(text, file_path):
+class SummaryUnavailable(Exception):
+    """The LLM produced no summary (quota exhausted or an error) after all retries."""
+
+
+def gemini_flash_summarize(text, file_path, rate_limiter=None, strict=False):
     prompt = (
         f"You are a helpful AI code assistant. Summarize the following file for a developer. "
         f"Explain what the file does, its main features, and any important implementation details. "
@@ -24,38 +34,73 @@ def gemini_flash_summarize(text, file_path):
         f"{text[:12000]}\n"
         f"--- FILE CONTENT END ---"
     )
+    return gemini_generate(prompt, file_path, text[:300], rate_limiter=rate_limiter, strict=strict)
+
+def gemini_generate(prompt, label, fallback, rate_limiter=None, strict=False):
+    """
+    Run a Gemini prompt with rate-limit retries, returning fallback on failure.
+
+    With strict=True a failure raises SummaryUnavailable instead, for callers
+    that must not mistake the fallback for real LLM output (e.g. to cache it).
+    """
     max_retries = 2
     for attempt in range(max_retries):
         try:
-            response = model.generate_content(prompt)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            # Fails over across pooled keys/models; only raises when all of them fail
+            response = get_gemini_pool(GEMINI_MODEL).call(lambda backend: backend.client.generate_content(prompt))
             summary = response.text.strip()
             return summary
         except Exception as e:
             err_msg = str(e)
             if '429' in err_msg or "quota" in err_msg.lower() or "rate limit" in err_msg.lower():
                 wait_time = 60  # Wait 60 seconds between retries
-                print(f"Rate limit hit while summarizing {file_path}, waiting {wait_time} seconds before retrying... (Attempt {attempt+1}/{max_retries})")
-                time.sleep(wait_time)
+                print(f"Rate limit hit while summarizing {label}, waiting {wait_time} seconds before retrying... (Attempt {attempt+1}/{max_retries})")
+                if rate_limiter is not None:
+                    # Pause every caller sharing this quota, not just this one
+                    rate_limiter.pause(wait_time)
+                else:
+                    time.sleep(wait_time)
                 continue
-            print(f"Error summarizing {file_path}: {e}")
-            return text[:300]
-    print(f"Failed to summarize {file_path} after {max_retries} attempts due to rate limits.")
-    return text[:300]
+            print(f"Error summarizing {label}: {e}")
+            if strict:
+                raise SummaryUnavailable(f"{label}: {e}") from e
+            return fallback
+    print(f"Failed to summarize {label} after {max_retries} attempts due to rate limits.")
+    if strict:
+        raise SummaryUnavailable(f"{label}: rate limited after {max_retries} attempts")
+    return fallback
 
-def summarize_repo_as_string(repo_url):
-    parser = GitHubParser(repo_url)
-    repo_data = parser.get_repo_data()
-    files = repo_data['files']
-
-    # Filter files to only important types
+def select_summary_files(files):
+    """Filter files to only important types."""
     allowed_exts = ('.py', '.js', '.ts', '.jsx', '.tsx', '.json', '.md')
-    filtered_files = {
+    return {
         path: info for path, info in files.items()
         if path.endswith(allowed_exts)
     }
 
+def forecast_summary(files, concurrency=1, pause=SUMMARY_PAUSE, rate_cap=None):
+    """Run-time estimate for summarizing these files under the current Gemini quota."""
+    contents = [info.get('content', '') for info in select_summary_files(files).values()]
+    contents = [c for c in contents if c.strip()]
+    prompt_tokens = sum(estimate_tokens(c[:12000]) + SUMMARY_PROMPT_TOKENS for c in contents)
+    backends = get_gemini_pool(GEMINI_MODEL).names()
+    return llm_usage.forecast(len(contents), prompt_tokens, backends,
+                              concurrency=concurrency, pause=pause, rate_cap=rate_cap)
+
+def format_summary_document(summaries):
+    return "# File-to-File Summaries \n\n" + "\n".join(summaries)
+
+def summarize_repo_as_string(repo_url, path_filter=DEFAULT_PATH_FILTER):
+    repo_data = get_snapshot(repo_url).repo_data(path_filter)
+    filtered_files = select_summary_files(repo_data['files'])
+
     summaries = []
     total = len(filtered_files)
+    estimate = forecast_summary(filtered_files)
+    print(f"Summarizing {estimate['llm_calls']} files, estimated {estimate['estimated_seconds']:.0f}s "
+          f"(limited by {estimate['bottleneck']})")
 
     for i, (file_path, info) in enumerate(filtered_files.items(), 1):
         content = info.get('content', '')
@@ -84,9 +129,9 @@ def summarize_repo_as_string(repo_url):
         else:
             print(f"Skipped {file_path} due to repeated errors.")
 
-        time.sleep(5)  # Be gentle to avoid quota exhaustion
+        time.sleep(SUMMARY_PAUSE)  # Be gentle to avoid quota exhaustion
 
-    output = "# File-to-File Summaries \n\n" + "\n".join(summaries)
+    output = format_summary_document(summaries)
     return output
 
 # The create_pdf_from_summary function from your provided code remains unchanged.
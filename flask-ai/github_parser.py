@@ -1,81 +1,35 @@
 import os
-from llama_index.readers.github import GithubRepositoryReader
-from llama_index.readers.github import GithubClient
 import requests
 from urllib.parse import urlparse
 import base64
-from typing import Dict, Any
-from github import Github as PyGithub
-from typing import List, Dict, Any
-
-def get_github_branches(repo_url: str) -> List[Dict[str, str]]:
-    """Fetch all branches for a GitHub repository."""
-    try:
-        github_token = os.getenv("GITHUB_TOKEN")
-        g = PyGithub(github_token)
-        
-        # Extract owner and repo name from URL
-        parts = repo_url.strip('/').split('/')
-        owner = parts[-2]
-        repo_name = parts[-1]
-        
-        # Get the repository
-        repo = g.get_repo(f"{owner}/{repo_name}")
-        
-        # Get all branches
-        branches = []
-        for branch in repo.get_branches():
-            branches.append({
-                'name': branch.name,
-                'commit_sha': branch.commit.sha[:7],
-                'protected': branch.protected
-            })
-            
-        return branches
-    except Exception as e:
-        print(f"Error fetching branches: {str(e)}")
-        return []
-
-def parse_github_repo(repo_url: str, branch: str = "main") -> Any:
-    """Parse a GitHub repository from the given URL and branch."""
-    try:
-        # Extract owner and repo name
-        parts = repo_url.strip('/').split('/')
-        owner = parts[-2]
-        repo = parts[-1]
-
-        # GitHub personal access token
-        github_token = os.getenv("GITHUB_TOKEN")
-        github_client = GithubClient(github_token)
-
-
-        reader = GithubRepositoryReader(
-            github_client=github_client,
-            owner=owner,
-            repo=repo,
-            filter_directories=(
-                # Exclude common irrelevant folders
-                [".vscode", "__pycache__", "node_modules", ".github", "dist", "build", "coverage"],
-                GithubRepositoryReader.FilterType.EXCLUDE,
-            ),
-            filter_file_extensions=(
-                # Exclude non-code files (keep only relevant ones)
-                [".md", ".json", ".lock", ".log", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".pdf", ".svg"],
-                GithubRepositoryReader.FilterType.EXCLUDE,
-            ),
-        )
-
-        # Load repo contents from the specified branch
-        print(f"Loading repository data from branch: {branch}")
-        docs = reader.load_data(branch=branch)
-        return docs
-    except Exception as e:
-        print(f"Error parsing repository: {str(e)}")
-        raise
-    # Load repo contents
-    docs = reader.load_data(branch="main")  # or "master" if that’s the default
-
-    return docs
+from functools import lru_cache
+from graphql_fetch import GraphQLBlobFetcher, fetch_mode
+
+from path_filter import PathFilter, DEFAULT_PATH_FILTER, SKIP_EXTENSIONS, SKIP_FILENAMES
+
+MAX_CONTENT_CHARS = 20000
+
+def parse_github_url(url):
+    """Owner and repository name from a GitHub URL."""
+    parsed = urlparse(url)
+    path_parts = parsed.path.strip("/").split("/")
+    if len(path_parts) < 2:
+        raise ValueError("Invalid GitHub repository URL")
+    return path_parts[0], path_parts[1]
+
+def should_skip_file(file_path, skip_extensions=SKIP_EXTENSIONS, skip_filenames=SKIP_FILENAMES):
+    """Filter rule for the raw files dict used by README and summaries."""
+    if skip_extensions is SKIP_EXTENSIONS and skip_filenames is SKIP_FILENAMES:
+        return DEFAULT_PATH_FILTER.should_skip(file_path)
+    return _custom_filter(tuple(skip_extensions), tuple(skip_filenames)).should_skip(file_path)
+
+@lru_cache(maxsize=16)
+def _custom_filter(skip_extensions, skip_filenames):
+    return PathFilter(skip_extensions=skip_extensions, skip_filenames=skip_filenames)
+
+def is_document_file(file_path):
+    """Filter rule for llama_index documents (RepoSnapshot.documents in repo_snapshot)."""
+    return DEFAULT_PATH_FILTER.is_document(file_path)
 
 class GitHubParser:
     """
@@ -84,25 +38,17 @@ class GitHubParser:
 
     All API requests are authenticated using a GitHub token if available.
     """
-    def __init__(self, github_url):
+    def __init__(self, github_url, rate_limiter=None):
         self.github_url = github_url
+        self.rate_limiter = rate_limiter
         self.owner, self.repo = self._parse_github_url(github_url)
         self.api_base = f"https://api.github.com/repos/{self.owner}/{self.repo}"
         self.github_token = os.getenv("GITHUB_TOKEN")
         if not self.github_token:
             print("WARNING: No GITHUB_TOKEN found. You may hit rate limits.")
 
-        # Extensions to skip parsing
-        self.skip_extensions = [
-            ".css", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".mp4",
-            ".mp3", ".wav", ".ogg", ".webm", ".mov", ".avi", ".wmv", ".flv",
-            ".mkv", ".bmp", ".tiff", ".tif", ".webp", ".apng", ".m4a", ".aac",
-            ".flac", ".opus", ".zip", ".tar", ".gz", ".rar", ".7z", ".pdf",
-            ".exe", ".dll"
-        ]
-        self.skip_filenames = [
-            "package-lock.json", ".gitignore"
-        ]
+        # Which paths are parsed and which have their content fetched
+        self.path_filter = DEFAULT_PATH_FILTER
 
     def _get_headers(self):
         headers = {
@@ -112,82 +58,43 @@ class GitHubParser:
             headers["Authorization"] = f"token {self.github_token}"
         return headers
 
+    def _get(self, url):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return requests.get(url, headers=self._get_headers())
+
     def _parse_github_url(self, url):
-        parsed = urlparse(url)
-        path_parts = parsed.path.strip("/").split("/")
-        if len(path_parts) < 2:
-            raise ValueError("Invalid GitHub repository URL")
-        return path_parts[0], path_parts[1]
+        return parse_github_url(url)
 
     def _should_skip(self, file_path):
-        norm_path = file_path.replace("\\", "/").lower()
-        fname = os.path.basename(norm_path)
-        ext = os.path.splitext(fname)[1].lower()
-
-        # Skip if in skip list
-        if (
-            norm_path.startswith("node_modules/")
-            or "/node_modules/" in norm_path
-            or norm_path.startswith(".git/")
-            or "/.git/" in norm_path
-            or norm_path.startswith("dist/")
-            or "/dist/" in norm_path
-            or norm_path.startswith("build/")
-            or "/build/" in norm_path
-            or norm_path.startswith("coverage/")
-            or "/coverage/" in norm_path
-            or norm_path.startswith("__pycache__/")
-            or "/__pycache__/" in norm_path
-        ):
-            return True
-        if ext in self.skip_extensions:
-            return True
-        if fname in self.skip_filenames:
-            return True
-        # Skip readme or similar
-        if fname.lower().startswith("readme"):
-            return True
-        return False
+        return self.path_filter.should_skip(file_path)
 
     def get_repo_data(self):
-        repo_resp = requests.get(self.api_base, headers=self._get_headers())
+        repo_resp = self._get(self.api_base)
         if repo_resp.status_code != 200:
             raise Exception(f"Could not fetch repo metadata: {repo_resp.text}")
         repo_json = repo_resp.json()
 
         branch = repo_json.get("default_branch", "main")
         tree_url = f"{self.api_base}/git/trees/{branch}?recursive=1"
-        tree_resp = requests.get(tree_url, headers=self._get_headers())
+        tree_resp = self._get(tree_url)
         if tree_resp.status_code != 200:
             raise Exception(f"Could not fetch repo tree: {tree_resp.text}")
         tree_json = tree_resp.json()
+        entries = [
+            {"path": item["path"], "sha": item["sha"], "size": item.get("size", 0)}
+            for item in tree_json.get("tree", [])
+            if item["type"] == "blob" and not self._should_skip(item["path"])
+        ]
+        # Only certain extensions will be parsed for content
+        contents = self._fetch_contents([e for e in entries if self.path_filter.wants_content(e["path"])])
         files = {}
-        for item in tree_json.get("tree", []):
-            if item["type"] == "blob":
-                file_path = item["path"]
-                if self._should_skip(file_path):
-                    continue
-                print(f"Parsing file: {file_path}")
-                content = ""
-                # Only certain extensions will be parsed for content
-                if any(file_path.endswith(ext) for ext in [
-                    ".js", ".py", ".json", ".md", ".txt", ".ts",
-                    ".jsx", ".tsx", ".html", ".yml", ".yaml"
-                ]):
-                    file_url = f"{self.api_base}/contents/{file_path}"
-                    file_resp = requests.get(file_url, headers=self._get_headers())
-                    if file_resp.status_code == 200:
-                        content_json = file_resp.json()
-                        if content_json.get("encoding") == "base64":
-                            try:
-                                raw = base64.b64decode(content_json["content"])
-                                content = raw.decode("utf-8", errors="replace")[:20000]
-                            except Exception:
-                                content = ""
-                files[file_path] = {
-                    "type": "file",
-                    "content": content
-                }
+        for e in entries:
+            print(f"Parsing file: {e['path']}")
+            files[e["path"]] = {
+                "type": "file",
+                "content": contents.get(e["path"], "")
+            }
         return {
             "name": repo_json.get("name"),
             "description": repo_json.get("description"),
@@ -197,6 +104,33 @@ class GitHubParser:
             "files": files
         }
 
+    def _fetch_contents(self, entries):
+        """File contents by path: batched GraphQL when available, else one contents call per file."""
+        if fetch_mode() == "graphql":
+            fetcher = GraphQLBlobFetcher(self.owner, self.repo, rate_limiter=self.rate_limiter)
+            blobs = fetcher.fetch(entries, rest_fallback=lambda sha, path: self._fetch_file(path))
+            return {
+                e["path"]: blobs[e["sha"]].decode("utf-8", errors="replace")[:MAX_CONTENT_CHARS]
+                for e in entries if e["sha"] in blobs
+            }
+        contents = {}
+        for e in entries:
+            raw = self._fetch_file(e["path"])
+            if raw is not None:
+                contents[e["path"]] = raw.decode("utf-8", errors="replace")[:MAX_CONTENT_CHARS]
+        return contents
+
+    def _fetch_file(self, file_path):
+        file_resp = self._get(f"{self.api_base}/contents/{file_path}")
+        if file_resp.status_code == 200:
+            content_json = file_resp.json()
+            if content_json.get("encoding") == "base64":
+                try:
+                    return base64.b64decode(content_json["content"])
+                except Exception:
+                    return None
+        return None
+
     def get_all_chunks(self, max_chunk_size=1000):
         """
         Returns a list of dicts:
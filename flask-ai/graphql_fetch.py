@@ -0,0 +1,142 @@
+import os
+import json
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+GITHUB_GRAPHQL_URL = os.getenv("GITHUB_GRAPHQL_URL", "https://api.github.com/graphql")
+# Blobs per query; GitHub accepts more aliases, but responses get slow past ~100
+GRAPHQL_BATCH_SIZE = int(os.getenv("GRAPHQL_BATCH_SIZE", "100"))
+# Summed blob size per query, so one response stays well under the API's size and time limits
+GRAPHQL_BATCH_BYTES = int(os.getenv("GRAPHQL_BATCH_BYTES", str(4 * 1024 * 1024)))
+# Larger blobs go straight to REST; GitHub truncates Blob.text for big files anyway
+GRAPHQL_MAX_BLOB_BYTES = int(os.getenv("GRAPHQL_MAX_BLOB_BYTES", str(512 * 1024)))
+
+BLOB_QUERY_FIELDS = "... on Blob { text isBinary isTruncated byteSize }"
+
+
+class GraphQLQueryTooLarge(Exception):
+    """The API refused or failed a query in a way that a smaller query may avoid."""
+
+
+def fetch_mode():
+    """GRAPHQL_FETCH=0 forces REST; GraphQL always needs a token."""
+    return "graphql" if os.getenv("GRAPHQL_FETCH", "1") != "0" and os.getenv("GITHUB_TOKEN") else "rest"
+
+
+class GraphQLBlobFetcher:
+    """
+    Fetches many blobs of one repository per GraphQL round trip.
+
+    Each query aliases up to `batch_size` `object(oid:)` lookups, split
+    further so their summed size stays under `batch_bytes`. A query that
+    fails for its size or cost is halved and retried; blobs that are binary,
+    truncated, not UTF-8 (text whose encoded length differs from byteSize),
+    too large or still failing on their own are handed to
+    `rest_fallback(sha, path)`.
+    """
+    def __init__(self, owner, repo, rate_limiter=None, session=None, url=None,
+                 batch_size=None, batch_bytes=None, max_blob_bytes=None):
+        self.owner = owner
+        self.repo = repo
+        self.rate_limiter = rate_limiter
+        self.session = session or requests.Session()
+        self.url = url or GITHUB_GRAPHQL_URL
+        self.batch_size = batch_size or GRAPHQL_BATCH_SIZE
+        self.batch_bytes = batch_bytes or GRAPHQL_BATCH_BYTES
+        self.max_blob_bytes = max_blob_bytes or GRAPHQL_MAX_BLOB_BYTES
+        self.queries = 0
+        self.rest_fallbacks = 0
+
+    def fetch(self, entries: List[Dict], rest_fallback: Optional[Callable] = None) -> Dict[str, bytes]:
+        """Contents of tree entries ({"sha", "path", "size"}) keyed by blob SHA."""
+        unique = list({e["sha"]: e for e in entries}.values())
+        blobs: Dict[str, bytes] = {}
+        fallback = [e for e in unique if e.get("size", 0) > self.max_blob_bytes]
+        for batch in self._batches([e for e in unique if e.get("size", 0) <= self.max_blob_bytes]):
+            self._fetch_batch(batch, blobs, fallback)
+
+        if fallback and rest_fallback is not None:
+            for e in fallback:
+                raw = rest_fallback(e["sha"], e["path"])
+                self.rest_fallbacks += 1
+                if raw is not None:
+                    blobs[e["sha"]] = raw
+        print(f"GraphQL fetch {self.owner}/{self.repo}: {len(unique)} blobs in {self.queries} queries, "
+              f"{self.rest_fallbacks} REST fallbacks")
+        return blobs
+
+    def _batches(self, entries):
+        batch, size = [], 0
+        for e in entries:
+            if batch and (len(batch) >= self.batch_size or size + e.get("size", 0) > self.batch_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append(e)
+            size += e.get("size", 0)
+        if batch:
+            yield batch
+
+    def _fetch_batch(self, batch, blobs, fallback):
+        try:
+            objects = self._query(batch)
+        except GraphQLQueryTooLarge as e:
+            if len(batch) == 1:
+                print(f"GraphQL could not fetch {batch[0]['path']} ({e}), using REST")
+                fallback.extend(batch)
+                return
+            half = len(batch) // 2
+            self._fetch_batch(batch[:half], blobs, fallback)
+            self._fetch_batch(batch[half:], blobs, fallback)
+            return
+
+        for i, e in enumerate(batch):
+            obj = objects.get(f"b{i}")
+            if not obj or obj.get("isBinary") or obj.get("isTruncated") or obj.get("text") is None:
+                fallback.append(e)
+                continue
+            raw = obj["text"].encode("utf-8")
+            # Blob.text is a lossy decode of files that are not valid UTF-8; REST returns their bytes
+            expected = obj.get("byteSize") if obj.get("byteSize") is not None else e.get("size")
+            if expected is not None and len(raw) != expected:
+                fallback.append(e)
+                continue
+            blobs[e["sha"]] = raw
+
+    def _query(self, batch) -> Dict[str, Dict]:
+        fields = "\n".join(
+            f'b{i}: object(oid: "{e["sha"]}") {{ {BLOB_QUERY_FIELDS} }}' for i, e in enumerate(batch)
+        )
+        query = f"query($owner: String!, $name: String!) {{\n repository(owner: $owner, name: $name) {{\n{fields}\n }}\n}}"
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        headers = {"Content-Type": "application/json"}
+        token = os.getenv("GITHUB_TOKEN")
+        if token:
+            headers["Authorization"] = f"bearer {token}"
+        self.queries += 1
+        resp = self.session.post(self.url, headers=headers, data=json.dumps({
+            "query": query, "variables": {"owner": self.owner, "name": self.repo},
+        }))
+        # 502/504 are how GitHub reports a query that ran out of time
+        if resp.status_code in (502, 504) or resp.status_code == 413:
+            raise GraphQLQueryTooLarge(f"HTTP {resp.status_code}")
+        if resp.status_code != 200:
+            raise Exception(f"GraphQL request failed: {resp.status_code} {resp.text[:200]}")
+        payload = resp.json()
+        repository = (payload.get("data") or {}).get("repository")
+        errors = payload.get("errors") or []
+        if repository is None:
+            if errors and any(_is_limit_error(err) for err in errors):
+                raise GraphQLQueryTooLarge(errors[0].get("message", "query limit"))
+            raise Exception(f"GraphQL query failed: {errors[:1] or payload}")
+        # Partial data: objects that failed come back null and fall back to REST
+        return repository
+
+
+def _is_limit_error(error):
+    kind = (error.get("type") or "").upper()
+    message = (error.get("message") or "").lower()
+    # Rate limiting is deliberately not in here: splitting would only spend more quota
+    return kind in ("MAX_NODE_LIMIT_EXCEEDED", "RESOURCE_LIMITS_EXCEEDED", "TIMEOUT") or any(
+        word in message for word in ("timeout", "timed out", "too large", "node limit"))
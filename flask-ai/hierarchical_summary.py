@@ -0,0 +1,287 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+import llm_usage
+
+# Bump when prompts change so cached summaries are not reused across prompt versions
+# (2: version 1 caches could hold fallback text stored after quota errors)
+PROMPT_VERSION = "2"
+MAX_REDUCE_CHARS = 12000
+MAX_CHILD_CHARS = 1500
+
+
+class SummaryCache:
+    """Content-addressed summary cache, in memory and optionally on disk."""
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir if cache_dir is not None else os.getenv("SUMMARY_CACHE_DIR", ".summary_cache")
+        self.memory: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                return self.memory[key]
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                summary = json.load(f)["summary"]
+        except (OSError, ValueError, KeyError):
+            return None
+        with self.lock:
+            self.memory[key] = summary
+        return summary
+
+    def set(self, key, summary):
+        with self.lock:
+            self.memory[key] = summary
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"summary": summary}, f)
+        os.replace(tmp, path)
+
+
+def _hash(*parts):
+    h = hashlib.sha256(PROMPT_VERSION.encode())
+    for part in parts:
+        h.update(b"\0")
+        h.update(part.encode("utf-8", errors="replace"))
+    return h.hexdigest()
+
+
+class HierarchicalSummarizer:
+    """
+    Map-reduce summarization: files -> directories -> repository.
+
+    Every node is cached under a key derived from its own content (files) or
+    its children's keys (directories), so a changed file only recomputes the
+    chain of directories above it. Files are summarized in parallel, then each
+    depth level of directories is reduced in parallel, deepest first.
+
+    Only real LLM output is cached. A node whose LLM call failed falls back to
+    raw text for this run, and so do the directories above it, since their
+    summaries are built from its text; all of them are retried next time.
+    """
+    def __init__(self, cache=None, max_workers=None, rate_limiter=None):
+        self.cache = cache or SummaryCache()
+        self.max_workers = max_workers or int(os.getenv("SUMMARY_WORKERS", "4"))
+        self.rate_limiter = rate_limiter
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.failures = 0
+        # Keys of nodes whose summary is fallback text, never written to the cache
+        self.degraded = set()
+        self._stats_lock = threading.Lock()
+
+    def summarize(self, files: Dict[str, Dict[str, Any]], repo_name="repository") -> Dict[str, Any]:
+        contents, children = self._tree(files)
+        keys: Dict[str, str] = {}
+        summaries: Dict[str, str] = {}
+        # Pool threads charge their LLM tokens to the caller's request / job
+        summarize_file = llm_usage.bind(lambda p: self._summarize_file(p, contents[p]))
+        summarize_directory = llm_usage.bind(
+            lambda d: self._summarize_directory(d, children[d], keys, summaries, repo_name))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            file_paths = list(contents)
+            for path, (key, summary) in zip(file_paths, pool.map(summarize_file, file_paths)):
+                keys[path] = key
+                summaries[path] = summary
+
+            for level in self._levels(children):
+                for d, (key, summary) in zip(level, pool.map(summarize_directory, level)):
+                    keys[d] = key
+                    summaries[d] = summary
+
+        print(f"Hierarchical summary: {len(contents)} files, {len(children)} directories, "
+              f"{self.llm_calls} LLM calls, {self.cache_hits} cache hits, {self.failures} failed")
+        return {
+            "repo_summary": summaries.get("", ""),
+            "directories": {d: summaries[d] for d in sorted(children) if d},
+            "files": {p: summaries[p] for p in sorted(contents)},
+        }
+
+    def forecast(self, files: Dict[str, Dict[str, Any]], rate_cap=None) -> Dict[str, Any]:
+        """
+        Run-time estimate for summarize(); nodes whose cache keys already
+        have a summary cost nothing, so only changed files and the
+        directories above them are counted.
+        """
+        from context_builder import estimate_tokens
+        from file_summarizer import GEMINI_MODEL, SUMMARY_PROMPT_TOKENS
+        from llm_pool import get_gemini_pool
+
+        contents, children = self._tree(files)
+        keys: Dict[str, str] = {}
+        calls = prompt_tokens = 0
+        for path, content in contents.items():
+            keys[path] = _hash("file", path, content)
+            if self.cache.get(keys[path]) is None:
+                calls += 1
+                prompt_tokens += estimate_tokens(content[:12000]) + SUMMARY_PROMPT_TOKENS
+        for level in self._levels(children):
+            for d in level:
+                keys[d] = _hash("dir", d, *(keys[c] for c in children[d]))
+                if self.cache.get(keys[d]) is None and (len(children[d]) > 1 or not d):
+                    calls += 1
+                    prompt_tokens += len(children[d]) * MAX_CHILD_CHARS // 4 + SUMMARY_PROMPT_TOKENS
+        backends = get_gemini_pool(GEMINI_MODEL).names()
+        return llm_usage.forecast(calls, prompt_tokens, backends, concurrency=self.max_workers, rate_cap=rate_cap)
+
+    def _levels(self, children):
+        """Directories grouped by depth, deepest first."""
+        levels: Dict[int, List[str]] = {}
+        for d in children:
+            levels.setdefault(d.count('/') + 1 if d else 0, []).append(d)
+        return [levels[depth] for depth in sorted(levels, reverse=True)]
+
+    def _tree(self, files):
+        from file_summarizer import select_summary_files
+
+        contents = {
+            path.replace("\\", "/"): info.get('content', '')
+            for path, info in select_summary_files(files).items()
+            if info.get('content', '').strip()
+        }
+        children: Dict[str, List[str]] = {"": []}
+        for path in sorted(contents):
+            parent = os.path.dirname(path)
+            children.setdefault(parent, []).append(path)
+            # Register every ancestor directory up to the root
+            while parent:
+                siblings = children.setdefault(os.path.dirname(parent), [])
+                if parent in siblings:
+                    break
+                siblings.append(parent)
+                parent = os.path.dirname(parent)
+        return contents, children
+
+    def _summarize_file(self, path, content):
+        from file_summarizer import gemini_flash_summarize, SummaryUnavailable
+
+        key = _hash("file", path, content)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count(hit=True)
+            return key, cached
+        try:
+            summary = gemini_flash_summarize(content, path, rate_limiter=self.rate_limiter, strict=True)
+        except SummaryUnavailable:
+            self._fail(key)
+            return key, content[:300]
+        self._count(hit=False)
+        self.cache.set(key, summary)
+        return key, summary
+
+    def _summarize_directory(self, directory, child_paths, keys, summaries, repo_name):
+        key = _hash("dir", directory, *(keys[c] for c in child_paths))
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count(hit=True)
+            return key, cached
+
+        from file_summarizer import SummaryUnavailable
+
+        degraded = any(keys[c] in self.degraded for c in child_paths)
+        if len(child_paths) == 1 and directory:
+            # Nothing to combine; reuse the only child's summary
+            summary = summaries[child_paths[0]]
+        else:
+            parts = [(c, summaries[c]) for c in child_paths]
+            try:
+                summary = self._reduce(directory or repo_name, parts, is_root=not directory)
+            except SummaryUnavailable:
+                self._fail(key)
+                return key, "\n\n".join(f"### {c}\n{s[:MAX_CHILD_CHARS]}" for c, s in parts)[:MAX_CHILD_CHARS]
+        if degraded:
+            with self._stats_lock:
+                self.degraded.add(key)
+        else:
+            self.cache.set(key, summary)
+        return key, summary
+
+    def _reduce(self, name, parts, is_root):
+        """Combine child summaries, reducing in groups when they exceed the prompt cap."""
+        blocks = [f"### {path}\n{summary[:MAX_CHILD_CHARS]}" for path, summary in parts]
+        while sum(len(b) for b in blocks) > MAX_REDUCE_CHARS and len(blocks) > 1:
+            groups, current, size = [], [], 0
+            for b in blocks:
+                if current and size + len(b) > MAX_REDUCE_CHARS:
+                    groups.append(current)
+                    current, size = [], 0
+                current.append(b)
+                size += len(b)
+            groups.append(current)
+            if len(groups) == len(blocks):
+                break
+            blocks = [f"### {name} (part {i + 1})\n{self._call_reduce(name, g, False)[:MAX_CHILD_CHARS]}"
+                      for i, g in enumerate(groups)]
+        return self._call_reduce(name, blocks, is_root)
+
+    def _call_reduce(self, name, blocks, is_root):
+        from file_summarizer import gemini_generate
+
+        if is_root:
+            instruction = (
+                f"You are a helpful AI code assistant. Below are summaries of the top-level parts of "
+                f"the repository '{name}'. Write an overview of the whole project for a developer: its "
+                f"purpose, main features, architecture and how the parts work together."
+            )
+        else:
+            instruction = (
+                f"You are a helpful AI code assistant. Below are summaries of the files and folders in "
+                f"the directory '{name}'. Summarize what this directory is responsible for, its main "
+                f"components and how they fit together, in one or two short paragraphs."
+            )
+        prompt = f"{instruction}\n\n" + "\n\n".join(blocks)
+        summary = gemini_generate(prompt, name, None, rate_limiter=self.rate_limiter, strict=True)
+        self._count(hit=False)
+        return summary
+
+    def _fail(self, key):
+        with self._stats_lock:
+            self.failures += 1
+            self.degraded.add(key)
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.llm_calls += 1
+
+
+def summarize_repo_hierarchical(repo_data: Dict[str, Any]) -> Dict[str, Any]:
+    from batch_jobs import get_quota_scheduler
+
+    summarizer = HierarchicalSummarizer(rate_limiter=get_quota_scheduler().llm)
+    return summarizer.summarize(repo_data['files'], repo_name=repo_data.get('name') or "repository")
+
+
+def forecast_hierarchical(repo_data: Dict[str, Any]) -> Dict[str, Any]:
+    from batch_jobs import get_quota_scheduler
+
+    llm = get_quota_scheduler().llm
+    return HierarchicalSummarizer(rate_limiter=llm).forecast(repo_data['files'], rate_cap=llm.rate * 60)
+
+
+def format_hierarchical_summary(result: Dict[str, Any]) -> str:
+    sections = ["# Repository Summary \n\n" + result["repo_summary"] + "\n\n---\n"]
+    for directory, summary in result["directories"].items():
+        sections.append(f"## {directory}/\n\n{summary}\n\n---\n")
+    for path, summary in result["files"].items():
+        sections.append(f"## {path}\n\n{summary}\n\n---\n")
+    return "\n".join(sections)
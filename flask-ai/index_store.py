@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import fcntl
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from llama_index.core import StorageContext, load_index_from_storage
+
+# Indexes are persisted per commit under INDEX_DIR/<embedding model>/<owner>/<repo>/<sha>
+INDEX_DIR = os.getenv("INDEX_DIR", ".index_cache")
+# Past this share of changed documents a clean rebuild is as cheap as patching
+INDEX_UPDATE_MAX_FRACTION = float(os.getenv("INDEX_UPDATE_MAX_FRACTION", "0.5"))
+# Persisted commits kept per repo (oldest are deleted)
+INDEX_KEEP_PER_REPO = int(os.getenv("INDEX_KEEP_PER_REPO", "5"))
+
+
+def _variant(embed_model, key):
+    """Directory level that separates embedding models and per-request path filters."""
+    name = f"{type(embed_model).__name__}-{getattr(embed_model, 'model_name', '')}"
+    variant = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+    if len(key) > 3:
+        variant += "-" + hashlib.sha1(repr(key[3:]).encode()).hexdigest()[:10]
+    return variant
+
+
+def _repo_dir(embed_model, key):
+    owner, repo = key[0], key[1]
+    return os.path.join(INDEX_DIR, _variant(embed_model, key), owner, repo)
+
+
+@contextmanager
+def _repo_lock(repo_dir, exclusive=False):
+    """
+    flock on a repo's index directory, so threads and every worker process
+    agree: writers (persist and its pruning) hold it exclusively, readers
+    shared. Polled rather than blocking, since under gevent a blocking flock
+    would stall every greenlet of the worker.
+    """
+    os.makedirs(repo_dir, exist_ok=True)
+    with open(os.path.join(repo_dir, ".lock"), "a") as f:
+        while True:
+            try:
+                fcntl.flock(f, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_persisted(embed_model, key):
+    """The index persisted for exactly this commit, or None."""
+    repo_dir = _repo_dir(embed_model, key)
+    path = os.path.join(repo_dir, key[2])
+    if not os.path.isdir(path):
+        return None
+    try:
+        with _repo_lock(repo_dir):
+            return load_index_from_storage(StorageContext.from_defaults(persist_dir=path), embed_model=embed_model)
+    except Exception as e:
+        print(f"Ignoring unreadable index at {path}: {e}")
+        return None
+
+
+def persist(index, embed_model, key):
+    """
+    Write the index under its commit and record it as the repo's latest.
+
+    The default SimpleVectorStore serialises every node and vector, so this
+    costs O(index size) per commit even when update_from_latest only
+    embedded a few documents. A commit another worker already wrote is not
+    written again.
+    """
+    repo_dir = _repo_dir(embed_model, key)
+    path = os.path.join(repo_dir, key[2])
+    with _repo_lock(repo_dir, exclusive=True):
+        if not os.path.isdir(path):
+            tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            index.storage_context.persist(persist_dir=tmp)
+            os.replace(tmp, path)
+        else:
+            # Pruning goes by mtime; the commit just marked latest must not be the first to go
+            os.utime(path)
+        latest = os.path.join(repo_dir, f"LATEST.tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(latest, "w") as f:
+            f.write(key[2])
+        os.replace(latest, os.path.join(repo_dir, "LATEST"))
+        _prune(repo_dir)
+
+
+def _prune(repo_dir):
+    commits = sorted(
+        (d for d in os.listdir(repo_dir) if os.path.isdir(os.path.join(repo_dir, d)) and ".tmp-" not in d),
+        key=lambda d: os.path.getmtime(os.path.join(repo_dir, d)),
+    )
+    for stale in commits[:-INDEX_KEEP_PER_REPO]:
+        shutil.rmtree(os.path.join(repo_dir, stale), ignore_errors=True)
+
+
+def update_from_latest(docs, embed_model, key, transformations) -> Optional[object]:
+    """
+    Patch the repo's most recently persisted index into an index for `docs`.
+
+    Documents are keyed by blob SHA, so the commit diff falls out of the two
+    id sets: ids that disappeared (removed or modified files) have their
+    nodes deleted, and only documents with new ids are split and embedded.
+    Renamed files are re-inserted so their path metadata stays right.
+    Returns None when there is no base or the change is too large to be
+    worth patching.
+    """
+    repo_dir = _repo_dir(embed_model, key)
+    start = time.perf_counter()
+    # Held until the base is loaded, so another worker's prune cannot delete it in between
+    with _repo_lock(repo_dir):
+        try:
+            with open(os.path.join(repo_dir, "LATEST")) as f:
+                base_sha = f.read().strip()
+        except FileNotFoundError:
+            return None
+        if not base_sha or base_sha == key[2]:
+            return None
+        # A fresh copy from disk, so the in-memory index of the base commit stays untouched
+        index = load_persisted(embed_model, key[:2] + (base_sha,) + key[3:])
+    if index is None:
+        return None
+
+    old_paths = {
+        doc_id: (info.metadata or {}).get("file_path")
+        for doc_id, info in (index.ref_doc_info or {}).items()
+    }
+    new_docs = {}
+    for doc in docs:
+        new_docs.setdefault(doc.doc_id, doc)
+    removed = [d for d in old_paths if d not in new_docs or new_docs[d].metadata.get("file_path") != old_paths[d]]
+    added = [doc for doc_id, doc in new_docs.items() if doc_id not in old_paths or doc_id in removed]
+    if len(removed) + len(added) > INDEX_UPDATE_MAX_FRACTION * max(len(new_docs), 1):
+        print(f"Index update {base_sha[:7]} -> {key[2][:7]}: {len(removed)} removed, {len(added)} added; rebuilding")
+        return None
+
+    for doc_id in removed:
+        index.delete_ref_doc(doc_id, delete_from_docstore=True)
+    if added:
+        nodes = added
+        for transform in transformations:
+            nodes = transform(nodes)
+        index.insert_nodes(nodes)
+        for doc in added:
+            index.docstore.set_document_hash(doc.doc_id, doc.hash)
+    print(f"Updated index {key[0]}/{key[1]} {base_sha[:7]} -> {key[2][:7]}: "
+          f"{len(removed)} documents removed, {len(added)} added in {time.perf_counter() - start:.2f}s")
+    return index
@@ -0,0 +1,332 @@
+import os
+import re
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+import llm_usage
+
+
+class NoBackendAvailable(Exception):
+    pass
+
+
+# API keys in query strings, Google API keys and bearer tokens
+_SECRET_PATTERNS = [
+    (re.compile(r"([?&](?:key|api_key|access_token|token)=)[^&\s'\"]+", re.I), r"\1<redacted>"),
+    (re.compile(r"AIza[0-9A-Za-z_\-]{35}"), "<redacted>"),
+    (re.compile(r"(Bearer|token)\s+[0-9A-Za-z_\-.]{16,}", re.I), r"\1 <redacted>"),
+]
+
+
+def scrub_secrets(text: str) -> str:
+    """Error text with credentials removed, safe to keep in stats and logs."""
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _error_text(error: Exception) -> str:
+    return scrub_secrets(str(error))[:200]
+
+
+class Backend:
+    """
+    One LLM endpoint in a pool: an Ollama host, or a Gemini key + model pair.
+
+    `client` is whatever the call sites use (a llama_index Ollama LLM, a
+    GenerativeModel, or a fake in tests); `probe` is a cheap callable that
+    raises when the endpoint is unreachable.
+    """
+    def __init__(self, name: str, client: Any, probe: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.client = client
+        self.probe = probe
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_at = None
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.avg_latency_s = None
+        self.last_error = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "avg_latency_s": round(self.avg_latency_s, 3) if self.avg_latency_s is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """
+    Routes each call to the healthy backend with the fewest outstanding
+    requests and fails over to the next one on error.
+
+    A backend is ejected after `eject_after` consecutive failures (or a failed
+    probe) and reinstated once a health probe succeeds. If every backend is
+    ejected, calls still go through to all of them rather than failing outright.
+    """
+    def __init__(self, name: str, backends: List[Backend], eject_after=None, probe_interval=None):
+        if not backends:
+            raise ValueError(f"LLM pool {name} has no backends configured")
+        self.name = name
+        self.backends = backends
+        self.eject_after = eject_after or int(os.getenv("LLM_POOL_EJECT_AFTER", "3"))
+        self.probe_interval = probe_interval or float(os.getenv("LLM_POOL_PROBE_INTERVAL", "15"))
+        self.lock = threading.Lock()
+        self._prober = None
+        self._stop = threading.Event()
+        # Set by _get_pool; rebuilds the backends' clients in a forked child
+        self.factory = None
+
+    def call(self, fn: Callable[[Backend], Any]) -> Any:
+        """Run fn(backend), failing over across backends; raises the last error if all fail."""
+        if self._prober is None:
+            self._ensure_prober()
+        tried = set()
+        last_error = None
+        while True:
+            backend = self._acquire(tried)
+            if backend is None:
+                break
+            tried.add(backend.name)
+            start = time.perf_counter()
+            try:
+                with llm_usage.calling(backend.name):
+                    result = fn(backend)
+            except Exception as e:
+                last_error = e
+                self._release(backend, time.perf_counter() - start, e)
+                llm_usage.record_error(backend.name, e)
+                print(f"LLM pool {self.name}: {backend.name} failed ({_error_text(e)}), failing over")
+                continue
+            elapsed = time.perf_counter() - start
+            self._release(backend, elapsed, None)
+            # Gemini responses carry their usage; llama_index calls were recorded as they ended
+            llm_usage.record_response(backend.name, result)
+            llm_usage.quota_tracker.record_latency(backend.name, elapsed)
+            return result
+        if last_error is not None:
+            raise last_error
+        raise NoBackendAvailable(f"LLM pool {self.name} has no backend to try")
+
+    def _acquire(self, tried) -> Optional[Backend]:
+        with self.lock:
+            candidates = [b for b in self.backends if b.name not in tried]
+            healthy = [b for b in candidates if b.healthy]
+            if healthy or not any(b.healthy for b in self.backends):
+                candidates = healthy or candidates
+            else:
+                # Untried backends are all ejected but others are healthy; leave them alone
+                candidates = []
+            if not candidates:
+                return None
+            backend = min(candidates, key=lambda b: (b.outstanding, b.avg_latency_s or 0.0))
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _release(self, backend: Backend, elapsed: float, error: Optional[Exception]):
+        with self.lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.consecutive_failures = 0
+                if backend.avg_latency_s is None:
+                    backend.avg_latency_s = elapsed
+                else:
+                    backend.avg_latency_s = 0.8 * backend.avg_latency_s + 0.2 * elapsed
+                return
+            backend.errors += 1
+            backend.consecutive_failures += 1
+            backend.last_error = _error_text(error)
+            if backend.healthy and backend.consecutive_failures >= self.eject_after:
+                self._eject(backend)
+        self._ensure_prober()
+
+    def _eject(self, backend: Backend):
+        backend.healthy = False
+        backend.ejected_at = time.time()
+        backend.ejections += 1
+        print(f"LLM pool {self.name}: ejected {backend.name}")
+
+    def probe_all(self):
+        """Probe every backend once, ejecting failures and reinstating recoveries."""
+        for backend in self.backends:
+            if backend.probe is None:
+                # Nothing to probe with; give an ejected backend another chance after a while
+                with self.lock:
+                    if not backend.healthy and time.time() - backend.ejected_at > self.probe_interval:
+                        backend.healthy = True
+                        backend.consecutive_failures = 0
+                continue
+            try:
+                backend.probe()
+                ok = True
+            except Exception as e:
+                ok = False
+                error = _error_text(e)
+            with self.lock:
+                if ok and not backend.healthy:
+                    backend.healthy = True
+                    backend.consecutive_failures = 0
+                    print(f"LLM pool {self.name}: reinstated {backend.name}")
+                elif not ok:
+                    backend.last_error = error
+                    if backend.healthy:
+                        self._eject(backend)
+
+    def names(self, healthy_only=True) -> List[str]:
+        """Backend names, only the healthy ones unless none is."""
+        with self.lock:
+            healthy = [b.name for b in self.backends if b.healthy]
+            return healthy if healthy_only and healthy else [b.name for b in self.backends]
+
+    def start_health_checks(self):
+        self._ensure_prober()
+
+    def reinit_after_fork(self):
+        """Fresh clients, locks and prober for a forked child; threads do not survive fork."""
+        self.lock = threading.Lock()
+        self._prober = None
+        self._stop = threading.Event()
+        if self.factory is not None:
+            self.backends = self.factory().backends
+
+    def _ensure_prober(self):
+        with self.lock:
+            if self._prober is not None:
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name=f"llm-pool-{self.name}", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            self.probe_all()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {b.name: b.stats() for b in self.backends}
+
+
+def _split_env(name, default=""):
+    return [v.strip() for v in os.getenv(name, default).split(",") if v.strip()]
+
+
+def _ollama_backend(host, model):
+    from llama_index.llms.ollama import Ollama
+
+    llm_usage.track_llama_index()
+    host = host.rstrip("/")
+    client = Ollama(model=model, base_url=host, request_timeout=300, temperature=0.3)
+
+    def probe():
+        requests.get(f"{host}/api/tags", timeout=5).raise_for_status()
+
+    return Backend(f"ollama:{host}/{model}", client, probe)
+
+
+class GeminiClient:
+    """
+    generate_content() for one API key and model.
+
+    genai.configure() holds a single process-global key, so each pooled key
+    gets its own public GenerativeServiceClient instead. Responses are wrapped
+    in genai's GenerateContentResponse, so callers keep using .text and
+    .usage_metadata. `service` can be swapped for a fake in tests.
+    """
+    def __init__(self, api_key, model, service=None):
+        self.model = model if model.startswith("models/") else f"models/{model}"
+        if service is None:
+            from google.ai import generativelanguage as glm
+            service = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        self.service = service
+
+    def generate_content(self, prompt: str):
+        from google.ai import generativelanguage as glm
+        from google.generativeai.types import GenerateContentResponse
+
+        request = glm.GenerateContentRequest(
+            model=self.model,
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+        )
+        return GenerateContentResponse.from_response(self.service.generate_content(request=request))
+
+
+def _gemini_backend(index, api_key, model):
+    client = GeminiClient(api_key, model)
+
+    def probe():
+        # Key in a header, never in the URL, so it cannot leak into error text
+        resp = requests.get(f"https://generativelanguage.googleapis.com/v1beta/models/{model}",
+                            headers={"x-goog-api-key": api_key}, timeout=10)
+        resp.raise_for_status()
+
+    return Backend(f"gemini:key{index}/{model}", client, probe)
+
+
+_pools: Dict[str, BackendPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(name, build):
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = build()
+            _pools[name].factory = build
+            _pools[name].start_health_checks()
+        return _pools[name]
+
+
+def _reinit_pools_after_fork():
+    # gRPC channels and HTTP connection pools must not be shared with the parent
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    for pool in _pools.values():
+        pool.reinit_after_fork()
+
+
+os.register_at_fork(after_in_child=_reinit_pools_after_fork)
+
+
+def get_ollama_pool() -> BackendPool:
+    """Ollama hosts from OLLAMA_HOSTS (comma separated), all serving OLLAMA_MODEL."""
+    def build():
+        model = os.getenv("OLLAMA_MODEL", "gemma:2b")
+        hosts = _split_env("OLLAMA_HOSTS", "http://localhost:11434")
+        return BackendPool("ollama", [_ollama_backend(host, model) for host in hosts])
+    return _get_pool("ollama", build)
+
+
+def get_gemini_pool(default_model: str) -> BackendPool:
+    """
+    Every GEMINI_API_KEYS x GEMINI_MODELS pair; falls back to GEMINI_API_KEY
+    and the call site's model.
+    """
+    def build():
+        keys = _split_env("GEMINI_API_KEYS") or _split_env("GEMINI_API_KEY")
+        if not keys:
+            raise RuntimeError("GEMINI_API_KEY not found in environment or .env file.")
+        models = _split_env("GEMINI_MODELS") or [default_model]
+        return BackendPool(f"gemini-{default_model}", [
+            _gemini_backend(i, key, model)
+            for i, key in enumerate(keys, 1) for model in models
+        ])
+    return _get_pool(f"gemini-{default_model}", build)
+
+
+def pool_stats() -> Dict[str, Any]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {name: pool.stats() for name, pool in pools.items()}
@@ -0,0 +1,330 @@
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# Published free-tier limits of one Gemini key for one model; override for paid tiers
+GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "15"))
+GEMINI_TPM_LIMIT = int(os.getenv("GEMINI_TPM_LIMIT", "1000000"))
+GEMINI_RPD_LIMIT = int(os.getenv("GEMINI_RPD_LIMIT", "1500"))
+# Used by the forecaster until real calls have been observed
+FORECAST_COMPLETION_TOKENS = int(os.getenv("FORECAST_COMPLETION_TOKENS", "400"))
+FORECAST_CALL_SECONDS = float(os.getenv("FORECAST_CALL_SECONDS", "6"))
+
+_QUOTA_ERRORS = ("429", "quota", "rate limit", "resource exhausted", "resourceexhausted")
+
+
+class Usage:
+    """Token totals of one scope: an HTTP request, a batch job, or the whole process."""
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+    def add(self, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "llm_calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+            }
+
+
+# Usage objects every LLM call in the current context is charged to (outermost first)
+_scopes: contextvars.ContextVar = contextvars.ContextVar("llm_usage_scopes", default=())
+# Backend the current BackendPool.call is running on
+_backend: contextvars.ContextVar = contextvars.ContextVar("llm_usage_backend", default=None)
+
+
+@contextmanager
+def usage_scope(usage: Optional[Usage] = None):
+    """Charge LLM calls made inside the block (on this thread) to `usage` as well."""
+    usage = usage or Usage()
+    token = _scopes.set(_scopes.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _scopes.reset(token)
+
+
+def current_usage() -> Optional[Usage]:
+    scopes = _scopes.get()
+    return scopes[-1] if scopes else None
+
+
+def bind(fn: Callable) -> Callable:
+    """fn, charging its LLM calls to the caller's scopes when it runs on a worker thread."""
+    scopes = _scopes.get()
+
+    def run(*args, **kwargs):
+        token = _scopes.set(scopes)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _scopes.reset(token)
+    return run
+
+
+@contextmanager
+def calling(backend_name: str):
+    token = _backend.set(backend_name)
+    try:
+        yield
+    finally:
+        _backend.reset(token)
+
+
+class QuotaTracker:
+    """
+    Rolling request and token counts per backend (API key + model).
+
+    Keeps the last minute of calls for RPM / TPM and the last day for RPD,
+    compared against the configured Gemini limits, plus every quota error a
+    backend has returned. Ollama backends are tracked without limits.
+
+    Counts cover this process only. Under serve.py with WORKERS > 1 every
+    worker sees just its own share of a key's traffic, so utilisation and
+    the remaining daily quota are overstated; usage_stats says which worker
+    answered and how many there are.
+    """
+    def __init__(self):
+        self.minute: Dict[str, deque] = {}
+        self.day: Dict[str, deque] = {}
+        self.totals: Dict[str, Usage] = {}
+        self.latency: Dict[str, float] = {}
+        self.rate_limited: Dict[str, int] = {}
+        self.last_rate_limited: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def record(self, backend, prompt_tokens, completion_tokens):
+        now = time.time()
+        with self.lock:
+            self.minute.setdefault(backend, deque()).append((now, prompt_tokens + completion_tokens))
+            self.day.setdefault(backend, deque()).append(now)
+            self._trim(backend, now)
+            totals = self.totals.setdefault(backend, Usage())
+        totals.add(prompt_tokens, completion_tokens)
+
+    def record_latency(self, backend, elapsed):
+        with self.lock:
+            previous = self.latency.get(backend)
+            self.latency[backend] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+
+    def record_rate_limited(self, backend):
+        with self.lock:
+            self.rate_limited[backend] = self.rate_limited.get(backend, 0) + 1
+            self.last_rate_limited[backend] = time.time()
+
+    def _trim(self, backend, now):
+        minute, day = self.minute.get(backend), self.day.get(backend)
+        while minute and now - minute[0][0] > 60:
+            minute.popleft()
+        while day and now - day[0] > 86400:
+            day.popleft()
+
+    def limits(self, backend) -> Dict[str, Optional[int]]:
+        if backend.startswith("gemini"):
+            return {"rpm": GEMINI_RPM_LIMIT, "tpm": GEMINI_TPM_LIMIT, "rpd": GEMINI_RPD_LIMIT}
+        return {"rpm": None, "tpm": None, "rpd": None}
+
+    def window(self, backend) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            self._trim(backend, now)
+            minute = self.minute.get(backend, ())
+            used = {
+                "requests_last_minute": len(minute),
+                "tokens_last_minute": sum(tokens for _, tokens in minute),
+                "requests_last_day": len(self.day.get(backend, ())),
+                "rate_limited": self.rate_limited.get(backend, 0),
+                "last_rate_limited": self.last_rate_limited.get(backend),
+                "avg_latency_s": round(self.latency[backend], 3) if backend in self.latency else None,
+            }
+        limits = self.limits(backend)
+        used["limits"] = limits
+        if limits["rpm"]:
+            used["rpm_utilization"] = round(used["requests_last_minute"] / limits["rpm"], 3)
+            used["tpm_utilization"] = round(used["tokens_last_minute"] / limits["tpm"], 3)
+            used["rpd_remaining"] = max(0, limits["rpd"] - used["requests_last_day"])
+        return used
+
+    def completion_tokens_per_call(self, backends) -> Optional[float]:
+        with self.lock:
+            totals = [self.totals[b] for b in backends if b in self.totals]
+        calls = sum(t.calls for t in totals)
+        return sum(t.completion_tokens for t in totals) / calls if calls else None
+
+    def seconds_per_call(self, backends) -> Optional[float]:
+        with self.lock:
+            latencies = [self.latency[b] for b in backends if b in self.latency]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            backends = sorted(set(self.totals) | set(self.rate_limited))
+        return {b: {**(self.totals[b].to_dict() if b in self.totals else Usage().to_dict()), **self.window(b)}
+                for b in backends}
+
+
+quota_tracker = QuotaTracker()
+process_usage = Usage()
+
+
+def record(prompt_tokens: int, completion_tokens: int, backend: Optional[str] = None):
+    """Charge one LLM call to the process, the backend's quota and every active scope."""
+    backend = backend or _backend.get() or "unknown"
+    process_usage.add(prompt_tokens, completion_tokens)
+    quota_tracker.record(backend, prompt_tokens, completion_tokens)
+    for usage in _scopes.get():
+        usage.add(prompt_tokens, completion_tokens)
+
+
+def record_response(backend: str, response: Any) -> bool:
+    """Record a google.generativeai response's usage_metadata; False if it carries none."""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return False
+    record(getattr(metadata, "prompt_token_count", 0) or 0,
+           getattr(metadata, "candidates_token_count", 0) or 0, backend)
+    return True
+
+
+def is_quota_error(error: Exception) -> bool:
+    message = f"{type(error).__name__} {error}".lower()
+    return any(marker in message for marker in _QUOTA_ERRORS)
+
+
+def record_error(backend: str, error: Exception):
+    if is_quota_error(error):
+        quota_tracker.record_rate_limited(backend)
+
+
+_llama_index_tracking = False
+_tracking_lock = threading.Lock()
+
+
+def track_llama_index():
+    """
+    Record token counts of llama_index LLM calls (Ollama reports them as
+    prompt_eval_count / eval_count in the raw response).
+    """
+    global _llama_index_tracking
+    with _tracking_lock:
+        if _llama_index_tracking:
+            return
+        _llama_index_tracking = True
+
+    from llama_index.core.instrumentation import get_dispatcher
+    from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+    from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMCompletionEndEvent
+
+    last_raw = threading.local()
+
+    class TokenUsageHandler(BaseEventHandler):
+        @classmethod
+        def class_name(cls) -> str:
+            return "TokenUsageHandler"
+
+        def handle(self, event, **kwargs):
+            if not isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)) or event.response is None:
+                return
+            raw = event.response.raw
+            # complete() wraps chat(), so one call ends both events with the same raw response
+            if not isinstance(raw, dict) or getattr(last_raw, "value", None) is raw:
+                return
+            last_raw.value = raw
+            if "prompt_eval_count" in raw or "eval_count" in raw:
+                record(raw.get("prompt_eval_count") or 0, raw.get("eval_count") or 0)
+
+    get_dispatcher().add_event_handler(TokenUsageHandler())
+
+
+def forecast(calls: int, prompt_tokens: int, backends: List[str], concurrency=1, pause=0.0,
+             rate_cap: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Estimated run time of `calls` LLM calls sending `prompt_tokens` in total.
+
+    The slowest of three limits wins: the summed RPM and TPM quotas of
+    `backends` (and `rate_cap` requests per minute when a shared rate limiter
+    sits in front of them), and the observed call latency over `concurrency`
+    parallel callers, each pausing `pause` seconds between calls.
+    """
+    completion_per_call = quota_tracker.completion_tokens_per_call(backends) or FORECAST_COMPLETION_TOKENS
+    seconds_per_call = quota_tracker.seconds_per_call(backends) or FORECAST_CALL_SECONDS
+    completion_tokens = int(calls * completion_per_call)
+
+    windows = [quota_tracker.window(b) for b in backends]
+    limited = [w for w in windows if w["limits"]["rpm"]]
+    rpm = sum(w["limits"]["rpm"] for w in limited) or None
+    if rate_cap:
+        rpm = min(rpm, rate_cap) if rpm else rate_cap
+    tpm = sum(w["limits"]["tpm"] for w in limited) or None
+    daily_remaining = sum(w["rpd_remaining"] for w in limited) if limited else None
+
+    bounds = {"latency": math.ceil(calls / max(concurrency, 1)) * (seconds_per_call + pause)}
+    if rpm:
+        bounds["requests_per_minute"] = calls / rpm * 60
+    if tpm:
+        bounds["tokens_per_minute"] = (prompt_tokens + completion_tokens) / tpm * 60
+    bottleneck = max(bounds, key=bounds.get)
+    return {
+        "llm_calls": calls,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_seconds": round(bounds[bottleneck], 1),
+        "bottleneck": bottleneck,
+        "backends": len(backends),
+        "daily_quota_remaining": daily_remaining,
+        "exceeds_daily_quota": daily_remaining is not None and calls > daily_remaining,
+    }
+
+
+def usage_stats() -> Dict[str, Any]:
+    return {"total": process_usage.to_dict(), "backends": quota_tracker.stats(),
+            "scope": {"pid": os.getpid(), "workers": int(os.getenv("WORKERS", "1"))}}
+
+
+def _start_request_usage():
+    from flask import g
+    usage = Usage()
+    g._llm_usage = (usage, _scopes.set(_scopes.get() + (usage,)))
+
+
+def _finish_request_usage(response):
+    from flask import g
+    state = g.get("_llm_usage")
+    if state is not None and state[0].calls:
+        usage = state[0].to_dict()
+        response.headers["X-LLM-Calls"] = str(usage["llm_calls"])
+        response.headers["X-LLM-Prompt-Tokens"] = str(usage["prompt_tokens"])
+        response.headers["X-LLM-Completion-Tokens"] = str(usage["completion_tokens"])
+    return response
+
+
+def _end_request_usage(exc):
+    from flask import g
+    state = g.pop("_llm_usage", None)
+    if state is not None:
+        _scopes.reset(state[1])
+        if state[0].calls:
+            from flask import request
+            print(f"LLM usage for {request.method} {request.path}: {state[0].to_dict()}")
+
+
+def init_usage_tracking(app):
+    """Account every request's LLM tokens and report them in X-LLM-* response headers."""
+    app.before_request(_start_request_usage)
+    app.after_request(_finish_request_usage)
+    app.teardown_request(_end_request_usage)
@@ -0,0 +1,74 @@
+"""
+Fire many concurrent long-running requests at a flask-ai server and report
+how many were served and how long they took.
+
+With the gevent server (serve.py) and ENABLE_DEBUG_ENDPOINTS=1 (plus the
+server's DEBUG_TOKEN in the environment, if it sets one), 200 requests
+that each wait 5 seconds should all finish in a little over 5 seconds from a
+single process; under the threaded dev server they queue up instead.
+
+    python loadtest.py --url http://localhost:5001 --concurrency 200 --seconds 5
+    python loadtest.py --path /api/readme-gen/generate --method POST \\
+        --json '{"githubUrl": "https://github.com/owner/repo"}' --concurrency 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for flask-ai")
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--path", default="/debug/sleep")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--json", help="JSON request body")
+    parser.add_argument("--seconds", type=float, default=5, help="Sleep time for /debug/sleep")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args(argv)
+
+    url = args.url.rstrip("/") + args.path
+    params = {"seconds": args.seconds} if args.path == "/debug/sleep" else None
+    body = json.loads(args.json) if args.json else None
+    headers = {"X-Debug-Token": os.environ["DEBUG_TOKEN"]} if os.getenv("DEBUG_TOKEN") else None
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.concurrency)
+
+    def one_request():
+        barrier.wait()
+        start = time.perf_counter()
+        try:
+            status = requests.request(args.method, url, params=params, json=body, headers=headers, timeout=args.timeout).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=one_request) for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    print(f"{args.concurrency} concurrent {args.method} {url}")
+    print(f"  wall time: {wall:.2f}s")
+    print(f"  latency p50 {pct(0.5):.2f}s  p90 {pct(0.9):.2f}s  p99 {pct(0.99):.2f}s  max {latencies[-1]:.2f}s")
+    print(f"  statuses: {statuses}")
+    return 0 if statuses.get(200) == args.concurrency else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import os
+import time
+import subprocess
+import threading
+from collections import Counter
+from typing import Dict, List, Any, Optional
+
+from github_parser import GitHubParser, parse_github_url, MAX_CONTENT_CHARS
+from path_filter import DEFAULT_PATH_FILTER
+
+# Blobs bigger than this are never read; the API backend truncates to MAX_CONTENT_CHARS anyway
+MAX_BLOB_BYTES = 1024 * 1024
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "Python", ".js": "JavaScript", ".jsx": "JavaScript", ".ts": "TypeScript",
+    ".tsx": "TypeScript", ".java": "Java", ".go": "Go", ".rs": "Rust", ".rb": "Ruby",
+    ".php": "PHP", ".c": "C", ".cpp": "C++", ".cs": "C#", ".kt": "Kotlin", ".swift": "Swift",
+}
+
+_mirror_locks: Dict[str, threading.RLock] = {}
+_mirror_locks_guard = threading.Lock()
+
+
+class GitCommandError(Exception):
+    pass
+
+
+class LocalGitParser(GitHubParser):
+    """
+    Ingestion backend that reads a local clone or bare mirror instead of the
+    GitHub REST API.
+
+    Returns the same `files` dict as GitHubParser.get_repo_data and the same
+    llama_index Documents as repo_snapshot.RepoSnapshot. All blob contents
+    are read in a single `git cat-file --batch` pass.
+    """
+    def __init__(self, repo_path, github_url=None, fetch=True, fetch_interval=30, auth_header=None):
+        self.repo_path = os.path.abspath(repo_path)
+        self.github_url = github_url
+        self.owner, self.repo = self._parse_github_url(github_url) if github_url else (None, None)
+        self.rate_limiter = None
+        self.fetch_interval = fetch_interval
+        self.auth_header = auth_header
+        self.path_filter = DEFAULT_PATH_FILTER
+        if fetch:
+            self.fetch()
+
+    @classmethod
+    def from_github_url(cls, github_url, mirror_root=None, **kwargs):
+        """Open (cloning on first use) the bare mirror of a GitHub repo under mirror_root."""
+        mirror_root = mirror_root or os.getenv("GIT_MIRROR_ROOT")
+        if not mirror_root:
+            raise ValueError("GIT_MIRROR_ROOT is not configured")
+        owner, repo = parse_github_url(github_url)
+        path = os.path.join(mirror_root, owner, f"{repo}.git")
+        auth_header = kwargs.pop("auth_header", _github_auth_header())
+
+        with _mirror_lock(path):
+            if not os.path.isdir(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                print(f"Cloning mirror of {owner}/{repo} into {path}")
+                _run_git(
+                    ["clone", "--mirror", "--quiet", f"https://github.com/{owner}/{repo}.git", path],
+                    auth_header=auth_header,
+                )
+                kwargs.setdefault("fetch", False)
+            return cls(path, github_url=github_url, auth_header=auth_header, **kwargs)
+
+    def _git(self, *args, input=None) -> bytes:
+        return _run_git(["-C", self.repo_path] + list(args), input=input, auth_header=self.auth_header)
+
+    def fetch(self):
+        """Fetch updates from the configured remote, at most once per fetch_interval."""
+        remotes = self._git("remote").decode().split()
+        if not remotes:
+            return
+        stamp = os.path.join(self._git_dir(), "LAST_FETCH")
+        with _mirror_lock(self.repo_path):
+            try:
+                if time.time() - os.path.getmtime(stamp) < self.fetch_interval:
+                    return
+            except OSError:
+                pass
+            try:
+                self._git("fetch", "--prune", "--quiet", remotes[0])
+            except GitCommandError as e:
+                # Serve the last fetched state rather than failing the request
+                print(f"Warning: git fetch failed for {self.repo_path}: {e}")
+                return
+            with open(stamp, "w"):
+                pass
+
+    def _git_dir(self):
+        git_dir = self._git("rev-parse", "--git-dir").decode().strip()
+        return git_dir if os.path.isabs(git_dir) else os.path.join(self.repo_path, git_dir)
+
+    def default_branch(self) -> str:
+        try:
+            return self._git("symbolic-ref", "--short", "HEAD").decode().strip()
+        except GitCommandError:
+            return "main"
+
+    def resolve_commit(self, branch: Optional[str] = None) -> str:
+        branch = branch or self.default_branch()
+        for ref in (branch, f"origin/{branch}", f"refs/remotes/origin/{branch}"):
+            try:
+                return self._git("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}").decode().strip()
+            except GitCommandError:
+                continue
+        raise GitCommandError(f"Branch not found in local repository: {branch}")
+
+    def list_tree(self, commit: str) -> List[Dict[str, Any]]:
+        """All blobs at a commit as dicts with path, sha and size."""
+        entries = []
+        for record in self._git("ls-tree", "-r", "-l", "-z", commit).split(b"\0"):
+            if not record:
+                continue
+            meta, path = record.split(b"\t", 1)
+            mode, obj_type, sha, size = meta.split()
+            if obj_type != b"blob" or mode == b"160000":
+                continue
+            entries.append({
+                "path": path.decode("utf-8", errors="replace"),
+                "sha": sha.decode(),
+                "size": int(size) if size != b"-" else 0,
+            })
+        return entries
+
+    def read_blobs(self, shas: List[str]) -> Dict[str, bytes]:
+        """Read many blobs in one `git cat-file --batch` process."""
+        unique = list(dict.fromkeys(shas))
+        if not unique:
+            return {}
+        out = self._git("cat-file", "--batch", input=("\n".join(unique) + "\n").encode())
+        blobs = {}
+        pos = 0
+        while pos < len(out):
+            header_end = out.index(b"\n", pos)
+            header = out[pos:header_end].split()
+            pos = header_end + 1
+            if len(header) < 3 or header[1] == b"missing":
+                continue
+            size = int(header[2])
+            blobs[header[0].decode()] = out[pos:pos + size]
+            pos += size + 1
+        return blobs
+
+    def get_repo_data(self, branch=None):
+        commit = self.resolve_commit(branch)
+        entries = [e for e in self.list_tree(commit) if not self._should_skip(e["path"])]
+        wanted = [
+            e["sha"] for e in entries
+            if self.path_filter.wants_content(e["path"]) and e["size"] <= MAX_BLOB_BYTES
+        ]
+        blobs = self.read_blobs(wanted)
+
+        files = {}
+        for e in entries:
+            raw = blobs.get(e["sha"])
+            content = raw.decode("utf-8", errors="replace")[:MAX_CONTENT_CHARS] if raw else ""
+            files[e["path"]] = {
+                "type": "file",
+                "content": content
+            }
+        return {
+            "name": self.repo or os.path.basename(self.repo_path).removesuffix(".git"),
+            "description": None,
+            "language": _guess_language(files),
+            "stars": None,
+            "created_at": None,
+            "commit_sha": commit,
+            "files": files
+        }
+
+    def load_documents(self, branch=None) -> List[Any]:
+        """llama_index Documents with the same filters and metadata as RepoSnapshot.documents."""
+        from llama_index.core import Document
+
+        commit = self.resolve_commit(branch)
+        entries = [
+            e for e in self.list_tree(commit)
+            if self.path_filter.is_document(e["path"]) and e["size"] <= MAX_BLOB_BYTES
+        ]
+        blobs = self.read_blobs([e["sha"] for e in entries])
+
+        docs = []
+        for e in entries:
+            raw = blobs.get(e["sha"])
+            if raw is None:
+                continue
+            try:
+                text = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            url = (f"https://github.com/{self.owner}/{self.repo}/blob/{commit}/{e['path']}"
+                   if self.owner else "")
+            docs.append(Document(
+                text=text,
+                doc_id=e["sha"],
+                metadata={
+                    "file_path": e["path"],
+                    "file_name": e["path"].split("/")[-1],
+                    "url": url,
+                },
+            ))
+        print(f"Loaded {len(docs)} documents from local repository at {commit[:7]}")
+        return docs
+
+
+def _run_git(args, input=None, auth_header=None) -> bytes:
+    result = subprocess.run(["git"] + args, input=input, capture_output=True, env=_auth_env(auth_header))
+    if result.returncode != 0:
+        raise GitCommandError(result.stderr.decode(errors="replace").strip() or f"git {args[0]} failed")
+    return result.stdout
+
+
+def _auth_env(auth_header):
+    """
+    Environment passing the auth header as http.extraHeader config. Unlike
+    `git -c`, this keeps the token out of the command line, where any local
+    user could read it from the process list.
+    """
+    if not auth_header:
+        return None
+    env = dict(os.environ)
+    count = int(env.get("GIT_CONFIG_COUNT", "0") or 0)
+    env["GIT_CONFIG_COUNT"] = str(count + 1)
+    env[f"GIT_CONFIG_KEY_{count}"] = "http.extraHeader"
+    env[f"GIT_CONFIG_VALUE_{count}"] = auth_header
+    return env
+
+
+def _github_auth_header():
+    token = os.getenv("GITHUB_TOKEN")
+    return f"Authorization: Bearer {token}" if token else None
+
+
+def _mirror_lock(path):
+    with _mirror_locks_guard:
+        return _mirror_locks.setdefault(path, threading.RLock())
+
+
+def _guess_language(files):
+    counts = Counter(
+        LANGUAGE_BY_EXTENSION.get(os.path.splitext(fp)[1].lower()) for fp in files
+    )
+    counts.pop(None, None)
+    return counts.most_common(1)[0][0] if counts else None
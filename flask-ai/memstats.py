@@ -0,0 +1,32 @@
+import os
+from typing import Dict, Optional
+
+
+def memory_usage(pid="self") -> Optional[Dict[str, float]]:
+    """
+    RSS, PSS and USS of a process in MB, from /proc/<pid>/smaps_rollup (Linux).
+
+    USS (private pages) is what one more forked worker really costs; pages
+    still shared copy-on-write with the parent only show up in RSS and, split
+    between the sharers, in PSS.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    kb = 1024.0
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / kb, 1),
+        "pss_mb": round(fields.get("Pss", 0) / kb, 1),
+        "uss_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / kb, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / kb, 1),
+    }
+
+
+def process_stats() -> Dict[str, object]:
+    return {"pid": os.getpid(), "memory": memory_usage()}
@@ -0,0 +1,253 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Filter rules used for llama_index documents (/ask)
+DOC_EXCLUDE_DIRECTORIES = [".vscode", "__pycache__", "node_modules", ".github", "dist", "build", "coverage"]
+DOC_EXCLUDE_EXTENSIONS = [".md", ".json", ".lock", ".log", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".pdf", ".svg"]
+
+# Filter rules used for the raw files dict (README and summaries)
+SKIP_DIRECTORIES = ["node_modules", ".git", "dist", "build", "coverage", "__pycache__"]
+SKIP_EXTENSIONS = [
+    ".css", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".mp4",
+    ".mp3", ".wav", ".ogg", ".webm", ".mov", ".avi", ".wmv", ".flv",
+    ".mkv", ".bmp", ".tiff", ".tif", ".webp", ".apng", ".m4a", ".aac",
+    ".flac", ".opus", ".zip", ".tar", ".gz", ".rar", ".7z", ".pdf",
+    ".exe", ".dll"
+]
+SKIP_FILENAMES = ["package-lock.json", ".gitignore"]
+# Only these extensions have their content fetched
+CONTENT_EXTENSIONS = (
+    ".js", ".py", ".json", ".md", ".txt", ".ts",
+    ".jsx", ".tsx", ".html", ".yml", ".yaml"
+)
+
+# ReadmeGenerator.analyze_repo_structure categories, checked in this order
+CONFIG_EXTENSIONS = {'.json', '.yml', '.yaml', '.env', '.lock', '.conf', '.ini'}
+EXTENSION_CATEGORIES = {}
+for _category, _extensions in (
+    ('main_files', ['.js', '.jsx', '.ts', '.tsx']),
+    ('frontend_files', ['.css', '.scss', '.sass', '.less', '.html', '.htm']),
+    ('backend_files', ['.py', '.java', '.php', '.rb', '.go', '.rs']),
+    ('documentation', ['.md']),
+):
+    EXTENSION_CATEGORIES.update(dict.fromkeys(_extensions, _category))
+DOCUMENTATION_NAMES = ('readme', 'changelog', 'contributing', 'license')
+ASSET_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.pdf', '.doc', '.docx'}
+
+# Bound on the memoized directory verdicts kept by one filter
+MAX_CACHED_DIRECTORIES = 200000
+
+
+def _split_ext(name):
+    """os.path.splitext(name)[1] for a bare file name, without the generic path handling."""
+    stripped = name.lstrip(".")
+    dot = stripped.rfind(".")
+    return stripped[dot:] if dot > 0 else ""
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Regex for one gitignore-style pattern.
+
+    A pattern without a slash (other than a trailing one) matches at any
+    depth; with one it is anchored at the repo root. `*` and `?` stay within a
+    path segment, `**` crosses segments, and a match on a directory covers
+    everything under it. A trailing slash matches directories only.
+    """
+    dir_only = pattern.endswith("/")
+    body = pattern.strip("/")
+    anchored = "/" in body or pattern.startswith("/")
+    out = []
+    i = 0
+    while i < len(body):
+        if body.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif body.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif body[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif body[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif body[i] == "[" and "]" in body[i + 2:]:
+            end = body.index("]", i + 2)
+            chars = body[i + 1:end]
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            out.append("[" + chars.replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            out.append(re.escape(body[i]))
+            i += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    suffix = "/.*" if dir_only else "(?:/.*)?"
+    return prefix + "".join(out) + suffix
+
+
+def compile_globs(patterns: Iterable[str]):
+    """One regex matching any of the patterns, or None for an empty list."""
+    parts = [glob_to_regex(p) for p in patterns if p and p.strip()]
+    if not parts:
+        return None
+    return re.compile("^(?:" + "|".join(parts) + ")$")
+
+
+class DirectoryTrie:
+    """Directory paths stored segment by segment; answers "is this path under any of them"."""
+    def __init__(self, directories: Iterable[str] = ()):
+        self.root: Dict[str, dict] = {}
+        for directory in directories:
+            self.add(directory)
+
+    def add(self, directory: str):
+        node = self.root
+        for segment in directory.strip("/").split("/"):
+            node = node.setdefault(segment, {})
+        node[None] = True
+
+    def covers(self, segments: List[str]) -> bool:
+        node = self.root
+        for segment in segments:
+            node = node.get(segment)
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
+
+    def __bool__(self):
+        return bool(self.root)
+
+
+def _string_list(data, field) -> Optional[List[str]]:
+    """A request field given as one string or a list of strings; ValueError for anything else."""
+    value = data.get(field)
+    if value is None or isinstance(value, str):
+        return [value] if value else None
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return value
+    raise ValueError(f"{field} must be a string or a list of strings")
+
+
+class PathFilter:
+    """
+    Precompiled ingestion filters and the README file classifier.
+
+    The default instance reproduces the original rules exactly (see
+    github_parser.should_skip_file / is_document_file and
+    ReadmeGenerator.analyze_repo_structure) using set lookups instead of
+    list scans. Per-request `include` / `exclude` gitignore-style globs and
+    `exclude_dirs` (paths from the repo root) can only narrow what those
+    rules select, so a shared snapshot never has to be refetched for them.
+    """
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 exclude_dirs: Optional[List[str]] = None,
+                 skip_directories=SKIP_DIRECTORIES, skip_extensions=SKIP_EXTENSIONS,
+                 skip_filenames=SKIP_FILENAMES, doc_exclude_directories=DOC_EXCLUDE_DIRECTORIES,
+                 doc_exclude_extensions=DOC_EXCLUDE_EXTENSIONS, content_extensions=CONTENT_EXTENSIONS):
+        self.include = sorted(include or [])
+        self.exclude = sorted(exclude or [])
+        self.exclude_dirs = sorted(exclude_dirs or [])
+        self._include_re = compile_globs(self.include)
+        self._exclude_re = compile_globs(self.exclude)
+        self._dir_trie = DirectoryTrie(self.exclude_dirs)
+
+        self._skip_directories = frozenset(skip_directories)
+        self._skip_extensions = frozenset(skip_extensions)
+        self._skip_filenames = frozenset(skip_filenames)
+        # is_document_file compares raw string prefixes, not path segments; group them by length
+        self._doc_prefixes: Dict[int, frozenset] = {}
+        for prefix in doc_exclude_directories:
+            self._doc_prefixes.setdefault(len(prefix), set()).add(prefix)
+        self._doc_prefixes = {n: frozenset(p) for n, p in self._doc_prefixes.items()}
+        self._doc_exclude_extensions = frozenset(doc_exclude_extensions)
+        self._content_extensions = frozenset(content_extensions)
+        # Directory verdicts repeat for every file under them, so they are memoized
+        self._skip_dir_cache: Dict[str, bool] = {}
+
+    @classmethod
+    def from_request(cls, data) -> "PathFilter":
+        """
+        Filter for a request body with optional include / exclude / excludeDirs
+        lists; raises ValueError when one of them is not a string or a list of strings.
+        """
+        data = data or {}
+        include, exclude, exclude_dirs = (
+            _string_list(data, field) for field in ('include', 'exclude', 'excludeDirs')
+        )
+        if not (include or exclude or exclude_dirs):
+            return DEFAULT_PATH_FILTER
+        return cls(include=include, exclude=exclude, exclude_dirs=exclude_dirs)
+
+    @property
+    def key(self) -> Optional[tuple]:
+        """Hashable identity of the per-request rules; None for the default filter."""
+        if not (self.include or self.exclude or self.exclude_dirs):
+            return None
+        return (tuple(self.include), tuple(self.exclude), tuple(self.exclude_dirs))
+
+    def _request_allows(self, path: str) -> bool:
+        if self._include_re is not None and not self._include_re.match(path):
+            return False
+        if self._exclude_re is not None and self._exclude_re.match(path):
+            return False
+        if self._dir_trie and self._dir_trie.covers(path.split("/")[:-1]):
+            return False
+        return True
+
+    def should_skip(self, path: str) -> bool:
+        """Rule for the raw files dict used by README and summaries."""
+        norm = path.replace("\\", "/").lower()
+        directory, _, name = norm.rpartition("/")
+        if directory:
+            skipped = self._skip_dir_cache.get(directory)
+            if skipped is None:
+                skipped = not self._skip_directories.isdisjoint(directory.split("/"))
+                if len(self._skip_dir_cache) >= MAX_CACHED_DIRECTORIES:
+                    self._skip_dir_cache.clear()
+                self._skip_dir_cache[directory] = skipped
+            if skipped:
+                return True
+        if (_split_ext(name) in self._skip_extensions
+                or name in self._skip_filenames
+                or name.startswith("readme")):
+            return True
+        return not self._request_allows(path)
+
+    def is_document(self, path: str) -> bool:
+        """Rule for llama_index documents (/ask)."""
+        for length, prefixes in self._doc_prefixes.items():
+            if path[:length] in prefixes:
+                return False
+        ext = _split_ext(path.rpartition("/")[2]).lower()
+        if (ext or ".") in self._doc_exclude_extensions:
+            return False
+        return self._request_allows(path)
+
+    def wants_content(self, path: str) -> bool:
+        """Whether the raw files dict carries this file's content (a case-sensitive suffix test)."""
+        name = path.rpartition("/")[2]
+        dot = name.rfind(".")
+        return dot >= 0 and name[dot:] in self._content_extensions
+
+    def classify(self, path: str) -> Optional[str]:
+        """analyze_repo_structure category for a path, or None if it falls in none."""
+        lower = path.lower()
+        ext = _split_ext(lower.rpartition("/")[2])
+        if ext in CONFIG_EXTENSIONS or 'config' in lower:
+            return 'config_files'
+        category = EXTENSION_CATEGORIES.get(ext)
+        if category is not None:
+            return category
+        if any(name in lower for name in DOCUMENTATION_NAMES):
+            return 'documentation'
+        if ext in ASSET_EXTENSIONS:
+            return 'assets'
+        # The original '.test.js'-style extension checks can never match a single extension
+        return None
+
+
+DEFAULT_PATH_FILTER = PathFilter()
@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from github_parser import parse_github_url
+
+
+class Prefetcher:
+    """
+    Background snapshot + index warm-up, started when a client lists branches.
+
+    Runs on its own small pool so it never competes with admitted /ask work
+    for more than `workers` threads. Prefetches are deduplicated per repo and
+    branch, limited to `budget` starts per `budget_window` seconds, and can be
+    cancelled until their index build starts. A branch of None means the
+    repo's default branch and is keyed under that branch's name, so it
+    dedupes and cancels like an explicit request for it.
+    """
+    def __init__(self, workers=None, budget=None, budget_window=None):
+        self.workers = workers or int(os.getenv("PREFETCH_WORKERS", "2"))
+        self.budget = budget or int(os.getenv("PREFETCH_BUDGET", "30"))
+        self.budget_window = budget_window or float(os.getenv("PREFETCH_BUDGET_WINDOW", "3600"))
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+        self.lock = threading.Lock()
+        self.started = deque()
+        # (owner, repo, branch) -> {"future", "cancelled", "key"}
+        self.pending: Dict[tuple, Dict[str, Any]] = {}
+        # (owner, repo) -> branch most recently asked about
+        self.recent_branch: Dict[tuple, str] = {}
+        # index keys built by a prefetch that no /ask has used yet
+        self.unused: set = set()
+        self.counts = {
+            "scheduled": 0, "completed": 0, "failed": 0, "cancelled": 0,
+            "deduplicated": 0, "over_budget": 0, "used": 0,
+            "asks": 0, "warm_asks": 0,
+        }
+
+    def choose_branch(self, repo_url, branches: List[Dict[str, Any]]) -> Optional[str]:
+        """The branch last asked about if it still exists, else None (the default branch)."""
+        owner, repo = parse_github_url(repo_url)
+        with self.lock:
+            recent = self.recent_branch.get((owner, repo))
+        if recent and any(b["name"] == recent for b in branches):
+            return recent
+        return None
+
+    def _slot(self, repo_url, branch) -> tuple:
+        owner, repo = parse_github_url(repo_url)
+        if branch is None:
+            from batch_jobs import get_quota_scheduler
+            from repo_snapshot import default_branch
+            try:
+                branch = default_branch(repo_url, rate_limiter=get_quota_scheduler().github)
+            except Exception as e:
+                # get_snapshot resolves None the same way once it can
+                print(f"Prefetch {owner}/{repo}: could not look up the default branch: {e}")
+        return owner, repo, branch
+
+    def schedule(self, repo_url, branch=None) -> str:
+        slot = self._slot(repo_url, branch)
+        branch = slot[2]
+        now = time.time()
+        with self.lock:
+            if slot in self.pending:
+                self.counts["deduplicated"] += 1
+                return "deduplicated"
+            while self.started and now - self.started[0] > self.budget_window:
+                self.started.popleft()
+            if len(self.started) >= self.budget:
+                self.counts["over_budget"] += 1
+                return "over_budget"
+            self.started.append(now)
+            task = {"cancelled": threading.Event(), "key": None}
+            self.pending[slot] = task
+            self.counts["scheduled"] += 1
+            task["future"] = self.pool.submit(self._run, repo_url, branch, slot, task)
+        return "scheduled"
+
+    def cancel(self, repo_url, branch=None) -> bool:
+        """Cancel a queued or running prefetch; a build already under way still finishes."""
+        return self._cancel(self._slot(repo_url, branch))
+
+    def _cancel(self, slot) -> bool:
+        with self.lock:
+            task = self.pending.get(slot)
+        if task is None:
+            return False
+        task["cancelled"].set()
+        if task["future"].cancel():
+            # Never started, so _run will not clean up after it
+            with self.lock:
+                self.pending.pop(slot, None)
+                self.counts["cancelled"] += 1
+        return True
+
+    def cancel_other_branches(self, repo_url, branch):
+        """A question about one branch makes prefetches of the repo's other branches moot."""
+        owner, repo, branch = self._slot(repo_url, branch)
+        with self.lock:
+            others = [s for s in self.pending if s[:2] == (owner, repo) and s[2] != branch]
+        for slot in others:
+            self._cancel(slot)
+
+    def _run(self, repo_url, branch, slot, task):
+        from batch_jobs import get_quota_scheduler
+        from repo_snapshot import get_snapshot
+        from embedding_store import get_or_build_index, peek_index
+
+        try:
+            if task["cancelled"].is_set():
+                raise _Cancelled()
+            snapshot = get_snapshot(repo_url, branch, rate_limiter=get_quota_scheduler().github)
+            key = (snapshot.owner, snapshot.repo, snapshot.commit_sha)
+            task["key"] = key
+            if peek_index(key) is not None:
+                print(f"Prefetch {slot[0]}/{slot[1]}: index for {key[2][:7]} already warm")
+                return
+            docs = snapshot.documents()
+            if task["cancelled"].is_set():
+                raise _Cancelled()
+            if docs:
+                get_or_build_index(docs, key)
+            with self.lock:
+                self.unused.add(key)
+                self.counts["completed"] += 1
+        except _Cancelled:
+            with self.lock:
+                self.counts["cancelled"] += 1
+            print(f"Prefetch {slot[0]}/{slot[1]} ({slot[2] or 'default branch'}) cancelled")
+        except Exception as e:
+            with self.lock:
+                self.counts["failed"] += 1
+            print(f"Prefetch {slot[0]}/{slot[1]} failed: {e}")
+        finally:
+            with self.lock:
+                self.pending.pop(slot, None)
+
+    def record_ask(self, repo_url, branch, index_key, warm):
+        """Called by /ask before it queries, to track branch recency and prefetch hits."""
+        owner, repo = parse_github_url(repo_url)
+        with self.lock:
+            self.recent_branch[(owner, repo)] = branch
+            self.counts["asks"] += 1
+            if warm:
+                self.counts["warm_asks"] += 1
+            if index_key in self.unused:
+                self.unused.discard(index_key)
+                self.counts["used"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = dict(self.counts)
+            counts["pending"] = len(self.pending)
+            counts["budget_remaining"] = max(0, self.budget - len(self.started))
+        finished = counts["completed"]
+        # Share of finished prefetches that an /ask went on to use, and share of asks that found a warm index
+        counts["hit_rate"] = counts["used"] / finished if finished else 0.0
+        counts["warm_ask_rate"] = counts["warm_asks"] / counts["asks"] if counts["asks"] else 0.0
+        return counts
+
+
+class _Cancelled(Exception):
+    pass
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import uuid
+import random
+import _thread
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+# When set, the header / query flag must carry this value instead of just "1"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+# serve.py sets this: in production a bare ?profile=1 is ignored unless PROFILE_TOKEN matches
+PROFILE_REQUIRE_TOKEN = os.getenv("PROFILE_REQUIRE_TOKEN") == "1"
+
+
+def _original(module, name):
+    """The stdlib function even when gevent has monkey-patched its module."""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched(module):
+            return monkey.get_original(module, name)
+    except ImportError:
+        pass
+    return getattr(sys.modules.get(module) or __import__(module), name)
+
+
+def _current_greenlet():
+    """The request's greenlet when serving under gevent, else None."""
+    try:
+        from gevent import monkey, getcurrent
+    except ImportError:
+        return None
+    return getcurrent() if monkey.is_module_patched("threading") else None
+
+
+class StackSampler:
+    """
+    Samples one thread's (or greenlet's) Python stack every `interval` seconds.
+
+    Produces collapsed stacks ("outer;inner;leaf count" lines, the input
+    format of flamegraph.pl and speedscope) plus self / inclusive sample
+    counts per function. The sampler runs on a real OS thread even under
+    gevent, so it keeps sampling while the request is busy on the CPU. A
+    greenlet is sampled at its suspension point while it waits, and through
+    its OS thread's current frame while it runs.
+    """
+    def __init__(self, thread_id, greenlet=None, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.greenlet = greenlet
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._running = False
+        self._done = _original("_thread", "allocate_lock")()
+        self._sleep = _original("time", "sleep")
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._running = True
+        self._done.acquire()
+        _original("_thread", "start_new_thread")(self._run, ())
+
+    def stop(self):
+        self._running = False
+        # Released by the sampler thread on exit, at most one interval away
+        self._done.acquire()
+        self._done.release()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _frame(self):
+        if self.greenlet is not None:
+            # None while the greenlet is the one running on its thread
+            frame = self.greenlet.gr_frame
+            if frame is not None:
+                return frame
+        return sys._current_frames().get(self.thread_id)
+
+    def _run(self):
+        try:
+            while self._running:
+                self._sleep(self.interval)
+                if self._running:
+                    self._sample()
+        finally:
+            self._done.release()
+
+    def _sample(self):
+        frame = self._frame()
+        if frame is not None:
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def top(self, n=PROFILE_TOP_N) -> str:
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        total = self.samples or 1
+        lines = [
+            f"{self.samples} samples every {self.interval * 1000:.1f} ms over {self.elapsed:.3f}s",
+            "",
+            f"{'self %':>7} {'total %':>8}  function",
+        ]
+        for name, count in own.most_common(n):
+            lines.append(f"{100 * count / total:6.1f}% {100 * inclusive[name] / total:7.1f}%  {name}")
+        lines += ["", "by inclusive time", f"{'total %':>8}  function"]
+        for name, count in inclusive.most_common(n):
+            lines.append(f"{100 * count / total:7.1f}%  {name}")
+        return "\n".join(lines) + "\n"
+
+
+def _requested():
+    flag = request.headers.get("X-Profile") or request.args.get("profile")
+    if flag:
+        if PROFILE_TOKEN:
+            return flag == PROFILE_TOKEN
+        return not PROFILE_REQUIRE_TOKEN and flag.lower() in ("1", "true", "yes")
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _start_profile():
+    if not _requested():
+        return
+    # The OS thread id: under gevent threading.get_ident() is a greenlet id,
+    # which sys._current_frames() does not know
+    sampler = StackSampler(_original("_thread", "get_ident")(), greenlet=_current_greenlet())
+    profiler = None
+    if os.getenv("PROFILE_CPROFILE") == "1":
+        # Deterministic call counts too, at the cost of slowing the profiled request down
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    sampler.start()
+    g._profile = (uuid.uuid4().hex[:8], sampler, profiler)
+
+
+def _finish_profile(response=None):
+    state = g.pop("_profile", None)
+    if state is None:
+        return response
+    profile_id, sampler, profiler = state
+    sampler.stop()
+    if profiler is not None:
+        profiler.disable()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    endpoint = (request.endpoint or "unknown").replace(".", "_")
+    base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{profile_id}")
+    with open(base + ".collapsed", "w") as f:
+        f.write(sampler.collapsed())
+    with open(base + ".top.txt", "w") as f:
+        f.write(f"{request.method} {request.full_path}\n\n")
+        f.write(sampler.top())
+    if profiler is not None:
+        profiler.dump_stats(base + ".pstats")
+    print(f"Profiled {request.method} {request.path} in {sampler.elapsed:.3f}s -> {base}.*")
+
+    if response is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def init_profiling(app):
+    """Profile requests that ask for it (X-Profile header / ?profile=1) or fall in PROFILE_SAMPLE_RATE."""
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    # Requests that raise skip after_request; still stop the sampler and keep the profile
+    app.teardown_request(lambda exc: _finish_profile())
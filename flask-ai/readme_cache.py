@@ -0,0 +1,96 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class ReadmeCache:
+    """
+    LLM-generated READMEs, one per (repo, variant), tagged with the commit
+    they were generated from.
+
+    Serves stale-while-revalidate: a README from an older commit is still
+    returned while `refresh` regenerates it for the new commit in the
+    background. Refreshes are deduplicated per (variant, commit) and run on
+    their own small pool; the least recently used variants are evicted beyond
+    `max_entries`. A refresh that failed is not retried for `backoff` seconds,
+    doubling with each further failure, so requests during an LLM outage or
+    quota exhaustion do not each start another doomed generation.
+    """
+    def __init__(self, workers=None, max_entries=None, backoff=None):
+        self.workers = workers or int(os.getenv("README_REFRESH_WORKERS", "2"))
+        self.max_entries = max_entries or int(os.getenv("README_CACHE_SIZE", "64"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("README_REFRESH_BACKOFF", "60"))
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.inflight: Dict[tuple, Any] = {}
+        # (key, commit) -> (no refresh before this time, consecutive failures)
+        self.failed: Dict[tuple, tuple] = {}
+        self.pool = None
+        self.lock = threading.Lock()
+        self.counts = {"fresh": 0, "stale": 0, "pending": 0, "refreshed": 0, "refresh_failed": 0,
+                       "refresh_backed_off": 0}
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key: tuple, commit_sha: str, content: str):
+        with self.lock:
+            self.entries[key] = {"content": content, "commit_sha": commit_sha, "generated_at": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def refresh(self, key: tuple, commit_sha: str, generate: Callable[[], str]) -> bool:
+        """Regenerate `key` for `commit_sha` in the background unless under way or backing off."""
+        with self.lock:
+            if (key, commit_sha) in self.inflight:
+                return False
+            failed = self.failed.get((key, commit_sha))
+            if failed is not None and time.time() < failed[0]:
+                self.counts["refresh_backed_off"] += 1
+                return False
+            if self.pool is None:
+                # Created on first use, so preforked workers each start their own threads
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="readme-refresh")
+            self.inflight[(key, commit_sha)] = self.pool.submit(self._run, key, commit_sha, generate)
+            return True
+
+    def _run(self, key, commit_sha, generate):
+        start = time.perf_counter()
+        try:
+            content = generate()
+            self.store(key, commit_sha, content)
+            with self.lock:
+                self.counts["refreshed"] += 1
+                self.failed.pop((key, commit_sha), None)
+            print(f"README for {key[0]}/{key[1]}@{commit_sha[:7]} regenerated in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            now = time.time()
+            with self.lock:
+                self.counts["refresh_failed"] += 1
+                failures = self.failed.get((key, commit_sha), (0, 0))[1] + 1
+                delay = self.backoff * 2 ** min(failures - 1, 4)
+                self.failed[(key, commit_sha)] = (now + delay, failures)
+                # Forget failures long past their backoff, so the table stays small
+                for failed_key, (retry_at, _) in list(self.failed.items()):
+                    if now - retry_at > self.backoff * 16:
+                        del self.failed[failed_key]
+            print(f"README refresh for {key[0]}/{key[1]}@{commit_sha[:7]} failed: {e}; not retried for {delay:.0f}s")
+        finally:
+            with self.lock:
+                self.inflight.pop((key, commit_sha), None)
+
+    def record(self, freshness: str):
+        with self.lock:
+            self.counts[freshness] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"entries": len(self.entries), "refreshing": len(self.inflight),
+                    "backing_off": len(self.failed), **self.counts}
@@ -1,22 +1,75 @@
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
 import json
-from typing import Dict, List, Any
-import google.generativeai as genai
+from typing import Dict, List, Any, Tuple
+import llm_usage
+from context_builder import ContextBuilder, estimate_tokens
+from llm_pool import get_gemini_pool
+from path_filter import DEFAULT_PATH_FILTER
+from readme_cache import ReadmeCache
 
 class ReadmeGenerator:
     def __init__(self):
-        api_key = os.getenv('GEMINI_API_KEY')
-        print("Loaded GEMINI_API_KEY:", api_key)
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm_pool = get_gemini_pool('gemini-1.5-flash')
+        print(f"Gemini backends: {', '.join(self.llm_pool.stats())}")
+        self.context_builder = ContextBuilder()
+        self.readme_cache = ReadmeCache()
 
-    def generate_readme(self, github_url) -> str:
-        from github_parser import GitHubParser
-        parser = GitHubParser(github_url)
-        repo_data = parser.get_repo_data()
-        return self.generate_readme_content(repo_data)
+    def generate_readme(self, github_url, hierarchical=False, path_filter=DEFAULT_PATH_FILTER) -> str:
+        from repo_snapshot import get_snapshot
+        snapshot = get_snapshot(github_url)
+        readme, version = self.generate_readme_for_data(snapshot.repo_data(path_filter), hierarchical=hierarchical)
+        if version != "llm":
+            return readme
+        self.readme_cache.store(self._cache_key(snapshot, hierarchical, path_filter), snapshot.commit_sha, readme)
+        return readme
+
+    def generate_readme_instant(self, github_url, hierarchical=False, path_filter=DEFAULT_PATH_FILTER) -> Dict[str, Any]:
+        """
+        A README without waiting on the LLM.
+
+        Returns the stored LLM README when it matches the branch head
+        ("fresh"), the one from an older commit while it is regenerated
+        ("stale"), or, when none exists yet, a structure-based template while
+        the first one is generated ("pending"). Only the tree and dependency
+        manifests are fetched up front; the full snapshot is fetched by the
+        background refresh.
+        """
+        from repo_snapshot import get_snapshot, get_snapshot_outline
+        outline = get_snapshot_outline(github_url)
+        key = self._cache_key(outline, hierarchical, path_filter)
+        entry = self.readme_cache.get(key)
+        result = {"commit_sha": outline.commit_sha}
+        if entry is not None and entry["commit_sha"] == outline.commit_sha:
+            self.readme_cache.record("fresh")
+            return {**result, "readme_content": entry["content"], "version": "llm", "freshness": "fresh",
+                    "generated_commit_sha": entry["commit_sha"], "generated_at": entry["generated_at"]}
+
+        def generate():
+            repo_data = get_snapshot(github_url, outline.commit_sha).repo_data(path_filter)
+            context = self._readme_context(repo_data, self._repo_summary(repo_data, hierarchical))
+            return self._generate_llm_readme(context)
+
+        self.readme_cache.refresh(key, outline.commit_sha, generate)
+        if entry is not None:
+            self.readme_cache.record("stale")
+            return {**result, "readme_content": entry["content"], "version": "llm", "freshness": "stale",
+                    "generated_commit_sha": entry["commit_sha"], "generated_at": entry["generated_at"]}
+        self.readme_cache.record("pending")
+        context = self._readme_context(outline.repo_data(path_filter), include_excerpts=False)
+        return {**result, "readme_content": self._generate_fallback_readme(context), "version": "template",
+                "freshness": "pending", "generated_commit_sha": outline.commit_sha, "generated_at": None}
+
+    def _cache_key(self, snapshot, hierarchical, path_filter):
+        return (snapshot.owner, snapshot.repo, "hierarchical" if hierarchical else "flat", path_filter.key)
+
+    def _repo_summary(self, repo_data, hierarchical):
+        if not hierarchical:
+            return None
+        from hierarchical_summary import summarize_repo_hierarchical
+        return summarize_repo_hierarchical(repo_data)
 
     def analyze_repo_structure(self, repo_data: Dict) -> Dict[str, Any]:
         files = repo_data.get('files', {})
@@ -35,22 +88,9 @@ class ReadmeGenerator:
                 continue
             if file_info.get('type') != 'file':
                 continue
-            ext = os.path.splitext(file_path)[-1].lower()
-            # You can tune these lists as needed
-            if ext in ['.json', '.yml', '.yaml', '.env', '.lock', '.conf', '.ini'] or 'config' in file_path.lower():
-                categorized['config_files'].append(file_path)
-            elif ext in ['.js', '.jsx', '.ts', '.tsx']:
-                categorized['main_files'].append(file_path)
-            elif ext in ['.css', '.scss', '.sass', '.less', '.html', '.htm']:
-                categorized['frontend_files'].append(file_path)
-            elif ext in ['.py', '.java', '.php', '.rb', '.go', '.rs']:
-                categorized['backend_files'].append(file_path)
-            elif ext in ['.md'] or any(name in file_path.lower() for name in ['readme', 'changelog', 'contributing', 'license']):
-                categorized['documentation'].append(file_path)
-            elif ext in ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.pdf', '.doc', '.docx']:
-                categorized['assets'].append(file_path)
-            elif ext in ['.test.js', '.test.ts', '.spec.js', '.spec.ts']:
-                categorized['test_files'].append(file_path)
+            category = DEFAULT_PATH_FILTER.classify(file_path)
+            if category:
+                categorized[category].append(file_path)
         return categorized
 
     def extract_dependencies(self, files: Dict) -> Dict[str, List[str]]:
@@ -78,70 +118,68 @@ class ReadmeGenerator:
                 print(f"Error parsing {file_path}: {e}")
         return dependencies
 
-    def generate_readme_content(self, repo_data: Dict) -> str:
+    def generate_readme_for_data(self, repo_data: Dict, hierarchical=False, rate_limiter=None,
+                                 retries=1, quota_pause=60) -> Tuple[str, str]:
+        """
+        README for already fetched repo data, and whether it is the "llm" one
+        or the structure-based "template" used when the LLM fails.
+
+        With a `rate_limiter`, each attempt waits for its turn, and a quota
+        error pauses the limiter for `quota_pause` seconds (so every caller
+        sharing it backs off) before the next of `retries` attempts.
+        """
+        context = self._readme_context(repo_data, self._repo_summary(repo_data, hierarchical))
+        for attempt in range(retries):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            try:
+                return self._generate_llm_readme(context), "llm"
+            except Exception as e:
+                print("Gemini AI error:", e)
+                if attempt + 1 == retries or not llm_usage.is_quota_error(e):
+                    break
+                print(f"LLM quota hit on the README of {context['repo_name']}, pausing {quota_pause}s "
+                      f"(attempt {attempt + 1}/{retries})")
+                if rate_limiter is not None:
+                    rate_limiter.pause(quota_pause)
+                else:
+                    time.sleep(quota_pause)
+        return self._generate_fallback_readme(context), "template"
+
+    def _readme_context(self, repo_data: Dict, repo_summary: Dict = None, include_excerpts=True) -> Dict[str, Any]:
         categorized_files = self.analyze_repo_structure(repo_data)
         dependencies = self.extract_dependencies(repo_data['files'])
-        key_files = self._get_key_file_contents(repo_data['files'], categorized_files)
-        context = {
+        # A hierarchical summary already covers the code, so raw excerpts are not needed
+        key_files = {}
+        if include_excerpts and not repo_summary:
+            key_files = self._get_key_file_contents(repo_data['files'], categorized_files)
+        return {
             'repo_name': repo_data.get('name', 'Unknown'),
             'description': repo_data.get('description', ''),
             'language': repo_data.get('language', 'Multiple'),
             'file_structure': categorized_files,
             'dependencies': dependencies,
             'file_count': len(repo_data.get('files', {})),
-            'key_files': key_files
+            'key_files': key_files,
+            'repo_summary': repo_summary
         }
 
-        # Print all key file names (but do not include their contents anywhere)
+    def _generate_llm_readme(self, context: Dict) -> str:
+        # Print all key file names selected for the prompt
         print("\n========= KEY FILES ANALYZED =========")
-        for file_path in key_files:
+        for file_path in context['key_files']:
             print(file_path)
         print("======================================\n")
 
         prompt = self._create_readme_prompt(context)
-        try:
-            response = self.model.generate_content(prompt)
-            print("Gemini AI generated README.")
-            return response.text
-        except Exception as e:
-            print("Gemini AI error:", e)
-            return self._generate_fallback_readme(context)
+        print(f"README prompt: {estimate_tokens(prompt)} tokens")
+        response = self.llm_pool.call(lambda backend: backend.client.generate_content(prompt))
+        print("Gemini AI generated README.")
+        return response.text
 
     def _get_key_file_contents(self, files: Dict, categorized: Dict) -> Dict:
-        key_contents = {}
-        max_length = 3000
-
-        # Always include package.json if present (anywhere in the repo, but not in node_modules)
-        for fp in files:
-            if "node_modules/" in fp.replace("\\", "/"):
-                continue
-            if fp.endswith('package.json'):
-                content = files[fp].get('content', '')
-                if content:
-                    key_contents[fp] = content[:max_length] + ("\n... (truncated)" if len(content) > max_length else "")
-                break  # only the first package.json
-
-        # Include all .js, .jsx, .ts, .tsx, .py, .txt files (avoid duplicates, skip node_modules)
-        for fp, finfo in files.items():
-            if "node_modules/" in fp.replace("\\", "/"):
-                continue
-            ext = os.path.splitext(fp)[-1].lower()
-            if ext in {'.js', '.jsx', '.ts', '.tsx', '.py', '.txt'} and fp not in key_contents:
-                content = finfo.get('content', '')
-                if content:
-                    key_contents[fp] = content[:max_length] + ("\n... (truncated)" if len(content) > max_length else "")
-
-        # Include README files (any .md with 'readme' in name, case-insensitive, skip node_modules)
-        for fp, finfo in files.items():
-            if "node_modules/" in fp.replace("\\", "/"):
-                continue
-            lower_fp = fp.lower()
-            if (lower_fp.endswith('readme.md') or 'readme' in lower_fp) and fp not in key_contents:
-                content = finfo.get('content', '')
-                if content:
-                    key_contents[fp] = content[:max_length] + ("\n... (truncated)" if len(content) > max_length else "")
-
-        return key_contents
+        """Select key file excerpts that fit the prompt token budget."""
+        return self.context_builder.build(files)['excerpts']
 
     def _create_readme_prompt(self, context: Dict) -> str:
         file_structure = "\n".join([
@@ -154,7 +192,19 @@ class ReadmeGenerator:
             (f" (+{len(deps)-10} more)" if len(deps) > 10 else "")
             for dep_type, deps in context['dependencies'].items() if deps
         ])
-        # Do NOT include key file contents in the prompt
+        code_heading = "Key File Excerpts"
+        key_files = "\n\n".join(
+            f"--- {fp} ---\n{excerpt}" for fp, excerpt in context['key_files'].items()
+        )
+        if context.get('repo_summary'):
+            code_heading = "Repository Summary"
+            repo_summary = context['repo_summary']
+            # Only top-level directories, so the prompt stays bounded however large the repo is
+            top_level = "\n\n".join(
+                f"--- {d}/ ---\n{summary[:1500]}"
+                for d, summary in repo_summary['directories'].items() if '/' not in d
+            )
+            key_files = f"{repo_summary['repo_summary']}\n\n{top_level}".strip()
         prompt = f"""
 Generate a comprehensive and professional README.md for a GitHub repository with the following information:
 
@@ -164,6 +214,9 @@ Generate a comprehensive and professional README.md for a GitHub repository with
 **Dependencies:**
 {dependencies_info}
 
+**{code_heading}:**
+{key_files}
+
 Please generate a README.md that includes:
 1. A compelling project title, badges and description
 2. A watch demo link or Live website link option
@@ -0,0 +1,454 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+import requests
+
+from github_parser import parse_github_url, MAX_CONTENT_CHARS
+from path_filter import DEFAULT_PATH_FILTER
+from graphql_fetch import GraphQLBlobFetcher, fetch_mode
+
+# Blobs bigger than this are never fetched (the contents API stops at 1 MB too)
+MAX_BLOB_BYTES = 1024 * 1024
+# How long a branch -> commit resolution is trusted before asking GitHub again
+REF_TTL = float(os.getenv("SNAPSHOT_REF_TTL", "30"))
+# Retries of a blob that failed with a rate limit, 5xx or connection error
+BLOB_FETCH_RETRIES = int(os.getenv("BLOB_FETCH_RETRIES", "3"))
+BLOB_RETRY_MAX_WAIT = float(os.getenv("BLOB_RETRY_MAX_WAIT", "60"))
+# Dependency manifests (read by ReadmeGenerator.extract_dependencies); the only contents of an outline
+MANIFEST_FILES = ("package.json", "requirements.txt")
+
+
+class SnapshotFetchError(Exception):
+    """Part of a commit could not be fetched; no snapshot is built (or cached) from it."""
+
+_session = requests.Session()
+
+
+def _new_session_after_fork():
+    # Pooled connections are sockets; a forked worker must not share them with its parent
+    global _session
+    _session = requests.Session()
+
+
+os.register_at_fork(after_in_child=_new_session_after_fork)
+
+
+class RepoSnapshot:
+    """
+    One fetch of a repository at a fixed commit.
+
+    Serves both views the endpoints need: the `files` dict of
+    GitHubParser.get_repo_data (README, summaries) and the llama_index
+    Documents /ask indexes, each filtered by its own DEFAULT_PATH_FILTER rule.
+    """
+    def __init__(self, owner, repo, branch, commit_sha, metadata, tree, blobs):
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.commit_sha = commit_sha
+        self.metadata = metadata
+        self.tree = tree
+        self.blobs: Dict[str, bytes] = blobs
+        self.fetched_at = time.time()
+        self._documents = None
+        self._lock = threading.Lock()
+
+    def repo_data(self, path_filter=DEFAULT_PATH_FILTER) -> Dict[str, Any]:
+        files = {}
+        for entry in self.tree:
+            path = entry["path"]
+            if path_filter.should_skip(path):
+                continue
+            content = ""
+            if path_filter.wants_content(path) and entry["sha"] in self.blobs:
+                content = self.blobs[entry["sha"]].decode("utf-8", errors="replace")[:MAX_CONTENT_CHARS]
+            files[path] = {
+                "type": "file",
+                "content": content
+            }
+        return {
+            "name": self.metadata.get("name"),
+            "description": self.metadata.get("description"),
+            "language": self.metadata.get("language"),
+            "stars": self.metadata.get("stargazers_count"),
+            "created_at": self.metadata.get("created_at"),
+            "commit_sha": self.commit_sha,
+            "files": files
+        }
+
+    def documents(self, path_filter=DEFAULT_PATH_FILTER) -> List[Any]:
+        """llama_index Documents, built once per snapshot and narrowed by per-request filters."""
+        with self._lock:
+            if self._documents is None:
+                self._documents = self._build_documents()
+            documents = self._documents
+        if path_filter is DEFAULT_PATH_FILTER:
+            return documents
+        return [doc for doc in documents if path_filter.is_document(doc.metadata["file_path"])]
+
+    def _build_documents(self):
+        from llama_index.core import Document
+
+        docs = []
+        for entry in self.tree:
+            raw = self.blobs.get(entry["sha"])
+            if raw is None or not DEFAULT_PATH_FILTER.is_document(entry["path"]):
+                continue
+            try:
+                text = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            docs.append(Document(
+                text=text,
+                doc_id=entry["sha"],
+                metadata={
+                    "file_path": entry["path"],
+                    "file_name": entry["path"].split("/")[-1],
+                    "url": f"https://github.com/{self.owner}/{self.repo}/blob/{self.commit_sha}/{entry['path']}",
+                },
+            ))
+        return docs
+
+
+def _wanted(entry):
+    """Whether either view of the snapshot needs this blob's content."""
+    if entry["size"] > MAX_BLOB_BYTES:
+        return False
+    path = entry["path"]
+    return DEFAULT_PATH_FILTER.is_document(path) or (
+        DEFAULT_PATH_FILTER.wants_content(path) and not DEFAULT_PATH_FILTER.should_skip(path))
+
+
+def _is_manifest(entry):
+    path = entry["path"]
+    return (path.endswith(MANIFEST_FILES) and entry["size"] <= MAX_BLOB_BYTES
+            and not DEFAULT_PATH_FILTER.should_skip(path))
+
+
+def _reuse_blobs(tree, known_blobs, wanted=_wanted):
+    """Split the wanted blobs into those an earlier snapshot already holds and those still to fetch."""
+    known_blobs = known_blobs or {}
+    blobs, missing = {}, []
+    for entry in tree:
+        if not wanted(entry):
+            continue
+        if entry["sha"] in known_blobs:
+            blobs[entry["sha"]] = known_blobs[entry["sha"]]
+        else:
+            missing.append(entry)
+    return blobs, missing
+
+
+class GitHubSnapshotSource:
+    """Builds snapshots from the GitHub REST API."""
+    def __init__(self, rate_limiter=None):
+        self.rate_limiter = rate_limiter
+        self.workers = int(os.getenv("BLOB_FETCH_WORKERS", "8"))
+
+    def _get(self, url, accept="application/vnd.github.v3+json"):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        headers = {"Accept": accept}
+        token = os.getenv("GITHUB_TOKEN")
+        if token:
+            headers["Authorization"] = f"token {token}"
+        return _session.get(url, headers=headers)
+
+    def metadata(self, owner, repo):
+        resp = self._get(f"https://api.github.com/repos/{owner}/{repo}")
+        if resp.status_code != 200:
+            raise Exception(f"Could not fetch repo metadata: {resp.text}")
+        return resp.json()
+
+    def resolve_commit(self, owner, repo, branch):
+        resp = self._get(f"https://api.github.com/repos/{owner}/{repo}/commits/{branch}",
+                         accept="application/vnd.github.sha")
+        if resp.status_code != 200:
+            raise Exception(f"Could not resolve branch {branch}: {resp.text}")
+        return resp.text.strip()
+
+    def fetch(self, owner, repo, branch, commit_sha, metadata, known_blobs=None, wanted=_wanted):
+        api_base = f"https://api.github.com/repos/{owner}/{repo}"
+        tree_resp = self._get(f"{api_base}/git/trees/{commit_sha}?recursive=1")
+        if tree_resp.status_code != 200:
+            raise Exception(f"Could not fetch repo tree: {tree_resp.text}")
+        tree = [
+            {"path": item["path"], "sha": item["sha"], "size": item.get("size", 0)}
+            for item in tree_resp.json().get("tree", []) if item["type"] == "blob"
+        ]
+
+        blobs, missing = _reuse_blobs(tree, known_blobs, wanted)
+        blobs.update(self.fetch_blobs(owner, repo, missing))
+        return RepoSnapshot(owner, repo, branch, commit_sha, metadata, tree, blobs)
+
+    def fetch_blob(self, owner, repo, sha):
+        """
+        One blob's bytes. Rate limits, 5xx and connection errors are retried;
+        anything still failing raises SnapshotFetchError, because a snapshot
+        missing files must never be cached under its immutable commit key.
+        """
+        url = f"https://api.github.com/repos/{owner}/{repo}/git/blobs/{sha}"
+        for attempt in range(BLOB_FETCH_RETRIES + 1):
+            try:
+                # Raw media type skips the base64 round trip
+                resp = self._get(url, accept="application/vnd.github.raw")
+            except requests.RequestException as e:
+                resp, error = None, str(e)
+            else:
+                if resp.status_code == 200:
+                    return resp.content
+                error = f"HTTP {resp.status_code}"
+            if attempt == BLOB_FETCH_RETRIES or (resp is not None and not _retryable(resp)):
+                break
+            wait = _retry_delay(resp, attempt)
+            print(f"Blob {sha[:7]} of {owner}/{repo} failed ({error}), retrying in {wait:.0f}s")
+            if self.rate_limiter is not None:
+                # Back off every fetch sharing this quota, not just this one
+                self.rate_limiter.pause(wait)
+            else:
+                time.sleep(wait)
+        raise SnapshotFetchError(f"Could not fetch blob {sha[:7]} of {owner}/{repo}: {error}")
+
+    def fetch_blobs(self, owner, repo, entries) -> Dict[str, bytes]:
+        """Contents of tree entries keyed by SHA: batched GraphQL queries, or one REST call each."""
+        if fetch_mode() == "graphql":
+            fetcher = GraphQLBlobFetcher(owner, repo, rate_limiter=self.rate_limiter, session=_session)
+            return fetcher.fetch(entries, rest_fallback=lambda sha, path: self.fetch_blob(owner, repo, sha))
+
+        shas = list({e["sha"] for e in entries})
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            contents = pool.map(lambda sha: self.fetch_blob(owner, repo, sha), shas)
+            return dict(zip(shas, contents))
+
+
+def _retryable(resp):
+    if resp.status_code == 429 or resp.status_code >= 500:
+        return True
+    # GitHub reports primary and secondary rate limits as 403
+    return resp.status_code == 403 and (
+        resp.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in resp.headers
+        or "rate limit" in resp.text.lower())
+
+
+def _retry_delay(resp, attempt):
+    wait = 2 ** attempt
+    if resp is not None:
+        if resp.headers.get("Retry-After", "").isdigit():
+            wait = int(resp.headers["Retry-After"])
+        elif resp.headers.get("X-RateLimit-Remaining") == "0" and resp.headers.get("X-RateLimit-Reset", "").isdigit():
+            wait = int(resp.headers["X-RateLimit-Reset"]) - time.time() + 1
+    return min(max(wait, 1), BLOB_RETRY_MAX_WAIT)
+
+
+class LocalMirrorSnapshotSource:
+    """Builds snapshots from a local bare mirror (GIT_MIRROR_ROOT)."""
+    def __init__(self, github_url):
+        self.github_url = github_url
+        self._parser = None
+
+    @property
+    def parser(self):
+        # Opened (and fetched) only when metadata or refs are not already cached
+        if self._parser is None:
+            from local_git import LocalGitParser
+            self._parser = LocalGitParser.from_github_url(self.github_url)
+        return self._parser
+
+    def metadata(self, owner, repo):
+        return {"name": repo, "default_branch": self.parser.default_branch()}
+
+    def resolve_commit(self, owner, repo, branch):
+        return self.parser.resolve_commit(branch)
+
+    def fetch(self, owner, repo, branch, commit_sha, metadata, known_blobs=None, wanted=_wanted):
+        from local_git import _guess_language
+
+        tree = self.parser.list_tree(commit_sha)
+        blobs, missing = _reuse_blobs(tree, known_blobs, wanted)
+        blobs.update(self.parser.read_blobs([e["sha"] for e in missing]))
+        metadata = dict(metadata, language=_guess_language({e["path"]: None for e in tree}))
+        return RepoSnapshot(owner, repo, branch, commit_sha, metadata, tree, blobs)
+
+
+class SnapshotCache:
+    """
+    Process-wide LRU of snapshots keyed by (owner, repo, commit SHA).
+
+    Concurrent requests for the same commit share one fetch. Outlines (the
+    tree plus dependency manifests, see `outline`) are kept in a separate LRU
+    so `get` never hands one out as a full snapshot.
+    """
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv("SNAPSHOT_CACHE_SIZE", "8"))
+        self.snapshots: "OrderedDict[tuple, RepoSnapshot]" = OrderedDict()
+        self.outlines: "OrderedDict[tuple, RepoSnapshot]" = OrderedDict()
+        self.inflight: Dict[tuple, threading.Event] = {}
+        self.refs: Dict[tuple, tuple] = {}
+        self.metadata: Dict[tuple, tuple] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _head(self, github_url, branch, rate_limiter):
+        owner, repo = parse_github_url(github_url)
+        source = _source_for(github_url, rate_limiter)
+        metadata = self._metadata(source, owner, repo)
+        branch = branch or metadata.get("default_branch", "main")
+        return owner, repo, source, metadata, branch, self.resolve_commit(github_url, branch, source=source)
+
+    def get(self, github_url, branch=None, rate_limiter=None) -> RepoSnapshot:
+        owner, repo, source, metadata, branch, commit_sha = self._head(github_url, branch, rate_limiter)
+        key = (owner, repo, commit_sha)
+
+        while True:
+            with self.lock:
+                snapshot = self.snapshots.get(key)
+                if snapshot is not None:
+                    self.snapshots.move_to_end(key)
+                    self.hits += 1
+                    return snapshot
+                event = self.inflight.get(key)
+                if event is None:
+                    event = self.inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Someone else is fetching this commit; wait for it and re-check
+            event.wait()
+
+        try:
+            with self.lock:
+                # Blobs are content-addressed, so a newer commit only needs the ones that changed
+                previous = next((s for (o, r, _), s in reversed(self.snapshots.items())
+                                 if (o, r) == (owner, repo)), None)
+            print(f"Fetching snapshot of {owner}/{repo}@{commit_sha[:7]} ({branch})"
+                  + (f", reusing blobs from {previous.commit_sha[:7]}" if previous else ""))
+            snapshot = source.fetch(owner, repo, branch, commit_sha, metadata,
+                                    known_blobs=previous.blobs if previous else None)
+            with self.lock:
+                self.snapshots[key] = snapshot
+                self.outlines.pop(key, None)
+                while len(self.snapshots) > self.max_entries:
+                    self.snapshots.popitem(last=False)
+            return snapshot
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            event.set()
+
+    def outline(self, github_url, branch=None, rate_limiter=None) -> RepoSnapshot:
+        """
+        The full snapshot of the branch head if one is cached, else one with
+        the whole tree but only dependency manifests' contents: a handful of
+        requests instead of every blob.
+        """
+        owner, repo, source, metadata, branch, commit_sha = self._head(github_url, branch, rate_limiter)
+        key = (owner, repo, commit_sha)
+        with self.lock:
+            snapshot = self.snapshots.get(key) or self.outlines.get(key)
+            if snapshot is not None:
+                return snapshot
+        snapshot = source.fetch(owner, repo, branch, commit_sha, metadata, wanted=_is_manifest)
+        with self.lock:
+            self.outlines[key] = snapshot
+            while len(self.outlines) > self.max_entries:
+                self.outlines.popitem(last=False)
+        return snapshot
+
+    def peek(self, github_url, commit_sha) -> Optional[RepoSnapshot]:
+        owner, repo = parse_github_url(github_url)
+        with self.lock:
+            return self.snapshots.get((owner, repo, commit_sha))
+
+    def resolve_commit(self, github_url, branch, source=None) -> str:
+        owner, repo = parse_github_url(github_url)
+        now = time.time()
+        with self.lock:
+            cached = self.refs.get((owner, repo, branch))
+        if cached and now - cached[1] < REF_TTL:
+            return cached[0]
+        source = source or _source_for(github_url)
+        commit_sha = source.resolve_commit(owner, repo, branch)
+        self.remember_ref(owner, repo, branch, commit_sha)
+        return commit_sha
+
+    def default_branch(self, github_url, rate_limiter=None) -> str:
+        owner, repo = parse_github_url(github_url)
+        metadata = self._metadata(_source_for(github_url, rate_limiter), owner, repo)
+        return metadata.get("default_branch", "main")
+
+    def remember_ref(self, owner, repo, branch, commit_sha):
+        with self.lock:
+            self.refs[(owner, repo, branch)] = (commit_sha, time.time())
+
+    def _metadata(self, source, owner, repo):
+        now = time.time()
+        with self.lock:
+            cached = self.metadata.get((owner, repo))
+        if cached and now - cached[1] < REF_TTL * 10:
+            return cached[0]
+        metadata = source.metadata(owner, repo)
+        with self.lock:
+            self.metadata[(owner, repo)] = (metadata, now)
+        return metadata
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.snapshots), "hits": self.hits, "misses": self.misses}
+
+
+def _source_for(github_url, rate_limiter=None):
+    if os.getenv("GIT_MIRROR_ROOT"):
+        return LocalMirrorSnapshotSource(github_url)
+    return GitHubSnapshotSource(rate_limiter=rate_limiter)
+
+
+snapshot_cache = SnapshotCache()
+
+
+def get_snapshot(github_url, branch=None, rate_limiter=None) -> RepoSnapshot:
+    return snapshot_cache.get(github_url, branch, rate_limiter=rate_limiter)
+
+
+def get_snapshot_outline(github_url, branch=None, rate_limiter=None) -> RepoSnapshot:
+    return snapshot_cache.outline(github_url, branch, rate_limiter=rate_limiter)
+
+
+def default_branch(github_url, rate_limiter=None) -> str:
+    return snapshot_cache.default_branch(github_url, rate_limiter=rate_limiter)
+
+
+def resolve_commit(github_url, branch) -> str:
+    return snapshot_cache.resolve_commit(github_url, branch)
+
+
+def list_branches(repo_url: str) -> List[Dict[str, Any]]:
+    """Branches with their head commits (empty on error); also primes the branch -> commit cache."""
+    owner, repo = parse_github_url(repo_url)
+    source = GitHubSnapshotSource()
+    branches = []
+    page = 1
+    while True:
+        try:
+            resp = source._get(f"https://api.github.com/repos/{owner}/{repo}/branches?per_page=100&page={page}")
+        except requests.RequestException as e:
+            print(f"Error fetching branches: {e}")
+            return []
+        if resp.status_code != 200:
+            print(f"Error fetching branches: {resp.status_code} {resp.text[:200]}")
+            return []
+        items = resp.json()
+        for item in items:
+            sha = item["commit"]["sha"]
+            snapshot_cache.remember_ref(owner, repo, item["name"], sha)
+            branches.append({
+                'name': item["name"],
+                'commit_sha': sha[:7],
+                'protected': item.get("protected", False)
+            })
+        if len(items) < 100:
+            return branches
+        page += 1
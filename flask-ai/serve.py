@@ -0,0 +1,179 @@
+"""
+Production entrypoint for flask-ai with cooperative (gevent) I/O.
+
+Every blocking network wait - GitHub REST calls through requests, Gemini over
+gRPC, Ollama over httpx - and every time.sleep() yields to the gevent event
+loop, so one process can hold many long-running requests open at once.
+
+With WORKERS > 1 the parent loads the app and the embedding model once, then
+forks workers that share the listening socket and the model weights
+copy-on-write. Modules that hold fork-unsafe state (connection pools, gRPC
+channels, helper threads and process pools) reset it in the child through
+os.register_at_fork. The parent restarts workers that die and logs each
+worker's unique memory (USS) every WORKER_STATS_INTERVAL seconds.
+
+Workers share nothing but the socket and those pages. Batch jobs live in the
+worker that accepted them (a status poll landing on another worker gets a
+404), and the GitHub / LLM rate limiters, admission limits, caches and the
+LLM quota tracker are all counted per worker, so WORKERS=4 allows four times
+the configured rates. WORKERS > 1 is therefore refused unless BATCH_JOBS=0
+turns the batch endpoints off; size the per-worker limits as total / WORKERS.
+
+The cpu and onnx EMBED_BACKENDs spread large inputs over spawned process
+pools that each load their own model copy, so under WORKERS > 1
+EMBED_PROCESSES defaults to 1 and every worker encodes with the preloaded,
+shared model instead.
+
+    python serve.py            # HOST / PORT / MAX_CONNECTIONS / WORKERS from the environment
+"""
+from gevent import monkey
+# Non-aggressive so select.epoll stays importable (httpcore pulls in trio when installed)
+monkey.patch_all(aggressive=False)
+
+try:
+    # Gemini's client talks gRPC, which needs its own hook to cooperate with gevent
+    import grpc.experimental.gevent as grpc_gevent
+    grpc_gevent.init_gevent()
+except ImportError:
+    pass
+
+import gc
+import os
+import time
+import signal
+import socket
+import logging
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+logger = logging.getLogger("serve")
+
+
+def preload():
+    """Load and warm the embedding model in the parent so forked workers share its pages."""
+    try:
+        import torch
+        # OpenMP thread pools started before fork hang in the child; workers pick their own count
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+    from embedding_store import get_embed_model
+    start = time.perf_counter()
+    model = get_embed_model()
+    # First call loads the tokenizer and any lazily initialised weights
+    model.get_text_embedding("warm up")
+    logger.info(f"Preloaded {type(model).__name__} in {time.perf_counter() - start:.1f}s")
+
+
+def init_worker():
+    try:
+        import torch
+        torch.set_num_threads(int(os.getenv("TORCH_THREADS", "1")))
+    except ImportError:
+        pass
+
+
+def run_worker(listener, app, max_connections):
+    # Replacement workers are forked after the parent installed its supervisor handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    init_worker()
+    server = WSGIServer(listener, app, spawn=Pool(max_connections), log=None)
+    server.serve_forever()
+
+
+def spawn_worker(listener, app, max_connections):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(listener, app, max_connections)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def log_worker_memory(pids):
+    from memstats import memory_usage
+
+    parent = memory_usage()
+    lines = [f"parent {os.getpid()}: {parent}"]
+    total_uss = 0.0
+    for pid in pids:
+        usage = memory_usage(pid)
+        if usage:
+            total_uss += usage["uss_mb"]
+        lines.append(f"worker {pid}: {usage}")
+    logger.info("Memory per process (MB): " + "; ".join(lines) + f"; workers' USS total {total_uss:.1f} MB")
+
+
+def serve_preforked(app, host, port, workers, max_connections):
+    # Spawned encoder pools could not share the preloaded model; see the module docstring
+    os.environ.setdefault("EMBED_PROCESSES", "1")
+    listener = WSGIServer.get_listener((host, port), family=socket.AF_INET)
+    preload()
+    # Objects allocated so far never move into a younger GC generation, so collections
+    # in the workers don't touch (and un-share) the parent's pages
+    gc.collect()
+    gc.freeze()
+
+    pids = {spawn_worker(listener, app, max_connections) for _ in range(workers)}
+    logger.info(f"Serving flask-ai on {host}:{port} with {workers} preforked gevent workers: {sorted(pids)}")
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    stats_interval = float(os.getenv("WORKER_STATS_INTERVAL", "60"))
+    next_stats = time.monotonic() + min(stats_interval, 10)
+    while pids:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid in pids:
+            pids.discard(pid)
+            if not stopping:
+                logger.warning(f"Worker {pid} exited with status {status}; starting a replacement")
+                pids.add(spawn_worker(listener, app, max_connections))
+            continue
+        if time.monotonic() >= next_stats and not stopping:
+            log_worker_memory(sorted(pids))
+            next_stats = time.monotonic() + stats_interval
+        time.sleep(0.5)
+
+
+def main():
+    # ?profile=1 alone must not turn the profiler on in production
+    os.environ.setdefault("PROFILE_REQUIRE_TOKEN", "1")
+    from app import app, check_environment
+
+    check_environment()
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "5001"))
+    max_connections = int(os.getenv("MAX_CONNECTIONS", "1000"))
+    workers = int(os.getenv("WORKERS", "1"))
+
+    if workers > 1:
+        if os.getenv("BATCH_JOBS", "1") != "0":
+            raise SystemExit(
+                f"WORKERS={workers} would keep batch jobs and their rate limits per worker; "
+                "set BATCH_JOBS=0 to serve without batch jobs, or run with WORKERS=1"
+            )
+        serve_preforked(app, host, port, workers, max_connections)
+        return
+
+    server = WSGIServer((host, port), app, spawn=Pool(max_connections), log=None)
+    logger.info(f"Serving flask-ai on {host}:{port} with gevent (max {max_connections} connections)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
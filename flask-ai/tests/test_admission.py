@@ -0,0 +1,40 @@
+import ipaddress
+
+import pytest
+from flask import Flask
+
+import admission
+
+app = Flask(__name__)
+
+
+def client_for(remote_addr, headers=None):
+    with app.test_request_context(headers=headers or {}, environ_base={"REMOTE_ADDR": remote_addr}):
+        return admission.client_id()
+
+
+@pytest.fixture
+def trusted(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+def test_client_header_ignored_without_trusted_proxies():
+    assert client_for("203.0.113.5", {"X-Client-Id": "someone-else"}) == "203.0.113.5"
+
+
+def test_client_header_ignored_from_untrusted_peer(trusted):
+    assert client_for("203.0.113.5", {"X-Client-Id": "someone-else"}) == "203.0.113.5"
+
+
+def test_trusted_proxy_headers_identify_the_client(trusted):
+    assert client_for("10.1.2.3", {"X-Client-Id": "team-a"}) == "team-a"
+    assert client_for("10.1.2.3", {"X-Forwarded-For": "1.1.1.1, 198.51.100.7"}) == "198.51.100.7"
+    assert client_for("10.1.2.3") == "10.1.2.3"
+
+
+def test_per_client_limit_applies_to_peer_address():
+    limiter = admission.AdmissionLimiter("test", max_concurrent=4, max_queue=4, queue_timeout=1, per_client_limit=1)
+    limiter.acquire(client_for("203.0.113.5", {"X-Client-Id": "a"}))
+    with pytest.raises(admission.AdmissionRejected) as e:
+        limiter.acquire(client_for("203.0.113.5", {"X-Client-Id": "b"}))
+    assert e.value.status == 429
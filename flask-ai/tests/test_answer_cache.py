@@ -0,0 +1,69 @@
+import math
+
+from answer_cache import SemanticAnswerCache
+
+REPO = "https://github.com/owner/repo"
+OLD, NEW = "a" * 40, "b" * 40
+
+
+def at_angle(degrees):
+    """Unit vector whose cosine similarity to [1, 0] is cos(degrees)."""
+    return [math.cos(math.radians(degrees)), math.sin(math.radians(degrees))]
+
+
+def test_hits_only_at_or_above_the_threshold():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(REPO, "main", OLD, "what does it do?", [1.0, 0.0], "it does things")
+
+    hit = cache.lookup(REPO, "main", OLD, at_angle(20))  # similarity 0.94
+    assert hit["answer"] == "it does things"
+    assert hit["similarity"] > 0.9
+    assert cache.lookup(REPO, "main", OLD, at_angle(30)) is None  # similarity 0.87
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_scaled_embeddings_still_hit():
+    cache = SemanticAnswerCache(threshold=0.99)
+    cache.store(REPO, "main", OLD, "q", [2.0, 0.0], "a")
+    assert cache.lookup(REPO, "main", OLD, [0.5, 0.0])["answer"] == "a"
+
+
+def test_answers_never_cross_commits():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(REPO, "main", OLD, "q", [1.0, 0.0], "a")
+    assert cache.lookup(REPO, "dev", NEW, [1.0, 0.0]) is None
+
+
+def test_branch_moving_to_a_new_commit_drops_the_old_answers():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(REPO, "main", OLD, "q", [1.0, 0.0], "a")
+
+    assert cache.lookup(REPO, "main", NEW, [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup(REPO, "main", OLD, [1.0, 0.0]) is None
+
+
+def test_old_answers_kept_while_another_branch_points_at_the_commit():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(REPO, "main", OLD, "q", [1.0, 0.0], "a")
+    cache.lookup(REPO, "release", OLD, [0.0, 1.0])
+
+    cache.lookup(REPO, "main", NEW, [1.0, 0.0])
+    assert cache.lookup(REPO, "release", OLD, [1.0, 0.0])["answer"] == "a"
+
+
+def test_expired_and_least_recently_used_entries_are_dropped(monkeypatch):
+    import answer_cache
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(threshold=0.9, ttl=60, max_entries=2)
+    cache.store(REPO, "main", OLD, "first", [1.0, 0.0], "1")
+    cache.store(REPO, "main", OLD, "second", [0.0, 1.0], "2")
+    cache.store(REPO, "main", OLD, "third", [-1.0, 0.0], "3")
+    assert cache.lookup(REPO, "main", OLD, [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 2
+
+    now[0] += 61
+    assert cache.lookup(REPO, "main", OLD, [0.0, 1.0]) is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    from app import app
+    return app.test_client()
+
+
+def test_debug_sleep_hidden_unless_enabled(client, monkeypatch):
+    monkeypatch.delenv("ENABLE_DEBUG_ENDPOINTS", raising=False)
+    assert client.get("/debug/sleep?seconds=0").status_code == 404
+
+
+@pytest.mark.parametrize("seconds", ["abc", "-1", "121", "nan", "inf"])
+def test_debug_sleep_rejects_bad_seconds(client, monkeypatch, seconds):
+    monkeypatch.setenv("ENABLE_DEBUG_ENDPOINTS", "1")
+    monkeypatch.delenv("DEBUG_TOKEN", raising=False)
+    assert client.get(f"/debug/sleep?seconds={seconds}").status_code == 400
+
+
+def test_debug_sleep_requires_token_when_configured(client, monkeypatch):
+    monkeypatch.setenv("ENABLE_DEBUG_ENDPOINTS", "1")
+    monkeypatch.setenv("DEBUG_TOKEN", "s3cret")
+    assert client.get("/debug/sleep?seconds=0").status_code == 404
+    assert client.get("/debug/sleep?seconds=0", headers={"X-Debug-Token": "wrong"}).status_code == 404
+    response = client.get("/debug/sleep?seconds=0", headers={"X-Debug-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.get_json() == {"slept": 0.0}
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/ask", {"repoUrl": "https://github.com/a/b", "question": "q", "branch": "main", "include": 5}),
+    ("/api/readme-gen/generate", {"githubUrl": "https://github.com/a/b", "include": [1]}),
+    ("/api/file-summary/generate-preview", {"githubUrl": "https://github.com/a/b", "excludeDirs": {"a": 1}}),
+])
+def test_bad_path_filters_are_rejected(client, path, body):
+    assert client.post(path, json=body).status_code == 400
+
+
+def test_answer_cache_hit_skips_the_ask_slot(client, monkeypatch):
+    import app
+    from admission import get_limiter
+    from llama_index.core.embeddings import MockEmbedding
+    monkeypatch.setattr(app, "resolve_commit", lambda url, branch: "a" * 40)
+    monkeypatch.setattr(app, "get_embed_model", lambda: MockEmbedding(embed_dim=8))
+    monkeypatch.setattr(app, "answer_cache", app.SemanticAnswerCache(threshold=0.9))
+    app.answer_cache.store("https://github.com/a/b", "main", "a" * 40, "q",
+                           MockEmbedding(embed_dim=8).get_query_embedding("q"), "cached answer")
+    admitted = get_limiter("ask").stats()["admitted"]
+
+    response = client.post("/ask", json={"repoUrl": "https://github.com/a/b", "question": "q", "branch": "main"})
+
+    assert response.get_json() == {"answer": "cached answer", "cached": True}
+    assert get_limiter("ask").stats()["admitted"] == admitted
+    assert get_limiter("ask_lookup").stats()["admitted"] >= 1
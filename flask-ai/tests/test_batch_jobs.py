@@ -0,0 +1,130 @@
+import pytest
+
+import batch_jobs
+from batch_jobs import BatchRunner
+from readme_generator import ReadmeGenerator
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.acquired = 0
+        self.paused = []
+
+    def acquire(self):
+        self.acquired += 1
+
+    def pause(self, seconds):
+        self.paused.append(seconds)
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.github = FakeLimiter()
+        self.llm = FakeLimiter()
+
+
+class FakeReadmeGenerator(ReadmeGenerator):
+    """The real retry loop of generate_readme_for_data around a scripted LLM."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.hierarchical = []
+
+    def _repo_summary(self, repo_data, hierarchical):
+        self.hierarchical.append(hierarchical)
+        return None
+
+    def _readme_context(self, repo_data, repo_summary=None, include_excerpts=True):
+        return {"repo_name": repo_data["name"]}
+
+    def _generate_llm_readme(self, context):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"# {context['repo_name']}"
+
+    def _generate_fallback_readme(self, context):
+        return "template"
+
+
+@pytest.fixture
+def make_runner(monkeypatch):
+    # file_summarizer (used when a repo finishes) refuses to import without a key
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    # Worker threads exit at once; the tests drive the runner's methods directly
+    monkeypatch.setattr(BatchRunner, "_worker", lambda self: None)
+    return lambda **kwargs: BatchRunner(workers=1, scheduler=FakeScheduler(), **kwargs)
+
+
+def finish(job, at):
+    for state in job.repos.values():
+        state["status"] = "done"
+    job.finished_at = at
+
+
+def test_finished_jobs_expire_after_ttl(make_runner, monkeypatch):
+    runner = make_runner(job_ttl=60, max_jobs=10)
+    old = runner.submit(["https://github.com/a/old"], readme=False)
+    running = runner.submit(["https://github.com/a/running"], readme=False)
+    finish(old, at=1000.0)
+
+    monkeypatch.setattr(batch_jobs.time, "time", lambda: 1030.0)
+    assert runner.get(old.job_id) is old
+    monkeypatch.setattr(batch_jobs.time, "time", lambda: 1061.0)
+    assert runner.get(old.job_id) is None
+    assert runner.get(running.job_id) is running
+
+
+def test_oldest_finished_jobs_evicted_beyond_max_jobs(make_runner):
+    runner = make_runner(job_ttl=3600, max_jobs=2)
+    jobs = [runner.submit([f"https://github.com/a/{i}"], readme=False) for i in range(3)]
+    for i, job in enumerate(jobs):
+        finish(job, at=batch_jobs.time.time() - 10 + i)
+
+    assert runner.get(jobs[0].job_id) is None
+    assert runner.get(jobs[1].job_id) is jobs[1]
+    assert runner.get(jobs[2].job_id) is jobs[2]
+
+
+def test_readme_pauses_shared_llm_quota_and_retries(make_runner):
+    runner = make_runner()
+    runner._readme_gen = FakeReadmeGenerator([RuntimeError("429 Resource exhausted")])
+    job = runner.submit(["https://github.com/a/b"], summaries=False)
+    state = job.repos["https://github.com/a/b"]
+    state.update(status="processing", _pending=1, _llm_calls=1)
+
+    runner._generate_readme(job, "https://github.com/a/b", {"name": "b"})
+
+    assert runner.scheduler.llm.paused == [batch_jobs.QUOTA_PAUSE]
+    assert runner._readme_gen.calls == 2
+    assert state["readme_content"] == "# b"
+    assert state["readme_version"] == "llm"
+    assert state["status"] == "done"
+
+
+def test_readme_falls_back_to_template_on_other_errors(make_runner):
+    runner = make_runner()
+    runner._readme_gen = FakeReadmeGenerator([ValueError("bad prompt")])
+    job = runner.submit(["https://github.com/a/b"], summaries=False)
+    state = job.repos["https://github.com/a/b"]
+    state.update(status="processing", _pending=1, _llm_calls=1)
+
+    runner._generate_readme(job, "https://github.com/a/b", {"name": "b"})
+
+    assert runner.scheduler.llm.paused == []
+    assert state["readme_content"] == "template"
+    assert state["readme_version"] == "template"
+
+
+def test_readme_uses_the_hierarchical_summary_when_asked(make_runner):
+    runner = make_runner()
+    runner._readme_gen = FakeReadmeGenerator([])
+    job = runner.submit(["https://github.com/a/b"], summaries=False, hierarchical=True)
+    state = job.repos["https://github.com/a/b"]
+    state.update(status="processing", _pending=1, _llm_calls=1)
+
+    runner._generate_readme(job, "https://github.com/a/b", {"name": "b"})
+
+    assert runner._readme_gen.hierarchical == [True]
+    assert runner.scheduler.llm.acquired == 1
@@ -0,0 +1,29 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from context_compressor import ContextCompressor
+
+SOURCE = "def a():\n    return 1\n\n\ndef b():\n    return 2\n\n\ndef c():\n    return 3\n"
+
+
+def chunk(start, end, text=None, score=0.5):
+    node = TextNode(text=SOURCE[start:end] if text is None else text,
+                    start_char_idx=start, end_char_idx=end, metadata={"file_path": "m.py"})
+    return NodeWithScore(node=node, score=score)
+
+
+def merged(*nodes):
+    return [n.node.get_content() for n in ContextCompressor()._merge_same_file(list(nodes))]
+
+
+def test_overlapping_chunks_join_without_repeating_text():
+    assert merged(chunk(0, 30), chunk(20, len(SOURCE))) == [SOURCE]
+
+
+def test_adjacent_chunks_join_on_a_newline():
+    assert merged(chunk(0, 22), chunk(24, len(SOURCE))) == [SOURCE[:22] + "\n" + SOURCE[24:]]
+
+
+def test_overlap_that_cannot_be_found_in_the_text_stays_apart():
+    # Offsets claim an overlap, but the text was rewritten and shares nothing
+    first, second = chunk(0, 30), chunk(20, 50, text="something else entirely")
+    assert merged(first, second) == [SOURCE[:30], "something else entirely"]
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import embedding_engine
+from embedding_engine import CpuEmbeddingEngine
+
+
+class StubModel:
+    """Stands in for a SentenceTransformer: each vector identifies its text and the process that encoded it."""
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy):
+        return np.array([[len(text), sum(map(ord, text)), os.getpid()] for text in texts], dtype=np.float64)
+
+
+def _init_stub_worker():
+    embedding_engine._worker_model = StubModel()
+
+
+def expected(texts):
+    return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+
+@pytest.fixture
+def texts():
+    texts = [f"chunk {i} " + "x" * random.Random(i).randint(0, 200) for i in range(40)]
+    random.Random(0).shuffle(texts)
+    return texts
+
+
+@pytest.fixture
+def make_engine(monkeypatch):
+    monkeypatch.setattr(embedding_engine, "load_sentence_model", lambda *args: StubModel())
+    engines = []
+
+    def make(**kwargs):
+        engine = CpuEmbeddingEngine(**kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.close()
+
+
+def test_in_process_vectors_come_back_in_input_order(make_engine, texts):
+    engine = make_engine(encode_batch_size=4, processes=1)
+    vectors = engine.get_text_embedding_batch(texts)
+    assert [v[:2] for v in vectors] == expected(texts)
+
+
+def test_pooled_vectors_come_back_in_input_order(make_engine, texts):
+    engine = make_engine(encode_batch_size=2, processes=2)
+    engine._pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_stub_worker)
+
+    vectors = engine.get_text_embedding_batch(texts)
+
+    assert [v[:2] for v in vectors] == expected(texts)
+    assert os.getpid() not in {v[2] for v in vectors}
@@ -0,0 +1,93 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from graphql_fetch import GraphQLBlobFetcher
+
+BLOBS = {
+    "a" * 40: b"print('hello')\n",
+    "b" * 40: "café = 1\n".encode("utf-8"),
+    # Latin-1, not valid UTF-8: GitHub's Blob.text replaces the byte with U+FFFD
+    "c" * 40: "café = 1\n".encode("latin-1"),
+    "d" * 40: b"\x89PNG\r\n\x1a\n",
+}
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Answers blob queries the way api.github.com/graphql does."""
+    fail_batches_over = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        aliases = re.findall(r'(b\d+): object\(oid: "([0-9a-f]+)"\)', body["query"])
+        self.server.queries.append(len(aliases))
+        if self.server.fail_batches_over and len(aliases) > self.server.fail_batches_over:
+            self.send_response(502)
+            self.end_headers()
+            return
+        repository = {}
+        for alias, oid in aliases:
+            raw = BLOBS.get(oid)
+            if raw is None:
+                repository[alias] = None
+                continue
+            binary = raw.startswith(b"\x89PNG")
+            repository[alias] = {
+                "text": None if binary else raw.decode("utf-8", errors="replace"),
+                "isBinary": binary,
+                "isTruncated": False,
+                "byteSize": len(raw),
+            }
+        payload = json.dumps({"data": {"repository": repository}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.queries = []
+    server.fail_batches_over = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def entries(*shas):
+    return [{"sha": sha, "path": f"file_{sha[0]}", "size": len(BLOBS.get(sha, b""))} for sha in shas]
+
+
+def test_fetched_bytes_match_rest_including_non_utf8(endpoint):
+    fetcher = GraphQLBlobFetcher("owner", "repo", url=f"http://127.0.0.1:{endpoint.server_port}/graphql")
+    rest = []
+
+    def rest_fallback(sha, path):
+        rest.append(sha)
+        return BLOBS[sha]
+
+    blobs = fetcher.fetch(entries(*BLOBS), rest_fallback=rest_fallback)
+
+    assert blobs == BLOBS
+    assert sorted(rest) == ["c" * 40, "d" * 40]
+    assert endpoint.queries == [4]
+
+
+def test_oversized_queries_are_split(endpoint):
+    endpoint.fail_batches_over = 1
+    fetcher = GraphQLBlobFetcher("owner", "repo", url=f"http://127.0.0.1:{endpoint.server_port}/graphql")
+
+    blobs = fetcher.fetch(entries("a" * 40, "b" * 40), rest_fallback=lambda sha, path: None)
+
+    assert blobs == {"a" * 40: BLOBS["a" * 40], "b" * 40: BLOBS["b" * 40]}
+    assert endpoint.queries == [2, 1, 1]
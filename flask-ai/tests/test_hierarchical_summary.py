@@ -0,0 +1,54 @@
+import types
+
+import pytest
+
+
+@pytest.fixture
+def summarizer_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    import file_summarizer
+    import hierarchical_summary
+
+    state = {"fail": set(), "calls": []}
+
+    class FakePool:
+        def call(self, fn):
+            return fn(types.SimpleNamespace(client=self))
+
+        def generate_content(self, prompt):
+            state["calls"].append(prompt)
+            if any(marker in prompt for marker in state["fail"]):
+                raise RuntimeError("backend error")
+            return types.SimpleNamespace(text=f"summary #{len(state['calls'])}")
+
+    monkeypatch.setattr(file_summarizer, "get_gemini_pool", lambda model: FakePool())
+    cache = hierarchical_summary.SummaryCache(cache_dir=str(tmp_path))
+    return hierarchical_summary, cache, state
+
+
+FILES = {
+    "src/a.py": {"type": "file", "content": "print('a')"},
+    "src/b.py": {"type": "file", "content": "print('b')"},
+    "main.py": {"type": "file", "content": "print('main')"},
+}
+
+
+def test_failed_llm_calls_are_not_cached(summarizer_env):
+    hierarchical_summary, cache, state = summarizer_env
+    state["fail"].add("File: src/a.py")
+
+    first = hierarchical_summary.HierarchicalSummarizer(cache=cache, max_workers=1)
+    result = first.summarize(FILES, repo_name="demo")
+    assert result["files"]["src/a.py"] == "print('a')"  # raw fallback for this run
+    assert first.failures == 1
+
+    # The failed file and every directory above it are retried; the rest come from the cache
+    state["fail"].clear()
+    second = hierarchical_summary.HierarchicalSummarizer(cache=cache, max_workers=1)
+    assert second.forecast(FILES)["llm_calls"] == 3  # src/a.py, src/, root
+    result = second.summarize(FILES, repo_name="demo")
+    assert second.llm_calls == 3 and second.cache_hits == 2
+    assert result["files"]["src/a.py"].startswith("summary #")
+
+    third = hierarchical_summary.HierarchicalSummarizer(cache=cache, max_workers=1)
+    assert third.forecast(FILES)["llm_calls"] == 0
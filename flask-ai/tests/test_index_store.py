@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+import pytest
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.text_splitter import SentenceSplitter
+
+import index_store
+
+BASE = ("owner", "repo", "1" * 40)
+NEXT = ("owner", "repo", "2" * 40)
+
+
+@pytest.fixture
+def embed_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_store, "INDEX_DIR", str(tmp_path))
+    return MockEmbedding(embed_dim=8)
+
+
+def docs(**files):
+    return [Document(text=text, doc_id=f"sha-{path}-{hash(text)}", metadata={"file_path": path})
+            for path, text in files.items()]
+
+
+def test_persist_load_and_patch_forward(embed_model):
+    base_docs = docs(**{f"{name}.py": f"print('{name}')" for name in "abcdef"})
+    index = VectorStoreIndex.from_documents(base_docs, embed_model=embed_model)
+    index_store.persist(index, embed_model, BASE)
+    assert set(index_store.load_persisted(embed_model, BASE).ref_doc_info) == {d.doc_id for d in base_docs}
+
+    next_docs = base_docs[:5] + docs(**{"f.py": "print('f changed')"})
+    patched = index_store.update_from_latest(next_docs, embed_model, NEXT, [SentenceSplitter()])
+    assert set(patched.ref_doc_info) == {d.doc_id for d in next_docs}
+
+
+def test_persist_skips_a_commit_already_written(embed_model):
+    index = VectorStoreIndex.from_documents(docs(**{"a.py": "x = 1"}), embed_model=embed_model)
+    index_store.persist(index, embed_model, BASE)
+    path = os.path.join(index_store._repo_dir(embed_model, BASE), BASE[2])
+    marker = os.path.join(path, "marker")
+    open(marker, "w").close()
+
+    index_store.persist(index, embed_model, BASE)
+    assert os.path.exists(marker)
+
+
+def test_writer_waits_for_readers(embed_model, tmp_path):
+    repo_dir = str(tmp_path / "repo")
+    events = []
+    reading = threading.Event()
+
+    def reader():
+        with index_store._repo_lock(repo_dir):
+            reading.set()
+            time.sleep(0.3)
+            events.append("read done")
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    reading.wait()
+    with index_store._repo_lock(repo_dir, exclusive=True):
+        events.append("write")
+    thread.join()
+    assert events == ["read done", "write"]
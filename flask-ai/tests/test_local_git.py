@@ -0,0 +1,81 @@
+import subprocess
+
+import pytest
+
+import local_git
+from local_git import LocalGitParser, _run_git
+
+AUTH_HEADER = "Authorization: Bearer ghp_secret-token"
+
+
+def git(cwd, *args):
+    subprocess.run(["git", "-C", str(cwd)] + list(args), check=True, capture_output=True)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    work = tmp_path / "work"
+    (work / "src").mkdir(parents=True)
+    (work / "src" / "app.py").write_text("print('hello')\n")
+    (work / "README.md").write_text("# demo\n")
+    git(work, "init", "--quiet", "--initial-branch=main")
+    git(work, "add", ".")
+    git(work, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "--quiet", "-m", "init")
+    path = tmp_path / "demo.git"
+    subprocess.run(["git", "clone", "--bare", "--quiet", str(work), str(path)], check=True, capture_output=True)
+    return path
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    calls = []
+    run = subprocess.run
+
+    def record(args, **kwargs):
+        calls.append((args, kwargs.get("env")))
+        return run(args, **kwargs)
+    monkeypatch.setattr(local_git.subprocess, "run", record)
+    return calls
+
+
+def test_reads_tree_and_blobs_from_bare_mirror(mirror):
+    parser = LocalGitParser(str(mirror), fetch=False)
+    commit = parser.resolve_commit()
+    assert commit == parser.resolve_commit("main")
+
+    entries = {e["path"]: e for e in parser.list_tree(commit)}
+    assert set(entries) == {"README.md", "src/app.py"}
+    blobs = parser.read_blobs([entries["src/app.py"]["sha"]])
+    assert blobs == {entries["src/app.py"]["sha"]: b"print('hello')\n"}
+
+    data = parser.get_repo_data()
+    assert data["name"] == "demo"
+    assert data["commit_sha"] == commit
+    assert data["language"] == "Python"
+    assert data["files"]["src/app.py"]["content"] == "print('hello')\n"
+
+
+def test_auth_header_stays_off_the_command_line(mirror, recorded):
+    parser = LocalGitParser(str(mirror), fetch=False, auth_header=AUTH_HEADER)
+    parser.list_tree(parser.resolve_commit())
+
+    assert recorded
+    for args, env in recorded:
+        assert not any("ghp_secret-token" in arg for arg in args)
+        assert env["GIT_CONFIG_VALUE_0"] == AUTH_HEADER
+
+
+def test_auth_header_reaches_git_config(mirror, monkeypatch):
+    monkeypatch.delenv("GIT_CONFIG_COUNT", raising=False)
+    out = _run_git(["-C", str(mirror), "config", "--get-all", "http.extraHeader"], auth_header=AUTH_HEADER)
+    assert out.decode().strip() == AUTH_HEADER
+
+
+def test_auth_header_appends_to_existing_env_config(mirror, monkeypatch):
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "1")
+    monkeypatch.setenv("GIT_CONFIG_KEY_0", "core.abbrev")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_0", "12")
+    out = _run_git(["-C", str(mirror), "config", "--get", "core.abbrev"], auth_header=AUTH_HEADER)
+    assert out.decode().strip() == "12"
+    out = _run_git(["-C", str(mirror), "config", "--get", "http.extraHeader"], auth_header=AUTH_HEADER)
+    assert out.decode().strip() == AUTH_HEADER
@@ -0,0 +1,27 @@
+import pytest
+
+from path_filter import DEFAULT_PATH_FILTER, PathFilter
+
+
+def test_from_request_accepts_strings_and_string_lists():
+    path_filter = PathFilter.from_request({"include": "src/**", "excludeDirs": ["src/vendor"]})
+    assert path_filter.key == (("src/**",), (), ("src/vendor",))
+    assert path_filter.is_document("src/app.py")
+    assert not path_filter.is_document("src/vendor/lib.py")
+    assert not path_filter.is_document("docs/index.py")
+
+
+def test_from_request_without_fields_is_the_default_filter():
+    assert PathFilter.from_request({}) is DEFAULT_PATH_FILTER
+    assert PathFilter.from_request({"include": None, "exclude": []}) is DEFAULT_PATH_FILTER
+
+
+@pytest.mark.parametrize("data", [
+    {"include": 5},
+    {"include": [1]},
+    {"exclude": ["*.md", None]},
+    {"excludeDirs": {"a": 1}},
+])
+def test_from_request_rejects_other_types(data):
+    with pytest.raises(ValueError):
+        PathFilter.from_request(data)
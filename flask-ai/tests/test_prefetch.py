@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+import repo_snapshot
+from prefetch import Prefetcher
+
+URL = "https://github.com/owner/repo"
+
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    monkeypatch.setattr(repo_snapshot, "default_branch", lambda url, rate_limiter=None: "main")
+    release = threading.Event()
+    prefetcher = Prefetcher(workers=1, budget=10, budget_window=3600)
+    # Prefetches stay pending until the test lets them go
+    monkeypatch.setattr(prefetcher, "_run", lambda url, branch, slot, task: release.wait(5))
+    yield prefetcher
+    release.set()
+    prefetcher.pool.shutdown(wait=True)
+
+
+def test_default_branch_dedupes_with_its_explicit_name(prefetcher):
+    assert prefetcher.schedule(URL) == "scheduled"
+    assert prefetcher.schedule(URL, "main") == "deduplicated"
+    assert list(prefetcher.pending) == [("owner", "repo", "main")]
+
+
+def test_asking_about_another_branch_cancels_the_default_branch_prefetch(prefetcher):
+    prefetcher.schedule(URL, "dev")
+    prefetcher.schedule(URL)
+
+    prefetcher.cancel_other_branches(URL, "dev")
+
+    main = prefetcher.pending.get(("owner", "repo", "main"))
+    assert main is None or main["cancelled"].is_set()
+    assert not prefetcher.pending[("owner", "repo", "dev")]["cancelled"].is_set()
+
+
+def test_asking_about_the_default_branch_keeps_its_prefetch(prefetcher):
+    prefetcher.schedule(URL)
+    prefetcher.cancel_other_branches(URL, "main")
+    assert not prefetcher.pending[("owner", "repo", "main")]["cancelled"].is_set()
@@ -0,0 +1,83 @@
+import pytest
+
+import readme_cache
+import repo_snapshot
+from readme_cache import ReadmeCache
+from repo_snapshot import SnapshotCache
+
+KEY = ("owner", "repo", "flat", "default")
+COMMIT = "a" * 40
+
+
+def failing():
+    raise RuntimeError("429 quota exceeded")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(readme_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_failed_refresh_backs_off_and_doubles(clock):
+    cache = ReadmeCache(backoff=60)
+    cache._run(KEY, COMMIT, failing)
+    assert not cache.refresh(KEY, COMMIT, failing)
+
+    clock[0] += 61
+    cache._run(KEY, COMMIT, failing)
+    clock[0] += 61
+    assert not cache.refresh(KEY, COMMIT, failing)
+    assert cache.stats()["refresh_backed_off"] == 2
+
+    clock[0] += 60
+    cache._run(KEY, COMMIT, lambda: "# readme")
+    assert cache.get(KEY)["content"] == "# readme"
+    assert cache.stats()["backing_off"] == 0
+
+
+def test_backoff_is_per_commit(clock):
+    cache = ReadmeCache(backoff=60)
+    cache._run(KEY, COMMIT, failing)
+    assert cache.refresh(KEY, "b" * 40, lambda: "# readme")
+    cache.inflight[(KEY, "b" * 40)].result()
+    assert cache.get(KEY)["commit_sha"] == "b" * 40
+
+
+class FakeSource:
+    tree = [
+        {"path": "package.json", "sha": "p1", "size": 20},
+        {"path": "src/index.js", "sha": "s1", "size": 50},
+        {"path": "node_modules/x/package.json", "sha": "n1", "size": 20},
+    ]
+
+    def __init__(self):
+        self.fetched = []
+
+    def metadata(self, owner, repo):
+        return {"name": repo, "default_branch": "main"}
+
+    def resolve_commit(self, owner, repo, branch):
+        return COMMIT
+
+    def fetch(self, owner, repo, branch, commit_sha, metadata, known_blobs=None, wanted=repo_snapshot._wanted):
+        blobs = {e["sha"]: b'{"dependencies": {"react": "1"}}' for e in self.tree if wanted(e)}
+        self.fetched.append(sorted(blobs))
+        return repo_snapshot.RepoSnapshot(owner, repo, branch, commit_sha, metadata, self.tree, blobs)
+
+
+def test_outline_fetches_manifests_only_and_never_serves_as_snapshot(monkeypatch):
+    source = FakeSource()
+    monkeypatch.setattr(repo_snapshot, "_source_for", lambda url, rate_limiter=None: source)
+    cache = SnapshotCache()
+
+    outline = cache.outline("https://github.com/owner/repo")
+    assert source.fetched == [["p1"]]
+    assert cache.outline("https://github.com/owner/repo") is outline
+    assert outline.repo_data()["files"]["package.json"]["content"]
+
+    snapshot = cache.get("https://github.com/owner/repo")
+    assert snapshot is not outline
+    assert "s1" in snapshot.blobs
+    assert cache.outline("https://github.com/owner/repo") is snapshot